@@ -13,4 +13,10 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'StackOverflow.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# импорт после настройки Django: модулю нужны модели
+from questions.events import QuestionEventsApplication
+
+# поток событий вопроса (/questions/<id>/events/) — мимо middleware, остальное — Django
+application = QuestionEventsApplication(django_application)
@@ -0,0 +1,65 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class RoutingState:
+    """Что можно этому запросу: читать с реплики или только с основной базы."""
+
+    def __init__(self):
+        self.replica = False
+        self.wrote = False
+
+
+# ставит ReplicaRoutingMiddleware; вне запроса (команды, воркеры) — None
+routing_state = ContextVar("routing_state", default=None)
+
+# внутри primary_reads() даже разрешённые чтения идут в основную базу
+_primary_only = ContextVar("primary_only", default=False)
+
+
+def replica_alias():
+    alias = getattr(settings, "DATABASE_REPLICA", None)
+    return alias if alias in settings.DATABASES else None
+
+
+@contextmanager
+def primary_reads():
+    """
+    Для чтений, которые кладутся в кэш по текущей версии: реплика может отставать,
+    и карточка с голосом, которого она ещё не видела, жила бы в кэше весь таймаут.
+    """
+    token = _primary_only.set(True)
+    try:
+        yield
+    finally:
+        _primary_only.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Чтения с реплики только там, где их разрешила middleware: read-only ленты и
+    страница вопроса. Записи — всегда в основную базу; после первой записи
+    запрос до конца читает тоже оттуда.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = routing_state.get()
+        if state is None or not state.replica or state.wrote or _primary_only.get():
+            return None
+        # внутри транзакции основной базы реплика не видит её строк
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return replica_alias()
+
+    def db_for_write(self, model, **hints):
+        state = routing_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплика — копия основной базы, связи между ними законны
+        return True
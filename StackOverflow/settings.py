@@ -11,8 +11,9 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
-from pathlib import Path
+import sys
 from configparser import ConfigParser
+from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -50,6 +51,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # статика отдаётся раньше сессий и авторизации
+    'StackOverflow.staticfiles.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -62,6 +65,14 @@ MIDDLEWARE += [
     'users.middleware.LoginRequiredMiddleware',
 ]
 
+# Последней: к её process_view сессия и пользователь уже прочитаны с основной базы
+MIDDLEWARE += [
+    'users.middleware.ReplicaRoutingMiddleware',
+]
+
+# Server-Timing и лог sql.slow; без SQL_INSTRUMENTATION = True middleware отключается сам
+MIDDLEWARE.insert(0, 'users.middleware.SQLInstrumentationMiddleware')
+
 ROOT_URLCONF = 'StackOverflow.urls'
 
 TEMPLATES = [
@@ -91,15 +102,184 @@ DATABASES = {
     #     "NAME": BASE_DIR / "db.sqlite3",
     # },
     "default": {
-        "ENGINE": "django.db.backends.postgresql_psycopg2",
+        "ENGINE": "django.db.backends.postgresql",
         "NAME": "stackoverflow_db",
         "USER": "stackoverflow_user",
         "PASSWORD": "password",
         "HOST": "localhost",
         "PORT": "5432",
-    }
+        # соединение живёт между запросами, перед повторным использованием — проверка
+        "CONN_MAX_AGE": 60,
+        "CONN_HEALTH_CHECKS": True,
+    },
+    # Реплика только для чтения (потоковая репликация основной базы). Локально
+    # можно подставить вторую SQLite/Postgres-базу — копию основной
+    "replica": {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": "stackoverflow_db",
+        "USER": "stackoverflow_user",
+        "PASSWORD": "password",
+        "HOST": "localhost",
+        "PORT": "5432",
+        "CONN_MAX_AGE": 60,
+        "CONN_HEALTH_CHECKS": True,
+        # в тестах отдельную базу не создаём: реплика смотрит в тестовую основную
+        "TEST": {"MIRROR": "default"},
+    },
 }
 
+# Драйвер — psycopg 3 с psycopg_pool (requirements.txt): пул соединений Django вместо
+# постоянных соединений CONN_MAX_AGE. Пул сам проверяет соединение перед выдачей (check)
+# и держит min_size открытыми; close() возвращает соединение в пул, а не рвёт его.
+# Без psycopg_pool (например, только SQLite в local_settings) остаётся CONN_MAX_AGE
+try:
+    from psycopg_pool import ConnectionPool
+except ImportError:
+    ConnectionPool = None
+
+if ConnectionPool is not None:
+    for database in DATABASES.values():
+        if database["ENGINE"] != "django.db.backends.postgresql":
+            continue
+        database["CONN_MAX_AGE"] = 0
+        database["OPTIONS"] = {
+            "pool": {"min_size": 2, "max_size": 10, "timeout": 10, "check": ConnectionPool.check_connection},
+        }
+
+DATABASE_ROUTERS = ['StackOverflow.routers.ReplicaRouter']
+
+# В продакшене кэш должен быть общим для всех воркеров: на его версиях держится сброс
+# карточек, страниц лент и ETag'ов (голос сбрасывает их только в этом кэше), на нём же
+# буфер рейтингов и живые обновления "cache" и счётчики card_cache_stats. Redis
+# включается адресом в CACHE_LOCATION (переменная окружения) или [cache] LOCATION в
+# conf/django.conf; без него — LocMemCache, свой у каждого процесса (runserver).
+# Тесты всегда на LocMemCache: их cache.clear() не должен чистить настоящий Redis
+# вместе с несброшенными дельтами буфера рейтингов
+CACHE_LOCATION = os.environ.get('CACHE_LOCATION') or config.get('cache', 'LOCATION', fallback=None)
+
+TESTING = sys.argv[1:2] == ['test']
+
+if CACHE_LOCATION and not TESTING:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_LOCATION,
+        },
+    }
+else:
+    CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    }
+
+
+# Подсчёт вопросов для пагинации лент
+# ExactCount — всегда COUNT(*), EstimatedCount — оценка планировщика Postgres,
+# MaintainedCount — счётчики ListingCounter / Tag.question_count
+# Точно считаем до QUESTION_COUNT_EXACT_THRESHOLD строк; None — сколько помещается
+# в нумерованные страницы (NUMBERED_PAGE_LIMIT * QUESTION_COUNT_PAGE), дальше — курсор
+
+QUESTION_COUNT_STRATEGY = "questions.counting.MaintainedCount"
+
+QUESTION_COUNT_EXACT_THRESHOLD = None
+
+
+# Горячие вопросы: hot_score = log10(голоса) + возраст / QUESTION_HOT_DECAY_SECONDS
+# После изменения этих настроек: python manage.py rebuild_hot_scores
+
+QUESTION_HOT_DECAY_SECONDS = 45000
+
+QUESTION_HOT_ANSWER_WEIGHT = 2
+
+
+# Отложенная запись рейтингов: None — сразу UPDATE,
+# "memory" — буфер в процессе, "cache" — буфер в общем кэше (виден всем воркерам)
+
+VOTE_RATING_BUFFER = None
+
+VOTE_RATING_BUFFER_INTERVAL = 2.0
+
+# Сколько секунд держим в кэше оценки пользователя (подсветка кнопок)
+
+VOTE_STATE_CACHE_TIMEOUT = 600
+
+
+# Конфигурация полнотекстового поиска Postgres (to_tsvector / websearch_to_tsquery)
+
+QUESTION_SEARCH_CONFIG = "russian"
+
+# Как часто индекс автодополнения тегов перечитывает популярность из базы
+
+TAG_AUTOCOMPLETE_RELOAD_SECONDS = 300
+
+# Боковая панель: сколько популярных тегов показывать и сколько держать их в кэше
+
+POPULAR_TAGS_COUNT = 10
+
+SIDEBAR_CACHE_TIMEOUT = 3600
+
+# Репутация: рейтинг вопросов + рейтинг ответов + бонус за каждый правильный ответ
+
+ACCEPTED_ANSWER_BONUS = 15
+
+BEST_MEMBERS_COUNT = 10
+
+BEST_MEMBERS_CACHE_TIMEOUT = 300
+
+# Сколько держать в кэше отрисованную карточку вопроса (ключ — id + версия)
+
+CARD_CACHE_TIMEOUT = 3600
+
+# Кэш страниц лент (порядок id): короткий TTL, ранний вероятностный пересчёт (XFetch, beta)
+# и ожидание чужой сборки вместо параллельного запроса в базу
+
+LISTING_CACHE_TIMEOUT = 30
+
+LISTING_CACHE_EARLY_BETA = 1.0
+
+LISTING_CACHE_WAIT = 0.5
+
+LISTING_CACHE_LOCK_TIMEOUT = 10
+
+# Замеры SQL по запросам: медленная страница, медленный запрос,
+# сколько одинаковых запросов за страницу считать N+1
+
+SQL_INSTRUMENTATION = False
+
+SQL_SLOW_REQUEST_MS = 500
+
+SQL_SLOW_QUERY_MS = 100
+
+SQL_DUPLICATE_THRESHOLD = 3
+
+# Асинхронные ленты и страница вопроса: независимые чтения (лента, сайдбар, оценки)
+# идут параллельно, каждое со своим соединением из пула psycopg_pool (см. DATABASES).
+# Без пула и при False — по очереди в соединении запроса
+
+ASYNC_CONCURRENT_READS = True
+
+# Реплика для read-only вьюх (None — всё читаем с основной базы) и сколько секунд
+# после записи пользователь читает с основной, пока реплика догоняет
+
+DATABASE_REPLICA = "replica"
+
+DATABASE_REPLICA_STICKY_SECONDS = 5
+
+DATABASE_REPLICA_PIN_COOKIE = "db_primary"
+
+# Живые обновления страницы вопроса (рейтинги, новые ответы, правильный ответ) через
+# server-sent events на ASGI: "memory" — подписчики своего процесса, "cache" — события
+# в общем кэше, их опрашивает каждый воркер; None — выключены
+
+LIVE_UPDATES_BACKEND = "memory"
+
+LIVE_UPDATES_POLL_INTERVAL = 0.5
+
+# Сколько событий ждёт медленного клиента и как часто слать keepalive молчащему потоку
+
+LIVE_UPDATES_QUEUE_SIZE = 100
+
+LIVE_UPDATES_KEEPALIVE = 20
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -145,7 +325,41 @@ STATICFILES_DIRS = [BASE_DIR /"static"]
 
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
-WHITENOISE_USE_FINDERS = True
+# collectstatic склеивает и минифицирует бандлы, добавляет хэш содержимого к именам
+# и кладёт рядом .gz (и .br, если установлен brotli). Отдаёт их StaticFilesMiddleware
+
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "StackOverflow.staticfiles.CompressedManifestStorage"},
+}
+
+STATIC_BUNDLES = {
+    "css/site.min.css": ["css/style.css", "css/flex.css", "css/question-card.css"],
+    "css/forms.min.css": ["css/forms.css"],
+}
+
+# Кэш для файлов без хэша в имени; файлы с хэшем кэшируются на год (immutable)
+
+STATIC_MAX_AGE = 3600
+
+# Загруженные пользователями файлы (аватары)
+
+MEDIA_URL = "/media/"
+
+MEDIA_ROOT = BASE_DIR / "media"
+
+# Миниатюры аватаров: квадрат AVATAR_THUMBNAIL_SIZE px (карточка 100px на экранах 2x),
+# строятся в фоне пулом из AVATAR_THUMBNAIL_WORKERS потоков
+
+AVATAR_THUMBNAIL_SIZE = 200
+
+AVATAR_THUMBNAIL_FORMAT = "WEBP"
+
+AVATAR_THUMBNAIL_QUALITY = 80
+
+AVATAR_THUMBNAIL_WORKERS = 2
+
+AVATAR_THUMBNAIL_BACKGROUND = True
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -155,4 +369,8 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 try:
     from .local_settings import *
 except ImportError:
-    pass
\ No newline at end of file
+    pass
+
+# local_settings может задать только default — тогда «реплика» это она же
+if DATABASE_REPLICA:
+    DATABASES.setdefault(DATABASE_REPLICA, {**DATABASES["default"], "TEST": {"MIRROR": "default"}})
\ No newline at end of file
@@ -0,0 +1,179 @@
+import gzip
+import mimetypes
+import os
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import (
+    ManifestStaticFilesStorage,
+    staticfiles_storage,
+)
+from django.core.exceptions import MiddlewareNotUsed, SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import parse_etags
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+CSS_COMMENT_RE = re.compile(r"/\*.*?\*/", re.DOTALL)
+CSS_PUNCTUATION_RE = re.compile(r"\s*([{};,>])\s*")
+CSS_COLON_RE = re.compile(r":\s+")
+CSS_SPACE_RE = re.compile(r"\s+")
+
+# что имеет смысл сжимать заранее: картинки в png/jpg/webp уже сжаты
+COMPRESSIBLE_EXTENSIONS = (".css", ".js", ".svg", ".json", ".txt", ".html", ".xml")
+
+
+def etag_matches(header, etag):
+    # If-None-Match сравнивается слабо: W/"x" совпадает с "x", * — с любым тегом
+    tags = parse_etags(header)
+    return "*" in tags or etag in [tag.removeprefix("W/") for tag in tags]
+
+
+def minify_css(source):
+    # простой минификатор без разбора: строк с {};,> в наших стилях нет
+    css = CSS_COMMENT_RE.sub("", source)
+    css = CSS_SPACE_RE.sub(" ", css)
+    css = CSS_PUNCTUATION_RE.sub(r"\1", css)
+    css = CSS_COLON_RE.sub(":", css)
+    return css.replace(";}", "}").strip()
+
+
+class CompressedManifestStorage(ManifestStaticFilesStorage):
+    """
+    collectstatic: склеивает и минифицирует STATIC_BUNDLES, даёт всем файлам
+    имена с хэшем содержимого (манифест) и кладёт рядом .gz и .br копии.
+    """
+
+    def stored_name(self, name):
+        # collectstatic ещё не запускали (разработка, тесты) — отдаём исходное имя
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def build_bundles(self, paths):
+        built = {}
+        for bundle, sources in getattr(settings, "STATIC_BUNDLES", {}).items():
+            parts = []
+            for source in sources:
+                if source not in paths:
+                    raise ValueError(f"Бандл {bundle}: нет исходного файла {source}")
+                storage, path = paths[source]
+                with storage.open(path) as f:
+                    parts.append(f.read().decode("utf-8"))
+            if self.exists(bundle):
+                self.delete(bundle)
+            self.save(bundle, ContentFile(minify_css("\n".join(parts)).encode("utf-8")))
+            built[bundle] = (self, bundle)
+        return built
+
+    def compress(self, name):
+        if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+            return
+        with self.open(name) as f:
+            data = f.read()
+        variants = [(".gz", gzip.compress(data, 9, mtime=0))]
+        if brotli is not None:
+            variants.append((".br", brotli.compress(data, quality=11)))
+        for suffix, compressed in variants:
+            # сжатие не помогло (крошечный файл) — отдаём оригинал
+            if len(compressed) >= len(data):
+                continue
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self.save(name + suffix, ContentFile(compressed))
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            paths = {**paths, **self.build_bundles(paths)}
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                self.compress(hashed_name)
+            yield name, hashed_name, processed
+
+
+def accepted_encodings(request):
+    header = request.headers.get("Accept-Encoding", "")
+    return {part.split(";")[0].strip().lower() for part in header.split(",")}
+
+
+class StaticFilesMiddleware:
+    """
+    Отдаёт собранную статику из STATIC_ROOT до сессий и авторизации. Файлы с
+    хэшем в имени неизменны — кэш на год с immutable, браузер их не перепроверяет.
+    Клиенту с br/gzip отдаёт заранее сжатую копию.
+    """
+
+    IMMUTABLE = "public, max-age=31536000, immutable"
+
+    # под ASGI Django не оборачивает её в async_to_sync/sync_to_async
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.root = str(settings.STATIC_ROOT)
+        self.prefix = settings.STATIC_URL
+        self.max_age = getattr(settings, "STATIC_MAX_AGE", 3600)
+        self.hashed = set(getattr(staticfiles_storage, "hashed_files", {}).values())
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        response = self.static_response(request)
+        return response if response is not None else self.get_response(request)
+
+    async def __acall__(self, request):
+        # stat и open файла — микросекунды, FileResponse ASGI-обработчик дочитает сам
+        response = self.static_response(request)
+        return response if response is not None else await self.get_response(request)
+
+    def static_response(self, request):
+        if request.method in ("GET", "HEAD") and request.path.startswith(self.prefix):
+            return self.serve(request, request.path[len(self.prefix):])
+        return None
+
+    def serve(self, request, name):
+        try:
+            path = safe_join(self.root, name)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        encodings = accepted_encodings(request)
+        encoding = None
+        for candidate, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if candidate in encodings and os.path.isfile(path + suffix):
+                path, encoding = path + suffix, candidate
+                break
+
+        stat = os.stat(path)
+        etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+        headers = {
+            "ETag": etag,
+            "Vary": "Accept-Encoding",
+            "Cache-Control": self.IMMUTABLE if name in self.hashed else f"public, max-age={self.max_age}",
+        }
+        if etag_matches(request.headers.get("If-None-Match", ""), etag):
+            response = HttpResponseNotModified()
+        else:
+            content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            # файл закрывает сам FileResponse, дочитав его
+            response = FileResponse(open(path, "rb"), content_type=content_type)  # noqa: SIM115
+            if encoding:
+                response["Content-Encoding"] = encoding
+        for header, value in headers.items():
+            response[header] = value
+        return response
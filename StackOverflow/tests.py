@@ -0,0 +1,81 @@
+import gzip
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from users.models import UserProfile
+
+from .staticfiles import minify_css
+
+
+class StaticPipelineTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.static_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.static_root, ignore_errors=True)
+        settings_override = override_settings(STATIC_ROOT=cls.static_root)
+        settings_override.enable()
+        cls.addClassCleanup(settings_override.disable)
+        call_command("collectstatic", interactive=False, verbosity=0)
+
+    def test_minify_css(self):
+        source = "/* шапка */\n.a , .b > p {\n  color: red;\n  margin: 0 auto;\n}\n"
+        self.assertEqual(minify_css(source), ".a,.b>p{color:red;margin:0 auto}")
+
+    def test_bundle_is_hashed_and_precompressed(self):
+        name = staticfiles_storage.stored_name("css/site.min.css")
+        self.assertRegex(name, r"^css/site\.min\.[0-9a-f]{12}\.css$")
+        with staticfiles_storage.open(name) as f:
+            bundle = f.read()
+        with staticfiles_storage.open(name + ".gz") as f:
+            self.assertEqual(gzip.decompress(f.read()), bundle)
+
+        user = User.objects.create(username="static_viewer")
+        UserProfile.objects.create(user=user)
+        self.client.force_login(user)
+        page = self.client.get(reverse("home")).content.decode()
+        self.assertIn(staticfiles_storage.url("css/site.min.css"), page)
+        self.assertNotIn("css/flex", page)
+
+    def test_served_gzipped_with_immutable_cache(self):
+        url = staticfiles_storage.url("css/site.min.css")
+        response = self.client.get(url, headers={"Accept-Encoding": "gzip, deflate, br"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Content-Type"], "text/css")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+
+        again = self.client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": response["ETag"]})
+        self.assertEqual(again.status_code, 304)
+        # список тегов разбирается целиком, а не ищется подстрокой
+        etag = response["ETag"]
+        for header, status in (
+            (f'"other", W/{etag}', 304),
+            ("*", 304),
+            (f'"x{etag[1:]}', 200),
+            (etag[:-2] + '"', 200),
+        ):
+            with self.subTest(header=header):
+                self.assertEqual(self.client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": header}).status_code, status)
+
+        plain = self.client.get(url)
+        self.assertNotIn("Content-Encoding", plain)
+        # исходник без хэша в имени может поменяться — кэшируется ненадолго
+        unhashed = self.client.get("/static/css/style.css")
+        self.assertEqual(unhashed["Cache-Control"], "public, max-age=3600")
+
+    async def test_served_by_async_branch(self):
+        url = staticfiles_storage.url("css/site.min.css")
+        response = await self.async_client.get(url, headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        again = await self.async_client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": "*"})
+        self.assertEqual(again.status_code, 304)
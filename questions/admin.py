@@ -1,8 +1,19 @@
 from django.contrib import admin
-from questions.models import Question, Answer, Tag, AnswerMark, QuestionMark
+
+from questions.models import (
+    Answer,
+    AnswerMark,
+    ListingCounter,
+    Question,
+    QuestionMark,
+    Reputation,
+    Tag,
+)
 
 admin.site.register(QuestionMark)
 admin.site.register(Question)
 admin.site.register(AnswerMark)
 admin.site.register(Answer)
 admin.site.register(Tag)
+admin.site.register(ListingCounter)
+admin.site.register(Reputation)
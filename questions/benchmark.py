@@ -0,0 +1,196 @@
+import asyncio
+import json
+import math
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from typing import NamedTuple
+
+from django.contrib.auth.models import User
+from django.db import close_old_connections, connection
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+from .models import Answer, Question, Tag
+
+
+class Scenario(NamedTuple):
+    name: str
+    method: str
+    url: Callable
+    data: Callable = None
+
+
+class Fixtures(NamedTuple):
+    user: User
+    tag: str
+    question_id: int
+    answer_id: int
+
+
+SCENARIOS = [
+    Scenario("home", "get", lambda f: reverse("home")),
+    Scenario("hot", "get", lambda f: reverse("questions:hot")),
+    Scenario("tag", "get", lambda f: reverse("questions:tag", args=[f.tag])),
+    Scenario("question_detail", "get", lambda f: reverse("questions:question_detail", args=[f.question_id])),
+    # повторный клик снимает оценку, так что каждая итерация — вставка или удаление
+    Scenario(
+        "question_vote", "post",
+        lambda f: reverse("questions:question_mark", args=[f.question_id]), lambda f: {"mark": "1"},
+    ),
+    Scenario(
+        "answer_vote", "post",
+        lambda f: reverse("questions:answer_mark", args=[f.answer_id]), lambda f: {"mark": "1"},
+    ),
+]
+
+
+def pick_fixtures():
+    # самый популярный тег и самый обсуждаемый вопрос — худшие случаи для ленты и детальной
+    tag = Tag.objects.order_by("-question_count", "id").values_list("title", flat=True).first()
+    question = Question.objects.order_by("-answer_count", "id").only("id", "user_id").first()
+    if tag is None or question is None:
+        raise ValueError("В базе нет тегов или вопросов для бенчмарка")
+    answer_id = Answer.objects.filter(question_id=question.id).values_list("id", flat=True).first()
+    user = User.objects.exclude(pk=question.user_id).order_by("id").first() or User.objects.get(pk=question.user_id)
+    return Fixtures(user, tag, question.id, answer_id)
+
+
+def percentile(values, p):
+    # nearest-rank: без интерполяции, значение всегда одно из измеренных
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+        # gather_reads передаёт счётчик в потоки пула
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+
+class BenchmarkRunner:
+    def __init__(self, client, iterations=50, warmup=5, scenarios=SCENARIOS):
+        self.client = client
+        self.iterations = iterations
+        self.warmup = warmup
+        self.scenarios = scenarios
+
+    def run_scenario(self, scenario, fixtures):
+        url = scenario.url(fixtures)
+        data = scenario.data(fixtures) if scenario.data else None
+        request = getattr(self.client, scenario.method)
+
+        for _ in range(self.warmup):
+            request(url, data)
+
+        latencies, queries, statuses = [], [], set()
+        for _ in range(self.iterations):
+            counter = _QueryCounter()
+            with connection.execute_wrapper(counter):
+                started = time.perf_counter()
+                response = request(url, data)
+                latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(counter.count)
+            statuses.add(response.status_code)
+
+        return {
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3),
+            "queries": max(queries),
+            "queries_min": min(queries),
+            "statuses": sorted(statuses),
+        }
+
+    def run(self, fixtures):
+        return {scenario.name: self.run_scenario(scenario, fixtures) for scenario in self.scenarios}
+
+
+class ThroughputRunner:
+    """
+    Запросов в секунду через WSGI- и ASGI-обработчик Django при одном и том же
+    числе воркеров: concurrency потоков с Client против concurrency задач
+    AsyncClient в одном event loop. Сервер (gunicorn/uvicorn) и сеть не входят.
+    """
+
+    def __init__(self, cookies, concurrency=8, requests=200, scenarios=None):
+        self.cookies = cookies
+        self.concurrency = concurrency
+        self.requests = requests
+        self.scenarios = scenarios or [scenario for scenario in SCENARIOS if scenario.method == "get"]
+
+    def _shares(self):
+        # запросы поровну между воркерами, остаток — первым
+        base, extra = divmod(self.requests, self.concurrency)
+        return [base + (i < extra) for i in range(self.concurrency)]
+
+    def run_wsgi(self, url):
+        def worker(count):
+            client = Client()
+            client.cookies = SimpleCookie(self.cookies)
+            try:
+                return [client.get(url).status_code for _ in range(count)]
+            finally:
+                close_old_connections()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(self.concurrency) as pool:
+            statuses = [status for chunk in pool.map(worker, self._shares()) for status in chunk]
+        return statuses, time.perf_counter() - started
+
+    def run_asgi(self, url):
+        async def worker(count):
+            client = AsyncClient()
+            client.cookies = SimpleCookie(self.cookies)
+            return [(await client.get(url)).status_code for _ in range(count)]
+
+        async def run_all():
+            started = time.perf_counter()
+            chunks = await asyncio.gather(*(worker(count) for count in self._shares()))
+            return [status for chunk in chunks for status in chunk], time.perf_counter() - started
+
+        return asyncio.run(run_all())
+
+    def run(self, fixtures):
+        results = {}
+        for scenario in self.scenarios:
+            url = scenario.url(fixtures)
+            result = {}
+            for name, run in (("wsgi", self.run_wsgi), ("asgi", self.run_asgi)):
+                statuses, elapsed = run(url)
+                result[f"{name}_rps"] = round(len(statuses) / elapsed, 1)
+                result[f"{name}_statuses"] = sorted(set(statuses))
+            result["asgi_speedup"] = round(result["asgi_rps"] / result["wsgi_rps"], 2)
+            results[scenario.name] = result
+        return results
+
+
+def check_budgets(results, baseline, latency_tolerance=1.0):
+    """Список нарушений: запросов больше бюджета, p95 выше бюджета * допуск, не-2xx ответы."""
+    violations = []
+    for name, budget in baseline.items():
+        result = results.get(name)
+        if result is None:
+            continue
+        if any(status >= 400 for status in result["statuses"]):
+            violations.append(f"{name}: ответы {result['statuses']}")
+        if "queries" in budget and result["queries"] > budget["queries"]:
+            violations.append(f"{name}: {result['queries']} запросов при бюджете {budget['queries']}")
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if key in budget and result[key] > budget[key] * latency_tolerance:
+                violations.append(f"{name}: {key}={result[key]} при бюджете {budget[key]}")
+    return violations
+
+
+def load_baseline(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,180 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+CARD_TEMPLATE = "questions/question_card.html"
+
+# метки в закэшированной карточке, вместо них подставляется оценка зрителя;
+# из пользовательского текста такие не получить — "<" экранируется
+VOTE_UP_MARKER = "<!--viewer-up-->"
+VOTE_DOWN_MARKER = "<!--viewer-down-->"
+
+CARD_HITS_KEY = "cards:hits"
+CARD_MISSES_KEY = "cards:misses"
+
+
+def _question_version_key(question_id):
+    return f"cards:qv:{question_id}"
+
+
+def _author_version_key(user_id):
+    return f"cards:av:{user_id}"
+
+
+def _answers_version_key(question_id):
+    return f"cards:qa:{question_id}"
+
+
+def _card_timeout():
+    return getattr(settings, "CARD_CACHE_TIMEOUT", 3600)
+
+
+def _new_version():
+    # версия, которой точно не было до вытеснения ключа из кэша
+    return time.time_ns() // 1000
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), None)
+
+
+def question_card_changed(question_id):
+    _bump(_question_version_key(question_id))
+
+
+def author_cards_changed(user_id):
+    # аватар показывается во всех карточках автора — одна версия на автора
+    _bump(_author_version_key(user_id))
+
+
+def question_answers_changed(question_id):
+    # ответы вопроса (рейтинг, правильный, новые) — по ней сверяется страница вопроса
+    _bump(_answers_version_key(question_id))
+
+
+def _versions(keys):
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    for key, version in missing.items():
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+        versions[key] = version
+    return versions
+
+
+def card_versions(pairs):
+    # [(id вопроса, id автора)] -> {id вопроса: (версия вопроса, версия автора)}
+    keys = set()
+    for question_id, user_id in pairs:
+        keys.add(_question_version_key(question_id))
+        keys.add(_author_version_key(user_id))
+    versions = _versions(list(keys))
+    return {
+        question_id: (versions[_question_version_key(question_id)], versions[_author_version_key(user_id)])
+        for question_id, user_id in pairs
+    }
+
+
+def _detail_authors_key(question_id, page_number, answers_version):
+    return f"cards:qu:{question_id}:{page_number}:{answers_version}"
+
+
+def author_versions(user_ids):
+    keys = [_author_version_key(user_id) for user_id in user_ids]
+    versions = _versions(keys)
+    return tuple(versions[key] for key in keys)
+
+
+def detail_version(question_id, page_number):
+    # (версия вопроса, версия его ответов, версии авторов страницы) — без запросов в базу;
+    # кто авторы страницы, известно после её первой отрисовки, до неё вместо версий None
+    keys = [_question_version_key(question_id), _answers_version_key(question_id)]
+    versions = _versions(keys)
+    question_version, answers_version = versions[keys[0]], versions[keys[1]]
+    user_ids = cache.get(_detail_authors_key(question_id, page_number, answers_version))
+    return question_version, answers_version, None if user_ids is None else author_versions(user_ids)
+
+
+def remember_detail_authors(question_id, page_number, answers_version, user_ids):
+    # состав страницы ответов меняется только с версией ответов — по ней и ключ
+    cache.set(_detail_authors_key(question_id, page_number, answers_version), list(user_ids), _card_timeout())
+
+
+def viewer_version(user_id):
+    # аватар в шапке — та же версия автора, что и в его карточках
+    return _versions([_author_version_key(user_id)])[_author_version_key(user_id)]
+
+
+def _card_key(question_id, version, authenticated):
+    return "cards:html:{}:{}:{}:{}".format(question_id, *version, "a" if authenticated else "g")
+
+
+def _count(key, value):
+    if value:
+        cache.add(key, 0, None)
+        cache.incr(key, value)
+
+
+def render_cards(questions, user):
+    # общая для всех часть карточки берётся из кэша, кнопки зрителя — поверх неё
+    if not questions:
+        return questions
+    authenticated = user.is_authenticated
+
+    # версии могли уже прийти вместе с вопросами из кэша ленты
+    versions = {
+        question.id: question.card_version for question in questions if hasattr(question, "card_version")
+    }
+    missing = [(question.id, question.user_id) for question in questions if question.id not in versions]
+    if missing:
+        versions.update(card_versions(missing))
+
+    keys = {question.id: _card_key(question.id, versions[question.id], authenticated) for question in questions}
+    fragments = cache.get_many(list(keys.values()))
+
+    rendered, misses = {}, 0
+    for question in questions:
+        key = keys[question.id]
+        if key not in fragments:
+            misses += 1
+            fragments[key] = render_to_string(CARD_TEMPLATE, {
+                "q": question,
+                "authenticated": authenticated,
+                "vote_up_marker": mark_safe(VOTE_UP_MARKER),
+                "vote_down_marker": mark_safe(VOTE_DOWN_MARKER),
+            })
+            # вопрос с реплики мог отстать от версии, прочитанной из кэша, — такую
+            # карточку показываем, но не кэшируем; ленты грузят вопросы с основной
+            if question._state.db == DEFAULT_DB_ALIAS:
+                rendered[key] = fragments[key]
+    if rendered:
+        cache.set_many(rendered, _card_timeout())
+    _count(CARD_HITS_KEY, len(questions) - misses)
+    _count(CARD_MISSES_KEY, misses)
+
+    for question in questions:
+        mark = getattr(question, "viewer_mark", 0)
+        html = fragments[keys[question.id]]
+        html = html.replace(VOTE_UP_MARKER, " active" if mark == 1 else "")
+        html = html.replace(VOTE_DOWN_MARKER, " active" if mark == -1 else "")
+        question.card_html = mark_safe(html)
+    return questions
+
+
+def card_cache_stats():
+    values = cache.get_many([CARD_HITS_KEY, CARD_MISSES_KEY])
+    hits = values.get(CARD_HITS_KEY, 0)
+    misses = values.get(CARD_MISSES_KEY, 0)
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_ratio": hits / total if total else 0.0}
+
+
+def reset_card_cache_stats():
+    cache.delete_many([CARD_HITS_KEY, CARD_MISSES_KEY])
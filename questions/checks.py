@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+PROCESS_LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def process_local_cache(alias="default"):
+    return settings.CACHES.get(alias, {}).get("BACKEND") in PROCESS_LOCAL_CACHES
+
+
+@register(Tags.caches, deploy=True)
+def shared_cache_check(app_configs, **kwargs):
+    # версии карточек, лент и ETag'ов сбрасывает тот воркер, что принял голос;
+    # в кэше процесса остальные воркеры этого не увидят
+    if not process_local_cache():
+        return []
+    return [Warning(
+        "Кэш default живёт в памяти процесса: при нескольких воркерах версии карточек, "
+        "записи лент и ETag'и у них расходятся на CARD_CACHE_TIMEOUT.",
+        hint="Настройте общий кэш (Redis или Memcached) в CACHES.",
+        id="questions.W001",
+    )]
@@ -0,0 +1,59 @@
+import asyncio
+from contextlib import ExitStack
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, connections
+
+
+def connection_pool_configured():
+    # параллельно читать имеет смысл только из пула: без него каждый поток открывал
+    # бы и закрывал своё соединение, а это дороже самих запросов
+    return all(database.get("OPTIONS", {}).get("pool") for database in settings.DATABASES.values())
+
+
+def _request_wrappers():
+    # execute_wrapper висят на соединениях потока запроса (SQLInstrumentationMiddleware,
+    # счётчики бенчмарка) — потокам пула передаём их же, иначе запросы мимо счёта
+    return {alias: list(connections[alias].execute_wrappers) for alias in connections}
+
+
+def _in_own_connection(call, wrappers):
+    def run():
+        try:
+            with ExitStack() as stack:
+                for alias, alias_wrappers in wrappers.items():
+                    for wrapper in alias_wrappers:
+                        stack.enter_context(connections[alias].execute_wrapper(wrapper))
+                return call()
+        finally:
+            # с пулом close() возвращает соединение в пул, поток его не держит
+            connections.close_all()
+    return run
+
+
+def _serial_reads(calls):
+    # чужие соединения не видят незакоммиченных строк этого (тесты, atomic), а без
+    # пула соединений параллельность дороже запросов — тогда читаем по очереди
+    # в соединении запроса
+    if (
+        connection.in_atomic_block
+        or not getattr(settings, "ASYNC_CONCURRENT_READS", True)
+        or not connection_pool_configured()
+    ):
+        return [call() for call in calls], None
+    return None, _request_wrappers()
+
+
+async def gather_reads(*calls):
+    """
+    Выполняет независимые синхронные чтения. С пулом соединений — параллельно, каждое
+    в потоке пула с соединением из пула; обёртки execute_wrapper соединений запроса
+    действуют и там. Иначе — по очереди в соединении запроса. Результаты — в порядке calls.
+    """
+    results, wrappers = await sync_to_async(_serial_reads)(calls)
+    if results is not None:
+        return results
+    return await asyncio.gather(
+        *(sync_to_async(_in_own_connection(call, wrappers), thread_sensitive=False)() for call in calls)
+    )
@@ -0,0 +1,97 @@
+import json
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.utils.module_loading import import_string
+
+LISTING_ALL_QUESTIONS = "questions"
+
+
+def tag_listing_key(tag_id):
+    return f"tag:{tag_id}"
+
+
+class ExactCount:
+    """Обычный COUNT(*) — годится, пока выборки маленькие."""
+
+    def count(self, questions, key=None):
+        return questions.count(), False
+
+
+class EstimatedCount:
+    """
+    До threshold строк считает точно (COUNT по подзапросу с LIMIT),
+    дальше берёт оценку планировщика и помечает результат как примерный.
+    """
+
+    def __init__(self, threshold=None):
+        if threshold is None:
+            threshold = getattr(settings, "QUESTION_COUNT_EXACT_THRESHOLD", None)
+        if threshold is None:
+            # точнее, чем видно нумерованными страницами, считать незачем
+            Question = apps.get_model("questions", "Question")
+            threshold = Question.objects.NUMBERED_PAGE_LIMIT * Question.objects.QUESTION_COUNT_PAGE
+        self.threshold = threshold
+
+    def count(self, questions, key=None):
+        bounded = questions.order_by()[:self.threshold + 1].count()
+        if bounded <= self.threshold:
+            return bounded, False
+
+        estimate = self.estimate(questions, key)
+        if estimate is None or estimate < bounded:
+            estimate = bounded
+        return estimate, True
+
+    def estimate(self, questions, key=None):
+        connection = connections[questions.db]
+        if connection.vendor != "postgresql":
+            return None
+        try:
+            with connection.cursor() as cursor:
+                if key == LISTING_ALL_QUESTIONS:
+                    cursor.execute(
+                        "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                        [questions.model._meta.db_table],
+                    )
+                    row = cursor.fetchone()
+                    # reltuples = -1, пока таблицу ни разу не анализировали
+                    if row and row[0] >= 0:
+                        return row[0]
+                    return None
+
+                sql, params = questions.order_by().query.sql_with_params()
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                return int(plan[0]["Plan"]["Plan Rows"])
+        except DatabaseError:
+            return None
+
+
+class MaintainedCount(EstimatedCount):
+    """
+    Для больших выборок читает счётчики, которые поддерживаются сигналами:
+    ListingCounter для общей ленты и Tag.question_count для тегов.
+    Для выборок без счётчика — оценка планировщика.
+    """
+
+    def estimate(self, questions, key=None):
+        if key == LISTING_ALL_QUESTIONS:
+            ListingCounter = apps.get_model("questions", "ListingCounter")
+            value = ListingCounter.objects.filter(name=key).values_list("value", flat=True).first()
+            if value is not None:
+                return value
+        elif key and key.startswith("tag:"):
+            Tag = apps.get_model("questions", "Tag")
+            value = Tag.objects.filter(pk=key[4:]).values_list("question_count", flat=True).first()
+            if value is not None:
+                return value
+        return super().estimate(questions, key)
+
+
+def get_count_strategy():
+    path = getattr(settings, "QUESTION_COUNT_STRATEGY", "questions.counting.MaintainedCount")
+    return import_string(path)()
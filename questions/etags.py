@@ -0,0 +1,76 @@
+import hashlib
+
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from .cards import card_versions, viewer_version
+from .listing_cache import peek_listing_page
+from .reputation import BEST_MEMBERS_KEY
+from .sidebar import POPULAR_TAGS_KEY
+
+# Валидаторы страниц собираются только из кэша (версии карточек, записи лент,
+# сайдбар), поэтому 304 отдаётся без единого запроса за страницей.
+
+
+def _etag(*parts):
+    # слабый: страница та же по смыслу, байты (csrf-токен) могут отличаться
+    return f'W/"{hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()}"'
+
+
+def page_state(request):
+    """Общее для всех страниц: зритель, его аватар в шапке, сайдбар. None — сверять не по чему."""
+    # неразобранные сообщения есть только в свежем ответе
+    if "messages" in request.COOKIES:
+        return None
+    sidebar = cache.get_many([POPULAR_TAGS_KEY, BEST_MEMBERS_KEY])
+    if len(sidebar) < 2:
+        return None
+    user = request.user
+    viewer = (user.id, viewer_version(user.id)) if user.is_authenticated else None
+    return viewer, sidebar[POPULAR_TAGS_KEY], sidebar[BEST_MEMBERS_KEY]
+
+
+def listing_etag(state, listing, page_number, versions, total_pages, next_cursor):
+    # versions — [(id вопроса, версия карточки)] в порядке ленты
+    if state is None:
+        return None
+    return _etag("listing", listing, page_number, versions, total_pages, next_cursor, state)
+
+
+def cached_listing_etag(state, listing, page_number):
+    # по записи ленты в кэше; page_number уже приведён менеджером (clean_page_number)
+    entry = peek_listing_page(listing, page_number)
+    if entry is None or state is None:
+        return None
+    versions = card_versions(entry.ids)
+    return listing_etag(
+        state, listing, page_number,
+        [(question_id, versions[question_id]) for question_id, _ in entry.ids],
+        entry.total_pages, entry.next_cursor,
+    )
+
+
+def question_etag(state, question_id, page_number, version):
+    # version из detail_version: рейтинг и ответы вопроса меняют его версии (голоса,
+    # новые ответы, правильный ответ), аватары автора и отвечавших — версии авторов
+    if state is None or version[2] is None:
+        return None
+    return _etag("question", question_id, page_number, version, state)
+
+
+def not_modified(request, etag):
+    if etag is None:
+        return None
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        add_validator(response, etag)
+    return response
+
+
+def add_validator(response, etag):
+    if etag is None:
+        return response
+    response["ETag"] = etag
+    # страница своя у каждого зрителя: общим кэшам не хранить, браузеру — сверять
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
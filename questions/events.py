@@ -0,0 +1,98 @@
+import asyncio
+import json
+import re
+from importlib import import_module
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.contrib.auth import aget_user
+from django.http.cookie import parse_cookie
+
+from .live import get_live_broker
+from .models import Question
+
+EVENTS_PATH_RE = re.compile(r"^/questions/(\d+)/events/$")
+
+EVENT_STREAM_HEADERS = [
+    (b"content-type", b"text/event-stream; charset=utf-8"),
+    (b"cache-control", b"no-cache"),
+    # nginx не копит поток в буфере
+    (b"x-accel-buffering", b"no"),
+]
+
+
+def format_event(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode()
+
+
+async def check_access(cookie_header, question_id):
+    # как LoginRequiredMiddleware: поток только вошедшим, по их сессии
+    cookies = parse_cookie(cookie_header)
+    session_store = import_module(settings.SESSION_ENGINE).SessionStore
+    request = SimpleNamespace(session=session_store(cookies.get(settings.SESSION_COOKIE_NAME)))
+    if not (await aget_user(request)).is_authenticated:
+        return 403
+    if not await Question.objects.filter(pk=question_id).aexists():
+        return 404
+    return 200
+
+
+async def wait_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+class QuestionEventsApplication:
+    """
+    ASGI-обёртка над приложением Django. Поток событий вопроса (server-sent events)
+    отдаёт сама, мимо middleware: у Django каждый запрос держал бы поток и
+    соединение с базой до конца стрима, а здесь подписчик — корутина и очередь.
+    Остальные запросы уходят в Django как есть.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "GET":
+            match = EVENTS_PATH_RE.match(scope["path"])
+            broker = get_live_broker()
+            if match and broker is not None:
+                return await self.stream(scope, receive, send, broker, int(match[1]))
+        return await self.application(scope, receive, send)
+
+    async def stream(self, scope, receive, send, broker, question_id):
+        cookie_header = dict(scope["headers"]).get(b"cookie", b"").decode("latin-1")
+        status = await check_access(cookie_header, question_id)
+        if status != 200:
+            await send({"type": "http.response.start", "status": status, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        keepalive = getattr(settings, "LIVE_UPDATES_KEEPALIVE", 20)
+        subscription = broker.subscribe(question_id)
+        disconnected = asyncio.ensure_future(wait_disconnect(receive))
+        next_event = None
+        try:
+            await send({"type": "http.response.start", "status": 200, "headers": EVENT_STREAM_HEADERS})
+            # браузер переподключится сам через 5 секунд после обрыва
+            await send({"type": "http.response.body", "body": b"retry: 5000\n\n", "more_body": True})
+            while True:
+                if next_event is None:
+                    next_event = asyncio.ensure_future(subscription.get())
+                done, _ = await asyncio.wait(
+                    {next_event, disconnected}, timeout=keepalive, return_when=asyncio.FIRST_COMPLETED,
+                )
+                if disconnected in done:
+                    break
+                if next_event in done:
+                    body, next_event = format_event(next_event.result()), None
+                else:
+                    # комментарий раз в keepalive секунд: прокси не рвут молчащее соединение
+                    body = b": keepalive\n\n"
+                await send({"type": "http.response.body", "body": body, "more_body": True})
+        finally:
+            broker.unsubscribe(subscription)
+            for future in (next_event, disconnected):
+                if future is not None:
+                    future.cancel()
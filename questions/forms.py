@@ -1,5 +1,10 @@
+import re
+
 from django import forms
-from .models import Question, Answer
+
+from .models import Answer, Question
+
+TAG_SEPARATORS_RE = re.compile(r"[\s,;]+")
 
 
 class QuestionForm(forms.ModelForm):
@@ -24,8 +29,8 @@ class QuestionForm(forms.ModelForm):
         if not raw:
             return []
 
-        parts = raw.replace(",", ";", ".").split()
-        parts = [p.strip() for p in parts if p.strip()]
+        # теги разделяются пробелами, запятыми или точкой с запятой и хранятся в нижнем регистре
+        parts = [p.lower() for p in TAG_SEPARATORS_RE.split(raw) if p]
 
         result = []
         for p in parts:
@@ -0,0 +1,170 @@
+import math
+import random
+import time
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from StackOverflow.routers import primary_reads
+
+from .cards import card_versions
+from .pagination import QuestionPageResult
+
+NEW_LISTING = "new"
+HOT_LISTING = "hot"
+
+
+def tag_listing(tag_id):
+    return f"tag:{tag_id}"
+
+
+class ListingEntry(NamedTuple):
+    # [(id вопроса, id автора)] в порядке ленты
+    ids: list
+    total_pages: int
+    next_cursor: str | None
+    count_estimated: bool
+    # логическое время устаревания и сколько секунд заняла сборка (для раннего пересчёта)
+    expires_at: float
+    build_seconds: float
+
+
+def _page_key(listing, page_number):
+    return f"listing:{listing}:{page_number}"
+
+
+def _lock_key(listing, page_number):
+    return f"listing:lock:{listing}:{page_number}"
+
+
+def _object_key(question_id, version):
+    return "listing:obj:{}:{}:{}".format(question_id, *version)
+
+
+def _object_timeout():
+    return getattr(settings, "CARD_CACHE_TIMEOUT", 3600)
+
+
+def _listing_timeout():
+    return getattr(settings, "LISTING_CACHE_TIMEOUT", 30)
+
+
+def _should_rebuild(entry, now):
+    # XFetch: чем ближе expires_at и чем дольше сборка, тем вероятнее пересчёт заранее,
+    # поэтому одновременно пересчитывают единицы, а не все, кто пришёл после истечения
+    beta = getattr(settings, "LISTING_CACHE_EARLY_BETA", 1.0)
+    return now - entry.build_seconds * beta * math.log(1.0 - random.random()) >= entry.expires_at
+
+
+def _wait_for_entry(key):
+    # кто-то уже собирает эту страницу — ждём его результат, а не идём в базу
+    deadline = time.monotonic() + getattr(settings, "LISTING_CACHE_WAIT", 0.5)
+    while time.monotonic() < deadline:
+        time.sleep(0.02)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def cache_questions(questions):
+    # гидрированные вопросы по ключу с версией карточки — голос или новый ответ
+    # меняют версию, и старый объект просто перестаёт читаться
+    versions = card_versions([(question.id, question.user_id) for question in questions])
+    cache.set_many(
+        {_object_key(question.id, versions[question.id]): question for question in questions},
+        _object_timeout(),
+    )
+    for question in questions:
+        question.card_version = versions[question.id]
+    return questions
+
+
+def cached_questions(pairs, load):
+    # вопросы из кэша объектов, промахи — через load(ids) одним запросом
+    versions = card_versions(pairs)
+    keys = {question_id: _object_key(question_id, versions[question_id]) for question_id, _ in pairs}
+    found = cache.get_many(list(keys.values()))
+
+    missing = [question_id for question_id, key in keys.items() if key not in found]
+    if missing:
+        # ложится в кэш под свежей версией — читаем не с отстающей реплики
+        with primary_reads():
+            loaded = load(missing)
+        cache.set_many({keys[question.id]: question for question in loaded}, _object_timeout())
+        found.update({keys[question.id]: question for question in loaded})
+
+    questions = []
+    for question_id, _ in pairs:
+        question = found.get(keys[question_id])
+        if question is not None:
+            question.card_version = versions[question_id]
+            questions.append(question)
+    return questions
+
+
+def get_listing_page(listing, page_number, build, load):
+    """
+    Страница ленты: порядок id из кэша с коротким TTL, сами вопросы — из кэша объектов.
+    build() собирает страницу из базы и возвращает QuestionPageResult,
+    load(ids) догружает вопросы, которых нет в кэше объектов.
+    """
+    key = _page_key(listing, page_number)
+    lock_key = _lock_key(listing, page_number)
+    entry = cache.get(key)
+
+    if entry is not None and not _should_rebuild(entry, time.time()):
+        return _page_from_entry(entry, load)
+
+    locked = cache.add(lock_key, 1, getattr(settings, "LISTING_CACHE_LOCK_TIMEOUT", 10))
+    if not locked:
+        # пересчёт уже идёт в другом запросе: отдаём старую запись или дожидаемся новой
+        if entry is None:
+            entry = _wait_for_entry(key)
+        if entry is not None:
+            return _page_from_entry(entry, load)
+
+    try:
+        started = time.monotonic()
+        with primary_reads():
+            result = build()
+        build_seconds = time.monotonic() - started
+        cache_questions(result.questions)
+        ttl = _listing_timeout()
+        entry = ListingEntry(
+            [(question.id, question.user_id) for question in result.questions],
+            result.total_pages,
+            result.next_cursor,
+            result.count_estimated,
+            time.time() + ttl,
+            build_seconds,
+        )
+        # физически запись живёт дольше логического TTL — её отдают, пока идёт пересчёт
+        cache.set(key, entry, ttl * 2)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return result
+
+
+def peek_listing_page(listing, page_number):
+    # свежая запись страницы без сборки и без ожидания; None — её ещё будут собирать
+    entry = cache.get(_page_key(listing, page_number))
+    if entry is None or entry.expires_at <= time.time():
+        return None
+    return entry
+
+
+def _page_from_entry(entry, load):
+    return QuestionPageResult(
+        cached_questions(entry.ids, load),
+        entry.total_pages,
+        entry.next_cursor,
+        None,
+        entry.count_estimated,
+    )
+
+
+def invalidate_listings(listings, pages):
+    cache.delete_many([_page_key(listing, page) for listing in listings for page in range(1, pages + 1)])
@@ -0,0 +1,215 @@
+import asyncio
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    Очередь событий одного открытого потока. Живёт в цикле событий ASGI-сервера:
+    ждущий подписчик — корутина, а не поток.
+    """
+
+    def __init__(self, question_id, queue_size=100):
+        self.question_id = question_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(queue_size)
+
+    def push(self, event):
+        # зовут из потоков вьюх и опросчика — в очередь кладёт сам цикл
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # цикл уже закрыт, поток вот-вот отпишется
+            pass
+
+    def _put(self, event):
+        if self.queue.full():
+            # медленный клиент: старое событие выбрасываем, свежее важнее
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class LiveBroker:
+    """
+    Pub/sub событий вопроса: рейтинги, новые ответы, правильный ответ. Подписчиков
+    своего процесса раздаёт сам, доставку между воркерами делает наследник.
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def publish(self, question_id, event):
+        raise NotImplementedError
+
+    def subscribe(self, question_id):
+        subscription = Subscription(int(question_id), self.queue_size)
+        with self._lock:
+            self._subscribers[subscription.question_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.question_id)
+            if subscribers is None:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.question_id]
+
+    def channels(self):
+        with self._lock:
+            return list(self._subscribers)
+
+    def _deliver(self, question_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(int(question_id), ()))
+        for subscription in subscribers:
+            subscription.push(event)
+
+    def shutdown(self):
+        pass
+
+
+class MemoryLiveBroker(LiveBroker):
+    """Всё в памяти процесса: подписчики другого воркера событий не увидят."""
+
+    def publish(self, question_id, event):
+        self._deliver(question_id, event)
+
+
+class CacheLiveBroker(LiveBroker):
+    """
+    События лежат в общем кэше: у вопроса счётчик (incr атомарен) и по ключу на
+    событие. Один опросчик на процесс раз в interval секунд читает счётчики
+    вопросов, на которые кто-то подписан, и раздаёт новые события своим подписчикам.
+    """
+
+    # событие в кэше нужно, пока его не прочитали опросчики всех воркеров
+    EVENT_TIMEOUT = 60
+
+    def __init__(self, queue_size=100, interval=0.5, cache_alias="default"):
+        super().__init__(queue_size)
+        self.interval = interval
+        self.cache = caches[cache_alias]
+        self._seen = {}
+        self._poller = None
+        self._poller_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    @staticmethod
+    def _counter_key(question_id):
+        return f"live:{question_id}"
+
+    @staticmethod
+    def _event_key(question_id, number):
+        return f"live:{question_id}:{number}"
+
+    def publish(self, question_id, event):
+        counter_key = self._counter_key(question_id)
+        self.cache.add(counter_key, 0, timeout=None)
+        number = self.cache.incr(counter_key)
+        self.cache.set(self._event_key(question_id, number), event, timeout=self.EVENT_TIMEOUT)
+
+    def subscribe(self, question_id):
+        subscription = super().subscribe(question_id)
+        self._ensure_poller()
+        return subscription
+
+    def poll(self):
+        channels = self.channels()
+        # отписанные вопросы забываем, новые начинаем читать с текущего счётчика
+        self._seen = {question_id: self._seen.get(question_id) for question_id in channels}
+        if not channels:
+            return 0
+        counters = self.cache.get_many([self._counter_key(question_id) for question_id in channels])
+        delivered = 0
+        for question_id in channels:
+            last = counters.get(self._counter_key(question_id), 0)
+            seen = self._seen[question_id]
+            self._seen[question_id] = last
+            if seen is None or last <= seen:
+                continue
+            # больше очереди подписчика читать незачем — старые он всё равно выбросит
+            first = max(seen, last - self.queue_size) + 1
+            keys = [self._event_key(question_id, number) for number in range(first, last + 1)]
+            events = self.cache.get_many(keys)
+            for key in keys:
+                if key in events:
+                    self._deliver(question_id, events[key])
+                    delivered += 1
+        return delivered
+
+    def _ensure_poller(self):
+        if self._poller is not None or self._stopped.is_set():
+            return
+        with self._poller_lock:
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._run, name="live-updates-poller", daemon=True)
+                self._poller.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Не удалось прочитать события вопросов из кэша")
+
+    def shutdown(self):
+        self._stopped.set()
+        if self._poller is not None:
+            self._poller.join(timeout=self.interval + 1)
+
+
+BROKER_CLASSES = {
+    "memory": MemoryLiveBroker,
+    "cache": CacheLiveBroker,
+}
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_live_broker():
+    global _broker
+    mode = getattr(settings, "LIVE_UPDATES_BACKEND", None)
+    if not mode:
+        return None
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                options = {"queue_size": getattr(settings, "LIVE_UPDATES_QUEUE_SIZE", 100)}
+                if mode == "cache":
+                    options["interval"] = getattr(settings, "LIVE_UPDATES_POLL_INTERVAL", 0.5)
+                _broker = BROKER_CLASSES[mode](**options)
+                atexit.register(_broker.shutdown)
+    return _broker
+
+
+def publish_question_event(question_id, event_type, **data):
+    """Событие уходит подписчикам вопроса после коммита; без коммита — не уходит."""
+    broker = get_live_broker()
+    if broker is None:
+        return
+    event = {"type": event_type, **data}
+
+    def publish():
+        try:
+            broker.publish(question_id, event)
+        except Exception:
+            # живые обновления — не повод ронять голос или ответ
+            logger.exception("Не удалось опубликовать событие вопроса %s", question_id)
+
+    transaction.on_commit(publish)
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+
+from questions.models import Question
+from questions.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Заполняем поисковый вектор вопросов пачками по диапазонам id"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--only-missing', action='store_true',
+                            help="Только вопросы, у которых вектор ещё не заполнен")
+        parser.add_argument('--sleep', type=float, default=0)
+
+    def handle(self, *args, **kwargs):
+        chunk_size = kwargs["chunk_size"]
+        backend = get_search_backend()
+        if not backend.ranks_in_db:
+            self.stdout.write("База не Postgres: поиск идёт по индексу в памяти, заполнять нечего")
+            return
+
+        bounds = Question.objects.aggregate(lo=Min("id"), hi=Max("id"))
+        if bounds["lo"] is None:
+            self.stdout.write("Вопросов нет")
+            return
+
+        updated = 0
+        started = time.monotonic()
+        for start in range(bounds["lo"], bounds["hi"] + 1, chunk_size):
+            questions = Question.objects.filter(id__gte=start, id__lt=start + chunk_size)
+            if kwargs["only_missing"]:
+                questions = questions.filter(search_vector__isnull=True)
+            with transaction.atomic():
+                updated += backend.index_questions(questions)
+            if kwargs["sleep"]:
+                time.sleep(kwargs["sleep"])
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"Проиндексировано {updated} вопросов за {elapsed:.1f} c"))
@@ -0,0 +1,117 @@
+import json
+from io import StringIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from questions.benchmark import (
+    BenchmarkRunner,
+    ThroughputRunner,
+    check_budgets,
+    load_baseline,
+    pick_fixtures,
+)
+
+DEFAULT_BASELINE = Path(__file__).resolve().parents[2] / "benchmark_baseline.json"
+
+# свой кэш в памяти: ключи тестовой базы не должны попасть в общий кэш
+BENCHMARK_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "benchmark"}}
+
+
+class Command(BaseCommand):
+    help = (
+        "Гоняем ленты, вопрос и голосование через тестовый клиент на отдельной тестовой базе, "
+        "считаем p50/p95/p99 и число запросов и сверяем с бюджетами из baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ratio', type=int, default=10, help="Размер данных, как у fill_db")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--output', help="Куда записать результаты в JSON (по умолчанию stdout)")
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+        parser.add_argument('--tolerance', type=float, default=1.0,
+                            help="Множитель к бюджетам задержки (на медленной машине)")
+        parser.add_argument('--no-check', action='store_true', help="Не сверять с baseline")
+        parser.add_argument('--write-baseline', action='store_true',
+                            help="Записать в baseline текущие запросы и p95 с запасом --headroom")
+        parser.add_argument('--headroom', type=float, default=3.0)
+        parser.add_argument('--throughput', action='store_true',
+                            help="Дополнительно сравнить запросы в секунду через WSGI и ASGI")
+        parser.add_argument('--concurrency', type=int, default=8,
+                            help="Число воркеров для --throughput: потоков у WSGI и задач у ASGI")
+        parser.add_argument('--requests', type=int, default=200, help="Запросов на ленту для --throughput")
+
+    def handle(self, *args, **kwargs):
+        setup_test_environment()
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            # тестовая база одна: реплика из настроек смотрела бы в настоящую
+            with override_settings(CACHES=BENCHMARK_CACHES, DATABASE_REPLICA=None):
+                results, throughput = self.run_benchmark(kwargs)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            "meta": {
+                "ratio": kwargs["ratio"],
+                "iterations": kwargs["iterations"],
+                "database": connection.vendor,
+                "vote_rating_buffer": getattr(settings, "VOTE_RATING_BUFFER", None),
+            },
+            "views": results,
+        }
+        if throughput is not None:
+            report["throughput"] = {
+                "concurrency": kwargs["concurrency"],
+                "requests": kwargs["requests"],
+                "views": throughput,
+            }
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if kwargs["output"]:
+            Path(kwargs["output"]).write_text(output + "\n", encoding="utf-8")
+        else:
+            self.stdout.write(output)
+
+        if kwargs["write_baseline"]:
+            self.write_baseline(kwargs["baseline"], results, kwargs["headroom"])
+            return
+        if kwargs["no_check"]:
+            return
+
+        violations = check_budgets(results, load_baseline(kwargs["baseline"]), kwargs["tolerance"])
+        if violations:
+            raise CommandError("Бюджеты превышены:\n" + "\n".join(violations))
+        self.stderr.write(self.style.SUCCESS("Все бюджеты соблюдены"))
+
+    def run_benchmark(self, options):
+        call_command("fill_db", options["ratio"], workers=1, seed=options["seed"], stdout=StringIO())
+        fixtures = pick_fixtures()
+
+        client = Client()
+        client.force_login(fixtures.user)
+        # параллельные чтения gather_reads тоже проходят через счётчик запросов
+        results = BenchmarkRunner(client, options["iterations"], options["warmup"]).run(fixtures)
+
+        throughput = None
+        if options["throughput"]:
+            runner = ThroughputRunner(client.cookies, options["concurrency"], options["requests"])
+            throughput = runner.run(fixtures)
+        return results, throughput
+
+    def write_baseline(self, path, results, headroom):
+        # задержка шумит между машинами, поэтому запас и нижняя граница; запросы — точно
+        baseline = {
+            name: {"queries": result["queries"], "p95_ms": max(round(result["p95_ms"] * headroom, 1), 50.0)}
+            for name, result in results.items()
+        }
+        Path(path).write_text(json.dumps(baseline, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        self.stderr.write(self.style.SUCCESS(f"Baseline записан в {path}"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from questions.cards import card_cache_stats, reset_card_cache_stats
+from questions.checks import process_local_cache
+
+
+class Command(BaseCommand):
+    help = "Попадания и промахи кэша карточек вопросов"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Обнулить счётчики после вывода")
+
+    def handle(self, *args, **kwargs):
+        if process_local_cache():
+            # у команды свой процесс и свой LocMemCache — счётчики сервера ей не видны
+            self.stderr.write("Кэш default в памяти процесса: это счётчики только этой команды")
+        stats = card_cache_stats()
+        self.stdout.write(
+            f"Попаданий: {stats['hits']}, промахов: {stats['misses']}, "
+            f"доля попаданий: {stats['hit_ratio']:.1%}"
+        )
+        if kwargs["reset"]:
+            reset_card_cache_stats()
+            self.stdout.write(self.style.SUCCESS("Счётчики обнулены"))
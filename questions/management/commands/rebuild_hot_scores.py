@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+
+from questions.models import Question, compute_hot_score
+
+
+class Command(BaseCommand):
+    help = "Пересчитываем hot_score вопросов пачками по диапазонам id"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0,
+                            help="Пауза между пачками в секундах, чтобы не грузить базу")
+
+    def handle(self, *args, **kwargs):
+        chunk_size = kwargs["chunk_size"]
+        pause = kwargs["sleep"]
+
+        bounds = Question.objects.aggregate(lo=Min("id"), hi=Max("id"))
+        if bounds["lo"] is None:
+            self.stdout.write("Вопросов нет")
+            return
+
+        updated = 0
+        started = time.monotonic()
+        for start in range(bounds["lo"], bounds["hi"] + 1, chunk_size):
+            # короткая транзакция на пачку: блокируются только её строки. Читаем их
+            # под FOR UPDATE — иначе сдвиг hot_score голосом (hot_score_updates) между
+            # чтением и bulk_update затёрся бы значением, посчитанным до голоса
+            with transaction.atomic():
+                rows = Question.objects.filter(
+                    id__gte=start, id__lt=start + chunk_size,
+                ).order_by("id").select_for_update().values_list("id", "rating", "answer_count", "created_at")
+
+                changed = []
+                for qid, rating, answer_count, created_at in rows:
+                    changed.append(Question(id=qid, hot_score=compute_hot_score(rating, answer_count, created_at)))
+                Question.objects.bulk_update(changed, ["hot_score"])
+            updated += len(changed)
+
+            if pause:
+                time.sleep(pause)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"Пересчитано {updated} вопросов за {elapsed:.1f} c"))
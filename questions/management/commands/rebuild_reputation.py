@@ -0,0 +1,60 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+
+from questions.models import Answer, Question, Reputation
+from questions.reputation import reputation_score
+
+
+def _per_user(queryset, value):
+    return dict(queryset.order_by().values("user_id").annotate(v=value).values_list("user_id", "v"))
+
+
+class Command(BaseCommand):
+    help = "Полностью пересчитываем репутацию пользователей пачками по диапазонам id"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **kwargs):
+        chunk_size = kwargs["chunk_size"]
+
+        bounds = User.objects.aggregate(lo=Min("id"), hi=Max("id"))
+        if bounds["lo"] is None:
+            self.stdout.write("Пользователей нет")
+            return
+
+        updated = 0
+        started = time.monotonic()
+        for start in range(bounds["lo"], bounds["hi"] + 1, chunk_size):
+            users = {"user_id__gte": start, "user_id__lt": start + chunk_size}
+            question_rating = _per_user(Question.objects.filter(**users), Sum("rating"))
+            answer_rating = _per_user(Answer.objects.filter(**users), Sum("rating"))
+            accepted = _per_user(Answer.objects.filter(is_correct=True, **users), Count("id"))
+
+            user_ids = User.objects.filter(id__gte=start, id__lt=start + chunk_size).values_list("id", flat=True)
+            rows = []
+            for user_id in user_ids:
+                q, a, c = question_rating.get(user_id) or 0, answer_rating.get(user_id) or 0, accepted.get(user_id, 0)
+                rows.append(Reputation(
+                    user_id=user_id,
+                    question_rating=q,
+                    answer_rating=a,
+                    accepted_answers=c,
+                    score=reputation_score(q, a, c),
+                ))
+
+            with transaction.atomic():
+                Reputation.objects.bulk_create(
+                    rows,
+                    update_conflicts=True,
+                    unique_fields=["user"],
+                    update_fields=["question_rating", "answer_rating", "accepted_answers", "score"],
+                )
+            updated += len(rows)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"Пересчитана репутация {updated} пользователей за {elapsed:.1f} c"))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from questions.models import Answer, AnswerMark, Question, QuestionMark
+from questions.vote_buffer import find_rating_drift, get_rating_buffer
+
+
+class Command(BaseCommand):
+    help = "Сверяем rating вопросов и ответов с суммой оценок"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100)
+
+    def handle(self, *args, **kwargs):
+        limit = kwargs["limit"]
+
+        buffer = get_rating_buffer()
+        if buffer is not None:
+            buffer.flush()
+
+        checks = [
+            ("Вопросы", Question, QuestionMark, "question"),
+            ("Ответы", Answer, AnswerMark, "answer"),
+        ]
+        total = 0
+        for title, model, mark_model, target_field in checks:
+            drift = find_rating_drift(model, mark_model, target_field, limit=limit)
+            total += len(drift)
+            for pk, rating, expected in drift:
+                self.stdout.write(f"{title}: id={pk} rating={rating} сумма оценок={expected}")
+
+        if total:
+            self.stdout.write(self.style.WARNING(f"Расхождений: {total}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Расхождений нет"))
@@ -0,0 +1,196 @@
+import time
+from collections.abc import Callable
+from typing import NamedTuple
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max, Min
+
+from questions.cards import question_card_changed
+from questions.models import (
+    Answer,
+    AnswerMark,
+    Question,
+    QuestionMark,
+    compute_hot_score,
+)
+from questions.vote_buffer import get_rating_buffer
+
+
+class Counter(NamedTuple):
+    column: str
+    source: type
+    fk: str
+    aggregate: str
+
+
+class Recount(NamedTuple):
+    title: str
+    model: type
+    counters: list
+    # вызывается с id обновлённых строк внутри транзакции пачки
+    on_updated: Callable = None
+
+
+def _refresh_questions(ids):
+    # rating и answer_count поменялись — вместе с ними hot_score и карточки в кэше
+    rows = Question.objects.filter(id__in=ids).values_list("id", "rating", "answer_count", "created_at")
+    Question.objects.bulk_update(
+        [
+            Question(id=qid, hot_score=compute_hot_score(rating, answer_count, created_at))
+            for qid, rating, answer_count, created_at in rows
+        ],
+        ["hot_score"],
+    )
+    transaction.on_commit(lambda: [question_card_changed(qid) for qid in ids])
+
+
+RECOUNTS = [
+    Recount(
+        "Вопросы",
+        Question,
+        [
+            Counter("rating", QuestionMark, "question", "SUM(mark)"),
+            Counter("answer_count", Answer, "question", "COUNT(*)"),
+        ],
+        on_updated=_refresh_questions,
+    ),
+    Recount(
+        "Ответы",
+        Answer,
+        [Counter("rating", AnswerMark, "answer", "SUM(mark)")],
+    ),
+]
+
+
+def _aggregate_sql(recount):
+    # id + правильные значения счётчиков для строк [lo, hi): каждое агрегирование —
+    # GROUP BY по тому же диапазону внешнего ключа, без коррелированных подзапросов
+    qn = connection.ops.quote_name
+    opts = recount.model._meta
+    pk = qn(opts.pk.column)
+    selects = [f"base.{pk} AS row_id"]
+    joins = []
+    for i, counter in enumerate(recount.counters):
+        source = counter.source._meta
+        fk = qn(source.get_field(counter.fk).column)
+        joins.append(
+            f"LEFT JOIN (SELECT {fk} AS ref, {counter.aggregate} AS total FROM {qn(source.db_table)} "
+            f"WHERE {fk} >= %s AND {fk} < %s GROUP BY {fk}) s{i} ON s{i}.ref = base.{pk}"
+        )
+        selects.append(f"COALESCE(s{i}.total, 0) AS {qn(counter.column)}")
+    sql = (
+        f"SELECT {', '.join(selects)} FROM {qn(opts.db_table)} base {' '.join(joins)} "
+        f"WHERE base.{pk} >= %s AND base.{pk} < %s"
+    )
+    return sql, len(recount.counters) + 1
+
+
+def _lock_rows(recount, chunk):
+    # Строки пачки блокируем до агрегирования. Голос или ответ меняет счётчик строки
+    # в той же транзакции, что и строку-источник: успел закоммититься — агрегат его
+    # увидит, не успел — его UPDATE счётчика подождёт нас и ляжет поверх пересчёта.
+    # Без блокировки UPDATE ... FROM перезаписал бы такой голос значением из снимка.
+    # На SQLite select_for_update ничего не делает: там запись и так одна на базу
+    lo, hi = chunk
+    rows = recount.model.objects.filter(id__gte=lo, id__lt=hi).order_by("id").select_for_update()
+    list(rows.values_list("id", flat=True))
+
+
+def _drift_condition(recount):
+    qn = connection.ops.quote_name
+    return " OR ".join(
+        f"t.{qn(c.column)} IS NULL OR t.{qn(c.column)} <> agg.{qn(c.column)}" for c in recount.counters
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитываем rating и answer_count вопросов и rating ответов из таблиц оценок и ответов "
+        "одним UPDATE ... FROM на пачку id. Строки пачки блокируются (SELECT ... FOR UPDATE) до "
+        "агрегирования, поэтому голоса и ответы на живой базе не теряются, но ждут конец пачки — "
+        "на нагруженной базе берите --chunk-size поменьше. Буфер рейтингов этого процесса "
+        "сбрасывается заранее; буферы других воркеров (VOTE_RATING_BUFFER) команда не видит — "
+        "их дельты лягут поверх пересчёта второй раз, поэтому с буфером сбросьте их перед запуском"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--dry-run', action='store_true', help="Только показать расхождения")
+        parser.add_argument('--only-changed', action='store_true',
+                            help="Обновлять только строки с расхождением (меньше блокировок на живой базе)")
+        parser.add_argument('--limit', type=int, default=20, help="Сколько расхождений печатать в --dry-run")
+        parser.add_argument('--sleep', type=float, default=0,
+                            help="Пауза между пачками в секундах, чтобы не грузить базу")
+
+    def handle(self, *args, **kwargs):
+        buffer = get_rating_buffer()
+        if buffer is not None:
+            buffer.flush()
+
+        for recount in RECOUNTS:
+            bounds = recount.model.objects.aggregate(lo=Min("id"), hi=Max("id"))
+            if bounds["lo"] is None:
+                continue
+
+            started = time.monotonic()
+            touched = 0
+            for start in range(bounds["lo"], bounds["hi"] + 1, kwargs["chunk_size"]):
+                chunk = (start, start + kwargs["chunk_size"])
+                if kwargs["dry_run"]:
+                    touched += self.report_drift(recount, chunk, kwargs["limit"] - touched)
+                else:
+                    touched += self.update(recount, chunk, kwargs["only_changed"])
+                if kwargs["sleep"]:
+                    time.sleep(kwargs["sleep"])
+
+            elapsed = time.monotonic() - started
+            if kwargs["dry_run"]:
+                message = f"{recount.title}: расхождений {touched}"
+                self.stdout.write(self.style.WARNING(message) if touched else self.style.SUCCESS(message))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"{recount.title}: обновлено {touched} строк за {elapsed:.1f} c"))
+
+    def report_drift(self, recount, chunk, limit):
+        qn = connection.ops.quote_name
+        aggregate, repeats = _aggregate_sql(recount)
+        columns = ", ".join(f"t.{qn(c.column)}, agg.{qn(c.column)}" for c in recount.counters)
+        sql = (
+            f"SELECT t.{qn(recount.model._meta.pk.column)}, {columns} "
+            f"FROM {qn(recount.model._meta.db_table)} t JOIN ({aggregate}) agg "
+            f"ON t.{qn(recount.model._meta.pk.column)} = agg.row_id WHERE {_drift_condition(recount)} ORDER BY 1"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, list(chunk) * repeats)
+            rows = cursor.fetchall()
+
+        for row in rows[:max(limit, 0)]:
+            values = ", ".join(
+                f"{c.column}={row[1 + 2 * i]} -> {row[2 + 2 * i]}" for i, c in enumerate(recount.counters)
+            )
+            self.stdout.write(f"{recount.title}: id={row[0]} {values}")
+        return len(rows)
+
+    def update(self, recount, chunk, only_changed):
+        qn = connection.ops.quote_name
+        aggregate, repeats = _aggregate_sql(recount)
+        pk = qn(recount.model._meta.pk.column)
+        assignments = ", ".join(f"{qn(c.column)} = agg.{qn(c.column)}" for c in recount.counters)
+        sql = (
+            f"UPDATE {qn(recount.model._meta.db_table)} AS t SET {assignments} "
+            f"FROM ({aggregate}) AS agg WHERE t.{pk} = agg.row_id"
+        )
+        if only_changed:
+            sql += f" AND ({_drift_condition(recount)})"
+        # SQLite не принимает в RETURNING имя с псевдонимом таблицы
+        sql += f" RETURNING {pk}"
+
+        # короткая транзакция на пачку: блокируются только её строки
+        with transaction.atomic():
+            _lock_rows(recount, chunk)
+            with connection.cursor() as cursor:
+                cursor.execute(sql, list(chunk) * repeats)
+                ids = [row[0] for row in cursor.fetchall()]
+            if ids and recount.on_updated is not None:
+                recount.on_updated(ids)
+        return len(ids)
@@ -1,25 +1,109 @@
-from django.db.models import Q
-from django.db import models
 from django.apps import apps
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Prefetch, Q
+from django.db.models.functions import Lower
+
+from .counting import LISTING_ALL_QUESTIONS, get_count_strategy, tag_listing_key
+from .listing_cache import HOT_LISTING, NEW_LISTING, get_listing_page, tag_listing
+from .pagination import (
+    CURSOR_NEXT,
+    CURSOR_PREVIOUS,
+    AnswerPageResult,
+    QuestionPageResult,
+    encode_cursor,
+)
+from .vote_buffer import merge_pending_ratings
+
+
+def _reverse_ordering(ordering):
+    return [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+
+
+def _seek_filter(ordering, values):
+    # (a, b, id) < (va, vb, vid) в развёрнутом виде:
+    # a < va OR (a = va AND b < vb) OR (a = va AND b = vb AND id < vid)
+    condition = Q()
+    equal = {}
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= Q(**equal, **{f'{name}__{lookup}': value})
+        equal[name] = value
+    return condition
 
 
 class QuestionManager(models.Manager):
     QUESTION_COUNT_PAGE = 10
+    # Дальше этих страниц OFFSET не используем, только курсор
+    NUMBERED_PAGE_LIMIT = 10
+
+    NEW_ORDERING = ('-created_at', '-id')
+    HOT_ORDERING = ('-hot_score', '-id')
+
+    # Колонки, которые нужны карточке вопроса в index.html
+    CARD_FIELDS = (
+        'topic', 'text', 'rating', 'answer_count', 'created_at', 'hot_score',
+        'user__id', 'user__profile__id', 'user__profile__avatar', 'user__profile__avatar_thumbnail',
+    )
+
+    def hydrate(self, questions):
+        # автор, профиль и теги за фиксированное число запросов: 1 + 1 на теги
+        Tag = apps.get_model('questions', 'Tag')
+        return (
+            questions
+            .select_related('user__profile')
+            .only(*self.CARD_FIELDS)
+            .prefetch_related(Prefetch('tags', queryset=Tag.objects.only('id', 'title')))
+        )
+
+    def _cursor_values(self, question, ordering):
+        # колонки сортировок лент NOT NULL: значения кладём как есть, без подмен,
+        # иначе граница курсора разойдётся с _seek_filter
+        return [getattr(question, field.lstrip('-')) for field in ordering]
 
-    def _get_question_by_page(self, questions, page_number = 1):
+    def clean_page_number(self, value):
+        # номер страницы из запроса: мусор -> 1, дальше NUMBERED_PAGE_LIMIT только курсор
         try:
-            page_number = int(page_number)
+            page_number = int(value)
         except (TypeError, ValueError):
             page_number = 1
-        if page_number < 1:
-            page_number = 1
+        return max(1, min(page_number, self.NUMBERED_PAGE_LIMIT))
+
+    def _parse_cursor_values(self, values, ordering):
+        if len(values) != len(ordering):
+            return None
+        try:
+            return [
+                self.model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(ordering, values)
+            ]
+        except ValidationError:
+            return None
+
+
+    def _get_question_by_page(self, questions, page_number = 1, ordering = NEW_ORDERING, count_key = None, listing = None):
+        page_number = self.clean_page_number(page_number)
+
+        def build():
+            return self._load_page(questions, page_number, ordering, count_key)
 
-        question_count = questions.count()
-        all_page_count = (question_count // self.QUESTION_COUNT_PAGE) 
+        if listing is None:
+            result = build()
+        else:
+            result = get_listing_page(listing, page_number, build, self._load_questions)
+        return result._replace(questions=merge_pending_ratings(result.questions))
+
+
+    def _load_page(self, questions, page_number, ordering, count_key):
+        question_count, count_estimated = get_count_strategy().count(questions, count_key)
+        all_page_count = (question_count // self.QUESTION_COUNT_PAGE)
         if (question_count % self.QUESTION_COUNT_PAGE) > 0:
             all_page_count += 1
         if all_page_count == 0:
             all_page_count = 1
+        all_page_count = min(all_page_count, self.NUMBERED_PAGE_LIMIT)
+        page_number = min(page_number, all_page_count)
 
         start = (page_number - 1) * self.QUESTION_COUNT_PAGE
         end = start + self.QUESTION_COUNT_PAGE
@@ -30,30 +114,186 @@ class QuestionManager(models.Manager):
         if end > question_count:
             end = question_count
 
-        return [questions[start:end], all_page_count]
+        page = list(self.hydrate(questions)[start:end])
+
+        next_cursor = None
+        if ordering and page_number == all_page_count and end < question_count and page:
+            next_cursor = encode_cursor(self._cursor_values(page[-1], ordering), CURSOR_NEXT)
+
+        return QuestionPageResult(page, all_page_count, next_cursor, None, count_estimated)
+
+
+    def _load_questions(self, question_ids):
+        by_id = self.hydrate(self.get_queryset().filter(id__in=question_ids)).in_bulk()
+        return [by_id[qid] for qid in question_ids if qid in by_id]
+
+
+    def _get_question_by_cursor(self, questions, cursor, ordering, count_key = None):
+        direction, values = cursor
+        values = self._parse_cursor_values(values, ordering)
+        if values is None:
+            return self._get_question_by_page(questions, 1, ordering, count_key)
+
+        if direction == CURSOR_PREVIOUS:
+            ordering = _reverse_ordering(ordering)
+        questions = questions.filter(_seek_filter(ordering, values)).order_by(*ordering)
+        page = merge_pending_ratings(list(self.hydrate(questions)[:self.QUESTION_COUNT_PAGE + 1]))
+        has_more = len(page) > self.QUESTION_COUNT_PAGE
+        page = page[:self.QUESTION_COUNT_PAGE]
+
+        if direction == CURSOR_PREVIOUS:
+            ordering = _reverse_ordering(ordering)
+            page.reverse()
+            next_cursor = encode_cursor(self._cursor_values(page[-1], ordering), CURSOR_NEXT) if page else None
+            previous_cursor = None
+            if has_more:
+                previous_cursor = encode_cursor(self._cursor_values(page[0], ordering), CURSOR_PREVIOUS)
+        else:
+            next_cursor = None
+            if has_more:
+                next_cursor = encode_cursor(self._cursor_values(page[-1], ordering), CURSOR_NEXT)
+            previous_cursor = encode_cursor(self._cursor_values(page[0], ordering), CURSOR_PREVIOUS) if page else None
+
+        return QuestionPageResult(page, self.NUMBERED_PAGE_LIMIT, next_cursor, previous_cursor, True)
+
+
+    def _get_question_list(self, questions, ordering, page_number = 1, cursor = None, count_key = None, listing = None):
+        questions = questions.order_by(*ordering)
+        if cursor is not None:
+            return self._get_question_by_cursor(questions, cursor, ordering, count_key)
+        return self._get_question_by_page(questions, page_number, ordering, count_key, listing)
 
 
-    def get_hot_question(self, page_number = 1):
-        questions = self.get_queryset().order_by('-rating', '-answer_count', '-created_at')
-        return self._get_question_by_page(questions, page_number)
+    def get_hot_question(self, page_number = 1, cursor = None):
+        return self._get_question_list(
+            self.get_queryset(), self.HOT_ORDERING, page_number, cursor, LISTING_ALL_QUESTIONS, HOT_LISTING,
+        )
 
 
-    def get_new_question(self, page_number = 1):
-        questions = self.get_queryset().order_by('-created_at')
-        return self._get_question_by_page(questions, page_number)
+    def get_new_question(self, page_number = 1, cursor = None):
+        return self._get_question_list(
+            self.get_queryset(), self.NEW_ORDERING, page_number, cursor, LISTING_ALL_QUESTIONS, NEW_LISTING,
+        )
 
 
-    def get_tag_question(self, tag, page_number = 1):
+    def get_tag_question(self, tag, page_number = 1, cursor = None):
         Tag = apps.get_model('questions', 'Tag')
 
         if not tag:
-            questions = self.get_queryset()
-        elif isinstance(tag, Tag):
-            questions = self.get_queryset().filter(tags=tag)
+            return self.get_new_question(page_number, cursor)
+
+        # Тег резолвим отдельно по индексу title: дальше фильтр идёт по id,
+        # а для счётчика есть Tag.question_count
+        if isinstance(tag, Tag):
+            tag_id = tag.id
         elif isinstance(tag, int):
-            questions = self.get_queryset().filter(Q(tags__id=tag))
+            tag_id = tag
         else:
-            questions = self.get_queryset().filter(Q(tags__title=tag))
-        questions = questions.order_by('-created_at').distinct()
+            tag_id = Tag.objects.filter_titles([tag]).values_list('id', flat=True).first()
+        if tag_id is None:
+            return self._get_question_list(self.none(), self.NEW_ORDERING, page_number, cursor)
+
+        questions = self.get_queryset().filter(tags__id=tag_id)
+        return self._get_question_list(
+            questions, self.NEW_ORDERING, page_number, cursor, tag_listing_key(tag_id), tag_listing(tag_id),
+        )
+
+
+    def _get_question_by_ids(self, question_ids, page_number = 1):
+        # готовый ранжированный список id: страницу режем в памяти, грузим одним запросом
+        total = len(question_ids)
+        all_page_count = max(1, min(-(-total // self.QUESTION_COUNT_PAGE), self.NUMBERED_PAGE_LIMIT))
+        try:
+            page_number = max(1, min(int(page_number), all_page_count))
+        except (TypeError, ValueError):
+            page_number = 1
+
+        start = (page_number - 1) * self.QUESTION_COUNT_PAGE
+        page = merge_pending_ratings(self._load_questions(question_ids[start:start + self.QUESTION_COUNT_PAGE]))
+        return QuestionPageResult(page, all_page_count, None, None, False)
+
+
+    def search_question(self, query, page_number = 1):
+        from .search import get_search_backend
+
+        backend = get_search_backend()
+        if not backend.ranks_in_db:
+            return self._get_question_by_ids(backend.ranked_ids(query), page_number)
+
+        questions = backend.search(self.get_queryset(), query)
+        return self._get_question_by_page(questions, page_number, None)
+
+
+class AnswerManager(models.Manager):
+    ANSWER_COUNT_PAGE = 20
+
+    # правильный ответ первым, дальше по рейтингу; совпадает с questions_answer_order_idx
+    ORDERING = ('-is_correct', '-rating', '-id')
+
+    # Колонки для карточки ответа в question_detail.html
+    CARD_FIELDS = (
+        'text', 'is_correct', 'rating', 'created_at', 'question_id',
+        'user__id', 'user__profile__id', 'user__profile__avatar', 'user__profile__avatar_thumbnail',
+    )
+
+    def page_count(self, answer_count):
+        # число страниц — по Question.answer_count, без COUNT
+        return max(1, -(-(answer_count or 0) // self.ANSWER_COUNT_PAGE))
+
+    def _answer_page(self, question_id, page_number):
+        # страница одним запросом с автором и профилем; вопрос для неё не нужен
+        start = (page_number - 1) * self.ANSWER_COUNT_PAGE
+        return (
+            self.filter(question_id=question_id)
+            .select_related('user__profile')
+            .only(*self.CARD_FIELDS)
+            .order_by(*self.ORDERING)[start:start + self.ANSWER_COUNT_PAGE]
+        )
+
+    def get_answer_page(self, question_id, page_number):
+        return list(self._answer_page(question_id, page_number))
+
+    async def aget_answer_page(self, question_id, page_number):
+        return [answer async for answer in self._answer_page(question_id, page_number)]
+
+    def get_question_answers(self, question, page_number = 1):
+        all_page_count = self.page_count(question.answer_count)
+        try:
+            page_number = max(1, min(int(page_number), all_page_count))
+        except (TypeError, ValueError):
+            page_number = 1
+
+        answers = self.get_answer_page(question.id, page_number)
+        return AnswerPageResult(merge_pending_ratings(answers), page_number, all_page_count)
+
+
+class TagManager(models.Manager):
+
+    def filter_titles(self, titles):
+        # LOWER(title) IN (...) — идёт по уникальному индексу questions_tag_title_ci_unique
+        return self.alias(title_lower=Lower('title')).filter(title_lower__in=[title.lower() for title in titles])
+
+    def resolve_titles(self, titles):
+        """
+        id тегов по названиям без учёта регистра, в порядке titles. Известные —
+        одним SELECT, новые — одним INSERT ... ON CONFLICT DO NOTHING (гонку с
+        параллельным вопросом решает уникальный индекс) и SELECT их id.
+        """
+        from .tag_index import get_tag_index
+
+        wanted = {}
+        for title in titles:
+            wanted.setdefault(title.lower(), title)
 
-        return self._get_question_by_page(questions, page_number)
\ No newline at end of file
+        found = dict(
+            self.filter_titles(wanted).annotate(key=Lower('title')).values_list('key', 'id')
+        )
+        missing = [title for key, title in wanted.items() if key not in found]
+        if missing:
+            self.bulk_create([self.model(title=title) for title in missing], ignore_conflicts=True)
+            found.update(
+                self.filter_titles(missing).annotate(key=Lower('title')).values_list('key', 'id')
+            )
+            # bulk_create не шлёт post_save — индекс автодополнения пополняем сами
+            transaction.on_commit(lambda: [get_tag_index().add(title) for title in missing])
+        return [found[key] for key in wanted if key in found]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:50
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Question = apps.get_model('questions', 'Question')
+    Tag = apps.get_model('questions', 'Tag')
+    ListingCounter = apps.get_model('questions', 'ListingCounter')
+
+    ListingCounter.objects.update_or_create(
+        name='questions',
+        defaults={'value': Question.objects.count()},
+    )
+
+    through = Question.tags.through
+    tag_counts = (
+        through.objects.filter(tag_id=OuterRef('pk'))
+        .values('tag_id')
+        .annotate(c=Count('question_id'))
+        .values('c')
+    )
+    Tag.objects.update(question_count=Coalesce(Subquery(tag_counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0002_remove_answer_questions_a_created_ac1045_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Лента')),
+                ('value', models.BigIntegerField(default=0, verbose_name='Количество')),
+            ],
+            options={
+                'verbose_name': 'Счётчик ленты',
+                'verbose_name_plural': 'Счётчики лент',
+            },
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='question_count',
+            field=models.IntegerField(default=0, verbose_name='Количество вопросов'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
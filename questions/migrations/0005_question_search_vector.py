@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:56
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_INDEX = 'questions_question_search_gin'
+
+
+def create_search_index(apps, schema_editor):
+    # GIN есть только в Postgres; на SQLite поиск идёт по индексу в памяти
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {SEARCH_INDEX} ON questions_question USING gin (search_vector)'
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {SEARCH_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0004_question_hot_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
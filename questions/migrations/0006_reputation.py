@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('questions', '0005_question_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reputation',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='reputation', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('question_rating', models.IntegerField(default=0, verbose_name='Рейтинг вопросов')),
+                ('answer_rating', models.IntegerField(default=0, verbose_name='Рейтинг ответов')),
+                ('accepted_answers', models.IntegerField(default=0, verbose_name='Правильных ответов')),
+                ('score', models.IntegerField(db_index=True, default=0, verbose_name='Репутация')),
+            ],
+            options={
+                'verbose_name': 'Репутация',
+                'verbose_name_plural': 'Репутация',
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0006_reputation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=['question', '-is_correct', '-rating', '-id'], name='questions_answer_order_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='answer',
+            name='questions_a_questio_fe80e9_idx',
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:10
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count, Min
+from django.db.models.functions import Lower
+
+
+def merge_case_duplicates(apps, schema_editor):
+    # "Django" и "django" до индекса могли оказаться разными тегами: оставляем
+    # самый старый и переносим на него вопросы остальных
+    Question = apps.get_model('questions', 'Question')
+    Tag = apps.get_model('questions', 'Tag')
+    through = Question.tags.through
+
+    groups = (
+        Tag.objects.annotate(key=Lower('title'))
+        .values('key')
+        .annotate(n=Count('id'), keep=Min('id'))
+        .filter(n__gt=1)
+        .values_list('key', 'keep')
+    )
+    for key, keep in groups:
+        duplicates = list(
+            Tag.objects.annotate(key=Lower('title')).filter(key=key).exclude(pk=keep).values_list('id', flat=True)
+        )
+        tagged = set(through.objects.filter(tag_id=keep).values_list('question_id', flat=True))
+        through.objects.filter(tag_id__in=duplicates, question_id__in=tagged).delete()
+        moved = through.objects.filter(tag_id__in=duplicates)
+        # один вопрос мог быть помечен сразу несколькими дубликатами
+        for question_id in set(moved.values_list('question_id', flat=True)):
+            through.objects.create(question_id=question_id, tag_id=keep)
+        moved.delete()
+        Tag.objects.filter(pk__in=duplicates).delete()
+        Tag.objects.filter(pk=keep).update(question_count=through.objects.filter(tag_id=keep).count())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0007_answer_order_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_case_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('title'), name='questions_tag_title_ci_unique'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+import math
+from datetime import UTC, datetime
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Max, Min
+
+CHUNK_SIZE = 1000
+
+HOT_SCORE_EPOCH = datetime(2025, 1, 1, tzinfo=UTC)
+
+
+def compute_hot_score(rating, answer_count, created_at):
+    # копия questions.models.compute_hot_score на момент миграции: код приложения
+    # потом меняется, а миграция должна считать так же, как при её написании
+    decay = getattr(settings, 'QUESTION_HOT_DECAY_SECONDS', 45000)
+    answer_weight = getattr(settings, 'QUESTION_HOT_ANSWER_WEIGHT', 2)
+
+    votes = (rating or 0) + answer_weight * (answer_count or 0)
+    order = math.log10(max(abs(votes), 1))
+    sign = (votes > 0) - (votes < 0)
+    age = (created_at - HOT_SCORE_EPOCH).total_seconds()
+    return round(sign * order + age / decay, 7)
+
+
+def fill_hot_scores(apps, schema_editor):
+    # 0004 добавил hot_score с default 0 — без пересчёта «горячие» шли бы по id
+    Question = apps.get_model('questions', 'Question')
+    bounds = Question.objects.aggregate(lo=Min('id'), hi=Max('id'))
+    if bounds['lo'] is None:
+        return
+    for start in range(bounds['lo'], bounds['hi'] + 1, CHUNK_SIZE):
+        rows = Question.objects.filter(
+            id__gte=start, id__lt=start + CHUNK_SIZE,
+        ).values_list('id', 'rating', 'answer_count', 'created_at')
+        Question.objects.bulk_update(
+            [
+                Question(id=qid, hot_score=compute_hot_score(rating, answer_count, created_at))
+                for qid, rating, answer_count, created_at in rows
+            ],
+            ['hot_score'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0008_tag_title_ci_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_hot_scores, migrations.RunPython.noop),
+    ]
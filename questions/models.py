@@ -1,6 +1,55 @@
+import math
+from datetime import UTC, datetime
+
 from django.conf import settings
-from django.db import models
-from .managers import QuestionManager
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models import F, FloatField
+from django.db.models.functions import Abs, Cast, Coalesce, Greatest, Log, Lower, Sign
+from django.utils import timezone
+
+from .managers import AnswerManager, QuestionManager, TagManager
+
+HOT_SCORE_EPOCH = datetime(2025, 1, 1, tzinfo=UTC)
+
+
+def compute_hot_score(rating, answer_count, created_at):
+    # log10 голосов + время создания / decay: свежий вопрос с тем же рейтингом
+    # всегда выше старого, поэтому счёт меняется только при голосах и ответах
+    decay = getattr(settings, "QUESTION_HOT_DECAY_SECONDS", 45000)
+    answer_weight = getattr(settings, "QUESTION_HOT_ANSWER_WEIGHT", 2)
+
+    votes = (rating or 0) + answer_weight * (answer_count or 0)
+    order = math.log10(max(abs(votes), 1))
+    sign = (votes > 0) - (votes < 0)
+    age = ((created_at or timezone.now()) - HOT_SCORE_EPOCH).total_seconds()
+    return round(sign * order + age / decay, 7)
+
+
+def _log_votes(votes):
+    return Cast(Sign(votes), FloatField()) * Log(10, Greatest(Abs(votes), 1))
+
+
+def hot_score_updates(rating_delta=0, answer_delta=0):
+    """
+    Аргументы UPDATE для сдвига rating / answer_count вопроса вместе с hot_score —
+    без чтения строки. Часть от времени создания не меняется, пересчитываем только
+    log-часть; в SET все F() ссылаются на значения до UPDATE.
+    """
+    answer_weight = getattr(settings, "QUESTION_HOT_ANSWER_WEIGHT", 2)
+    votes_before = Coalesce(F("rating"), 0) + F("answer_count") * answer_weight
+    votes_after = votes_before + rating_delta + answer_delta * answer_weight
+    updates = {
+        "hot_score": Cast(
+            F("hot_score") - _log_votes(votes_before) + _log_votes(votes_after),
+            FloatField(),
+        ),
+    }
+    if rating_delta:
+        updates["rating"] = Coalesce(F("rating"), 0) + rating_delta
+    if answer_delta:
+        updates["answer_count"] = F("answer_count") + answer_delta
+    return updates
 
 
 class Question(models.Model):
@@ -44,6 +93,18 @@ class Question(models.Model):
         db_index=True,
         verbose_name="Время создания",
     )
+    hot_score = models.FloatField(
+        default=0,
+        blank=False,
+        null=False,
+        verbose_name="Горячесть",
+    )
+    # GIN-индекс создаётся миграцией только на Postgres
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name="Поисковый вектор",
+    )
 
     objects = QuestionManager()
 
@@ -51,20 +112,31 @@ class Question(models.Model):
     class Meta:
         verbose_name = "Вопрос"
         verbose_name_plural = "Вопросы"
+        indexes = [models.Index(fields=['-hot_score', '-id'], name='questions_question_hot_idx'),]
         
 
     def __str__(self):
         return f"Вопрос {self.id} от пользователя {self.user_id}"
     
 
-    def add_answer(self):
-        self.answer_count += 1
-        self.save(update_fields=['answer_count'])
+    def save(self, *args, **kwargs):
+        self.hot_score = compute_hot_score(self.rating, self.answer_count, self.created_at)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"rating", "answer_count"} & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "hot_score"}
+        super().save(*args, **kwargs)
+
 
+    def add_answer(self):
+        # счётчик и hot_score меняем в базе: рейтинг экземпляра мог устареть,
+        # а параллельный ответ не должен потеряться. Рейтинг меняет только questions.votes
+        from .cards import question_card_changed
 
-    def add_mark(self, mark):
-        self.rating = (self.rating or 0) + mark
-        self.save(update_fields=['rating'])
+        Question.objects.filter(pk=self.pk).update(**hot_score_updates(answer_delta=1))
+        self.refresh_from_db(fields=["rating", "answer_count", "hot_score"])
+        # save() не зовём, сигнала нет — карточку сбрасываем сами
+        question_id = self.pk
+        transaction.on_commit(lambda: question_card_changed(question_id))
 
 
 class Answer(models.Model):
@@ -105,22 +177,22 @@ class Answer(models.Model):
         verbose_name="Время создания",
     )
 
+    objects = AnswerManager()
+
 
     class Meta:
         verbose_name = "Ответ"
         verbose_name_plural = "Ответы"
-        indexes = [models.Index(fields=['question']),]
+        # покрывает и выборку ответов вопроса, и их порядок на странице
+        indexes = [
+            models.Index(fields=['question', '-is_correct', '-rating', '-id'], name='questions_answer_order_idx'),
+        ]
 
 
     def __str__(self):
         return f"Ответ {self.id} от пользователя {self.user_id} на вопрос {self.question_id}"
     
 
-    def add_mark(self, mark):
-        self.rating = (self.rating or 0) + mark
-        self.save(update_fields=['rating'])
-
-
 class Tag(models.Model):
     title = models.CharField(
         max_length=400,
@@ -129,11 +201,23 @@ class Tag(models.Model):
         unique=True,
         db_index=True,
     )
+    question_count = models.IntegerField(
+        default=0,
+        blank=False,
+        null=False,
+        verbose_name="Количество вопросов",
+    )
+
+    objects = TagManager()
 
 
     class Meta:
         verbose_name = "Тэг"
         verbose_name_plural = "Тэги"
+        # "Django" и "django" — один тег; по этому же индексу ищутся названия
+        constraints = [
+            models.UniqueConstraint(Lower('title'), name='questions_tag_title_ci_unique'),
+        ]
         
 
     def __str__(self):
@@ -213,4 +297,67 @@ class AnswerMark(models.Model):
 
 
     def __str__(self):
-        return f"Оценка с id = {self.id}: {self.mark} для ответа {self.answer_id}"
\ No newline at end of file
+        return f"Оценка с id = {self.id}: {self.mark} для ответа {self.answer_id}"
+
+
+class ListingCounter(models.Model):
+    name = models.CharField(
+        max_length=100,
+        unique=True,
+        verbose_name="Лента",
+    )
+    value = models.BigIntegerField(
+        default=0,
+        verbose_name="Количество",
+    )
+
+
+    class Meta:
+        verbose_name = "Счётчик ленты"
+        verbose_name_plural = "Счётчики лент"
+
+
+    def __str__(self):
+        return f"Счётчик {self.name}: {self.value}"
+
+
+    @classmethod
+    def add(cls, name, delta):
+        cls.objects.filter(name=name).update(value=models.F("value") + delta)
+
+
+
+class Reputation(models.Model):
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="reputation",
+        verbose_name="Пользователь",
+    )
+    question_rating = models.IntegerField(
+        default=0,
+        verbose_name="Рейтинг вопросов",
+    )
+    answer_rating = models.IntegerField(
+        default=0,
+        verbose_name="Рейтинг ответов",
+    )
+    accepted_answers = models.IntegerField(
+        default=0,
+        verbose_name="Правильных ответов",
+    )
+    score = models.IntegerField(
+        default=0,
+        db_index=True,
+        verbose_name="Репутация",
+    )
+
+
+    class Meta:
+        verbose_name = "Репутация"
+        verbose_name_plural = "Репутация"
+
+
+    def __str__(self):
+        return f"Репутация пользователя {self.user_id}: {self.score}"
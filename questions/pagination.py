@@ -1,21 +1,84 @@
+import base64
+import binascii
+import datetime
+import json
+from typing import NamedTuple
+
+CURSOR_NEXT = "n"
+CURSOR_PREVIOUS = "p"
+
+
+def _cursor_default(value):
+    # DjangoJSONEncoder обрезает микросекунды, а курсору нужна точная граница
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not cursor serializable")
+
+
+def encode_cursor(values, direction=CURSOR_NEXT):
+    raw = json.dumps({"d": direction, "k": list(values)}, default=_cursor_default, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    # Курсор непрозрачный: любая порча -> None, вьюха вернётся к первой странице
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        data = json.loads(raw)
+        direction, values = data["d"], data["k"]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        return None
+    if direction not in (CURSOR_NEXT, CURSOR_PREVIOUS) or not isinstance(values, list):
+        return None
+    return direction, values
+
+
+class QuestionPageResult(NamedTuple):
+    questions: list
+    total_pages: int
+    next_cursor: str | None = None
+    previous_cursor: str | None = None
+    count_estimated: bool = False
+
+
+class AnswerPageResult(NamedTuple):
+    answers: list
+    page_number: int
+    total_pages: int
+
+
 class SimplePaginator:
-    def __init__(self, total_pages: int):
+    def __init__(self, total_pages: int, estimated: bool = False):
         self.num_pages = total_pages
         self.page_range = range(1, total_pages + 1)
+        # точного числа страниц нет: показываем "много страниц" вместо последней
+        self.estimated = estimated
 
 
 class SimplePage:
-    def __init__(self, objects, number, total_pages):
+    def __init__(self, objects, number, total_pages, next_cursor=None, previous_cursor=None, estimated=False):
         self.object_list = objects
         self.number = number
-        self.paginator = SimplePaginator(total_pages)
+        self.paginator = SimplePaginator(total_pages, estimated)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def is_cursor_page(self):
+        return self.number is None
 
     @property
     def has_next(self):
+        if self.is_cursor_page:
+            return False
         return self.number < self.paginator.num_pages
 
     @property
     def has_previous(self):
+        if self.is_cursor_page:
+            return False
         return self.number > 1
 
     def next_page_number(self):
@@ -25,6 +88,7 @@ class SimplePage:
         return max(self.number - 1, 1)
 
 
-def paginate(objects, page_number, total_pages):
-    page_number = max(1, min(page_number, total_pages or 1))
-    return SimplePage(objects, page_number, total_pages or 1)
+def paginate(objects, page_number, total_pages, next_cursor=None, previous_cursor=None, estimated=False):
+    if page_number is not None:
+        page_number = max(1, min(page_number, total_pages or 1))
+    return SimplePage(objects, page_number, total_pages or 1, next_cursor, previous_cursor, estimated)
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router
+
+from .models import Reputation
+
+BEST_MEMBERS_KEY = "sidebar:best_members"
+
+
+def accepted_answer_bonus():
+    return getattr(settings, "ACCEPTED_ANSWER_BONUS", 15)
+
+
+def reputation_score(question_rating, answer_rating, accepted_answers):
+    return question_rating + answer_rating + accepted_answer_bonus() * accepted_answers
+
+
+def add_reputation(user_id, question_rating=0, answer_rating=0, accepted_answers=0):
+    # upsert с приращением: строка появляется при первой же дельте
+    score = reputation_score(question_rating, answer_rating, accepted_answers)
+    if not (question_rating or answer_rating or accepted_answers):
+        return
+
+    using = router.db_for_write(Reputation)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    table = qn(Reputation._meta.db_table)
+    columns = ["question_rating", "answer_rating", "accepted_answers", "score"]
+    updates = ", ".join(f"{qn(c)} = {table}.{qn(c)} + EXCLUDED.{qn(c)}" for c in columns)
+    sql = (
+        f"INSERT INTO {table} ({qn('user_id')}, {', '.join(qn(c) for c in columns)}) "
+        f"VALUES (%s, %s, %s, %s, %s) "
+        f"ON CONFLICT ({qn('user_id')}) DO UPDATE SET {updates}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user_id, question_rating, answer_rating, accepted_answers, score])
+
+
+def get_best_members():
+    # [(user_id, имя, репутация)] — одно чтение по индексу score, дальше из кэша
+    members = cache.get(BEST_MEMBERS_KEY)
+    if members is None:
+        rows = (
+            Reputation.objects.filter(score__gt=0)
+            .order_by("-score", "user_id")
+            .values_list("user_id", "user__username", "user__profile__display_name", "score")
+            [:getattr(settings, "BEST_MEMBERS_COUNT", 10)]
+        )
+        members = [(user_id, display_name or username, score) for user_id, username, display_name, score in rows]
+        cache.set(BEST_MEMBERS_KEY, members, getattr(settings, "BEST_MEMBERS_CACHE_TIMEOUT", 300))
+    return members
@@ -0,0 +1,152 @@
+import re
+import threading
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections, router
+from django.db.models import F, OuterRef, Subquery, TextField, Value
+from django.db.models.functions import Coalesce
+
+TOKEN_RE = re.compile(r"\w{2,}")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or "").lower())
+
+
+def _search_config():
+    return getattr(settings, "QUESTION_SEARCH_CONFIG", "russian")
+
+
+def search_vector_expression():
+    # тема (A) + текст (B) + все ответы одной строкой (C)
+    Answer = apps.get_model("questions", "Answer")
+    config = _search_config()
+    answers_text = Subquery(
+        Answer.objects.filter(question_id=OuterRef("pk"))
+        .order_by()
+        .values("question_id")
+        .annotate(text=StringAgg("text", " "))
+        .values("text"),
+        output_field=TextField(),
+    )
+    return (
+        SearchVector("topic", weight="A", config=config)
+        + SearchVector("text", weight="B", config=config)
+        + SearchVector(Coalesce(answers_text, Value(""), output_field=TextField()), weight="C", config=config)
+    )
+
+
+class PostgresSearchBackend:
+    """tsvector-колонка Question.search_vector с GIN-индексом, ранжирование в базе."""
+
+    ranks_in_db = True
+
+    def search(self, questions, query):
+        search_query = SearchQuery(query, config=_search_config(), search_type="websearch")
+        return (
+            questions
+            .filter(search_vector=search_query)
+            .annotate(rank=SearchRank(F("search_vector"), search_query))
+            .order_by("-rank", "-id")
+        )
+
+    def index_questions(self, questions):
+        return questions.update(search_vector=search_vector_expression())
+
+    def index_question(self, question_id):
+        Question = apps.get_model("questions", "Question")
+        self.index_questions(Question.objects.filter(pk=question_id))
+
+
+class InvertedIndexSearchBackend:
+    """
+    Для SQLite (тесты, разработка): инвертированный индекс в памяти процесса.
+    Строится при первом поиске, дальше обновляется по сигналам.
+    """
+
+    ranks_in_db = False
+    WEIGHTS = {"topic": 3, "text": 2, "answer": 1}
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        # слово -> {id вопроса: вес}; id вопроса -> его слова, чтобы переиндексировать
+        self._postings = defaultdict(dict)
+        self._terms = defaultdict(set)
+
+    def _document(self, topic, text, answers):
+        weights = defaultdict(int)
+        for field, value in (("topic", topic), ("text", text)):
+            for token in tokenize(value):
+                weights[token] += self.WEIGHTS[field]
+        for answer in answers:
+            for token in tokenize(answer):
+                weights[token] += self.WEIGHTS["answer"]
+        return weights
+
+    def _put(self, question_id, weights):
+        for token in self._terms.pop(question_id, ()):
+            self._postings[token].pop(question_id, None)
+        for token, weight in weights.items():
+            self._postings[token][question_id] = weight
+        self._terms[question_id] = set(weights)
+
+    def _load(self):
+        Question = apps.get_model("questions", "Question")
+        Answer = apps.get_model("questions", "Answer")
+
+        answers = defaultdict(list)
+        for question_id, text in Answer.objects.values_list("question_id", "text").iterator(chunk_size=2000):
+            answers[question_id].append(text)
+        for question_id, topic, text in Question.objects.values_list("id", "topic", "text").iterator(chunk_size=2000):
+            self._put(question_id, self._document(topic, text, answers.get(question_id, ())))
+        self._loaded = True
+
+    def ranked_ids(self, query):
+        tokens = set(tokenize(query))
+        if not tokens:
+            return []
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            postings = [self._postings.get(token, {}) for token in tokens]
+        postings.sort(key=len)
+        # все слова запроса должны встретиться, как в websearch_to_tsquery
+        scores = dict(postings[0])
+        for posting in postings[1:]:
+            scores = {qid: score + posting[qid] for qid, score in scores.items() if qid in posting}
+        return sorted(scores, key=lambda qid: (-scores[qid], -qid))
+
+    def index_question(self, question_id):
+        with self._lock:
+            if not self._loaded:
+                return
+            Question = apps.get_model("questions", "Question")
+            Answer = apps.get_model("questions", "Answer")
+            row = Question.objects.filter(pk=question_id).values_list("topic", "text").first()
+            if row is None:
+                self._put(question_id, {})
+                return
+            answers = Answer.objects.filter(question_id=question_id).values_list("text", flat=True)
+            self._put(question_id, self._document(row[0], row[1], answers))
+
+    def index_questions(self, questions):
+        ids = list(questions.values_list("id", flat=True))
+        for question_id in ids:
+            self.index_question(question_id)
+        return len(ids)
+
+
+_inverted_index = InvertedIndexSearchBackend()
+_postgres_backend = PostgresSearchBackend()
+
+
+def get_search_backend():
+    Question = apps.get_model("questions", "Question")
+    if connections[router.db_for_read(Question)].vendor == "postgresql":
+        return _postgres_backend
+    return _inverted_index
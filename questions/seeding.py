@@ -0,0 +1,381 @@
+import csv
+import io
+import random
+import time
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.apps import apps
+from django.db import connections, transaction
+from django.db.models import Count, IntegerField, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+# Генераторы Faker выполняются в процессах пула, поэтому здесь нет обращений к базе
+# и моделям на уровне модуля: под spawn дочерний процесс не делает django.setup()
+
+_faker = None
+
+
+def _get_faker(seed):
+    global _faker
+    if _faker is None:
+        from faker import Faker
+        _faker = Faker('ru_RU')
+    _faker.seed_instance(seed)
+    return _faker
+
+
+def fake_users(seed, start, count):
+    fake = _get_faker(seed)
+    return [(f'user_{i}', fake.email(), fake.user_name()) for i in range(start, start + count)]
+
+
+def fake_tags(seed, start, count):
+    fake = _get_faker(seed)
+    return [fake.pystr(min_chars=6, max_chars=24).lower() for _ in range(count)]
+
+
+def fake_questions(seed, start, count):
+    fake = _get_faker(seed)
+    return [(fake.sentence(nb_words=8)[:500], fake.paragraph(nb_sentences=4)) for _ in range(count)]
+
+
+def fake_answers(seed, start, count):
+    fake = _get_faker(seed)
+    return [fake.paragraph(nb_sentences=3) for _ in range(count)]
+
+
+def distribute(total, n, rng=random):
+    base, rem = divmod(total, n)
+    sizes = [base] * n
+    for i in rng.sample(range(n), rem):
+        sizes[i] += 1
+    return sizes
+
+
+class FakePool:
+    """
+    Пачки Faker-данных по порядку. В полёте не больше 2 * workers задач,
+    так что память ограничена, как бы медленно ни шла запись в базу.
+    """
+
+    def __init__(self, workers, seed):
+        self.workers = workers
+        self.seed = seed
+        self.executor = None
+        if workers > 1:
+            # дочерним процессам открытые соединения родителя не нужны
+            connections.close_all()
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+
+    def chunks(self, func, total, chunk_size):
+        tasks = (
+            (self.seed + index, start, min(chunk_size, total - start))
+            for index, start in enumerate(range(0, total, chunk_size))
+        )
+        if self.executor is None:
+            for task in tasks:
+                yield func(*task)
+            return
+
+        pending = deque()
+        for task in tasks:
+            pending.append(self.executor.submit(func, *task))
+            if len(pending) >= self.workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+
+
+class BulkCreateWriter:
+    def __init__(self, using, batch_size):
+        self.using = using
+        self.batch_size = batch_size
+
+    def write(self, model, fields, rows, ignore_conflicts=False):
+        objects = [model(**dict(zip(fields, row))) for row in rows]
+        model.objects.using(self.using).bulk_create(
+            objects, batch_size=self.batch_size, ignore_conflicts=ignore_conflicts,
+        )
+
+
+def _copy_value(value):
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+class CopyWriter(BulkCreateWriter):
+    """COPY ... FROM STDIN для Postgres: на больших таблицах в разы быстрее INSERT."""
+
+    def write(self, model, fields, rows, ignore_conflicts=False):
+        if ignore_conflicts:
+            # COPY не умеет ON CONFLICT — маленькие таблицы пишем обычным INSERT
+            return super().write(model, fields, rows, ignore_conflicts)
+
+        connection = connections[self.using]
+        qn = connection.ops.quote_name
+        opts = model._meta
+        columns = ", ".join(qn(opts.get_field(field).column) for field in fields)
+        sql = f"COPY {qn(opts.db_table)} ({columns}) FROM STDIN WITH (FORMAT csv)"
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([_copy_value(value) for value in row])
+        buffer.seek(0)
+
+        with connection.cursor() as cursor:
+            raw = cursor.cursor
+            if hasattr(raw, "copy_expert"):
+                raw.copy_expert(sql, buffer)
+            else:
+                with raw.copy(sql) as copy:
+                    copy.write(buffer.getvalue())
+
+
+def get_writer(using, batch_size):
+    if connections[using].vendor == "postgresql":
+        return CopyWriter(using, batch_size)
+    return BulkCreateWriter(using, batch_size)
+
+
+class TableProgress:
+    def __init__(self, table, total, report, interval=1.0):
+        self.table = table
+        self.total = total
+        self.report = report
+        self.interval = interval
+        self.done = 0
+        self.started = self.reported = time.monotonic()
+
+    def advance(self, count):
+        self.done += count
+        now = time.monotonic()
+        if now - self.reported >= self.interval:
+            self.reported = now
+            self.report(self.table, self.done, self.total, now - self.started, False)
+
+    def finish(self):
+        self.report(self.table, self.done, self.total, time.monotonic() - self.started, True)
+
+
+def _sample_targets(ids, authors, user_id, quota, rng):
+    # выборка без возвращения отбраковкой: O(quota), а не O(len(ids)) на пользователя
+    quota = min(quota, len(ids))
+    chosen = set()
+    attempts, max_attempts = 0, quota * 4 + 16
+    while len(chosen) < quota and attempts < max_attempts:
+        attempts += 1
+        index = rng.randrange(len(ids))
+        if authors[index] != user_id:
+            chosen.add(ids[index])
+    return chosen
+
+
+class Seeder:
+    """
+    Тестовые данные потоком: каждая таблица пишется пачками по chunk_size строк,
+    в памяти держатся только id (array) нужные для связей.
+    """
+
+    def __init__(self, ratio, chunk_size=5000, workers=1, seed=None, using="default", report=None):
+        self.ratio = ratio
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.seed = random.randrange(1 << 30) if seed is None else seed
+        self.rng = random.Random(self.seed)
+        self.using = using
+        self.report = report or (lambda *args: None)
+        self.writer = get_writer(using, chunk_size)
+
+        self.num_users = ratio
+        self.num_tags = ratio
+        self.num_questions = ratio * 10
+        self.num_answers = ratio * 100
+        self.num_marks = ratio * 200
+
+        self.user_ids, self.tag_ids = array('q'), array('q')
+        self.question_ids, self.question_authors = array('q'), array('q')
+        self.answer_ids, self.answer_authors = array('q'), array('q')
+
+    def run(self):
+        self.pool = FakePool(self.workers, self.seed)
+        try:
+            self.seed_users()
+            self.seed_tags()
+            self.seed_questions()
+            self.seed_answers()
+        finally:
+            self.pool.close()
+        self.seed_question_tags()
+        self.seed_marks()
+        self.refresh_counters()
+
+    def _write(self, model, fields, rows, progress, ignore_conflicts=False):
+        with transaction.atomic(using=self.using):
+            self.writer.write(model, fields, rows, ignore_conflicts)
+        progress.advance(len(rows))
+
+    def _new_ids(self, model, max_id, author_field="user_id"):
+        ids, authors = array('q'), array('q')
+        rows = (
+            model.objects.using(self.using)
+            .filter(id__gt=max_id).order_by('id')
+            .values_list('id', author_field)
+            .iterator(chunk_size=self.chunk_size)
+        )
+        for pk, author in rows:
+            ids.append(pk)
+            authors.append(author)
+        return ids, authors
+
+    def seed_users(self):
+        User = apps.get_model('auth', 'User')
+        UserProfile = apps.get_model('users', 'UserProfile')
+
+        progress = TableProgress('users', self.num_users, self.report)
+        for chunk in self.pool.chunks(fake_users, self.num_users, self.chunk_size):
+            usernames = [username for username, _, _ in chunk]
+            self._write(User, ('username', 'email'), [(u, e) for u, e, _ in chunk], progress, ignore_conflicts=True)
+            # пользователи с такими именами могли остаться от прошлого запуска
+            ids = dict(User.objects.using(self.using).filter(username__in=usernames).values_list('username', 'id'))
+            self.user_ids.extend(ids[username] for username in usernames)
+            with transaction.atomic(using=self.using):
+                self.writer.write(
+                    UserProfile, ('user_id', 'display_name'),
+                    [(ids[username], name) for username, _, name in chunk],
+                    ignore_conflicts=True,
+                )
+        progress.finish()
+
+    def seed_tags(self):
+        Tag = apps.get_model('questions', 'Tag')
+
+        seen = set()
+        progress = TableProgress('tags', self.num_tags, self.report)
+        for chunk in self.pool.chunks(fake_tags, self.num_tags, self.chunk_size):
+            titles = [title for title in dict.fromkeys(chunk) if title not in seen]
+            seen.update(titles)
+            self._write(Tag, ('title',), [(title,) for title in titles], progress, ignore_conflicts=True)
+            self.tag_ids.extend(Tag.objects.using(self.using).filter(title__in=titles).values_list('id', flat=True))
+        progress.finish()
+
+    def seed_questions(self):
+        Question = apps.get_model('questions', 'Question')
+        from .models import compute_hot_score
+
+        max_id = Question.objects.using(self.using).aggregate(m=Max('id'))['m'] or 0
+        fields = ('user_id', 'topic', 'text', 'answer_count', 'rating', 'created_at', 'hot_score')
+        progress = TableProgress('questions', self.num_questions, self.report)
+        for chunk in self.pool.chunks(fake_questions, self.num_questions, self.chunk_size):
+            rows = []
+            for topic, text in chunk:
+                created_at = timezone.now()
+                rows.append((
+                    self.user_ids[self.rng.randrange(len(self.user_ids))],
+                    topic, text, 0, 0, created_at, compute_hot_score(0, 0, created_at),
+                ))
+            self._write(Question, fields, rows, progress)
+        progress.finish()
+        self.question_ids, self.question_authors = self._new_ids(Question, max_id)
+
+    def seed_answers(self):
+        Answer = apps.get_model('questions', 'Answer')
+        if not self.question_ids:
+            return
+
+        max_id = Answer.objects.using(self.using).aggregate(m=Max('id'))['m'] or 0
+        fields = ('question_id', 'user_id', 'text', 'is_correct', 'rating', 'created_at')
+        progress = TableProgress('answers', self.num_answers, self.report)
+        for chunk in self.pool.chunks(fake_answers, self.num_answers, self.chunk_size):
+            rows = [
+                (
+                    self.question_ids[self.rng.randrange(len(self.question_ids))],
+                    self.user_ids[self.rng.randrange(len(self.user_ids))],
+                    text, self.rng.random() < 0.5, 0, timezone.now(),
+                )
+                for text in chunk
+            ]
+            self._write(Answer, fields, rows, progress)
+        progress.finish()
+        self.answer_ids, self.answer_authors = self._new_ids(Answer, max_id)
+
+    def seed_question_tags(self):
+        Question = apps.get_model('questions', 'Question')
+        if not self.tag_ids:
+            return
+
+        through = Question.tags.through
+        progress = TableProgress('question_tags', None, self.report)
+        rows = []
+        for question_id in self.question_ids:
+            for tag_id in self.rng.sample(self.tag_ids, k=min(self.rng.randint(1, 5), len(self.tag_ids))):
+                rows.append((question_id, tag_id))
+            if len(rows) >= self.chunk_size:
+                self._write(through, ('question_id', 'tag_id'), rows, progress)
+                rows = []
+        if rows:
+            self._write(through, ('question_id', 'tag_id'), rows, progress)
+        progress.finish()
+
+    def _seed_marks(self, table, model, target_field, ids, authors, total):
+        if not ids:
+            return
+        fields = ('user_id', f'{target_field}_id', 'mark')
+        progress = TableProgress(table, total, self.report)
+        rows = []
+        for user_id, quota in zip(self.user_ids, distribute(total, len(self.user_ids), self.rng)):
+            for target_id in _sample_targets(ids, authors, user_id, quota, self.rng):
+                rows.append((user_id, target_id, self.rng.choice((-1, 1))))
+            if len(rows) >= self.chunk_size:
+                self._write(model, fields, rows, progress)
+                rows = []
+        if rows:
+            self._write(model, fields, rows, progress)
+        progress.finish()
+
+    def seed_marks(self):
+        QuestionMark = apps.get_model('questions', 'QuestionMark')
+        AnswerMark = apps.get_model('questions', 'AnswerMark')
+        if not self.user_ids:
+            return
+
+        num_question_marks = self.num_marks // 2
+        self._seed_marks(
+            'question_marks', QuestionMark, 'question',
+            self.question_ids, self.question_authors, num_question_marks,
+        )
+        self._seed_marks(
+            'answer_marks', AnswerMark, 'answer',
+            self.answer_ids, self.answer_authors, self.num_marks - num_question_marks,
+        )
+
+    def refresh_counters(self):
+        # bulk_create и COPY не вызывают сигналы — счётчики лент пересчитываем здесь
+        Question = apps.get_model('questions', 'Question')
+        Tag = apps.get_model('questions', 'Tag')
+        ListingCounter = apps.get_model('questions', 'ListingCounter')
+        from .counting import LISTING_ALL_QUESTIONS
+
+        through = Question.tags.through
+        links = (
+            through.objects.filter(tag_id=OuterRef('pk'))
+            .order_by().values('tag_id').annotate(c=Count('*')).values('c')
+        )
+        with transaction.atomic(using=self.using):
+            Tag.objects.using(self.using).update(
+                question_count=Coalesce(Subquery(links, output_field=IntegerField()), Value(0)),
+            )
+            ListingCounter.objects.using(self.using).update_or_create(
+                name=LISTING_ALL_QUESTIONS,
+                defaults={'value': Question.objects.using(self.using).count()},
+            )
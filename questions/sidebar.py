@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Tag
+
+POPULAR_TAGS_KEY = "sidebar:popular_tags"
+
+
+def _popular_tags_count():
+    return getattr(settings, "POPULAR_TAGS_COUNT", 10)
+
+
+def get_popular_tags():
+    # [(id, title, question_count)], пересчитывается только когда меняется топ
+    top = cache.get(POPULAR_TAGS_KEY)
+    if top is None:
+        top = list(
+            Tag.objects.filter(question_count__gt=0)
+            .order_by("-question_count", "title")
+            .values_list("id", "title", "question_count")[:_popular_tags_count()]
+        )
+        cache.set(POPULAR_TAGS_KEY, top, getattr(settings, "SIDEBAR_CACHE_TIMEOUT", 3600))
+    return top
+
+
+def popular_tags_changed(tag_ids):
+    top = cache.get(POPULAR_TAGS_KEY)
+    if top is None or not tag_ids:
+        return
+
+    counts = dict(Tag.objects.filter(pk__in=tag_ids).values_list("id", "question_count"))
+    in_top = {tag_id: count for tag_id, _, count in top}
+    lowest = top[-1][2] if len(top) >= _popular_tags_count() else 0
+
+    for tag_id in tag_ids:
+        count = counts.get(tag_id, 0)
+        if tag_id in in_top:
+            if count != in_top[tag_id]:
+                break
+        elif count > lowest:
+            break
+    else:
+        # ни один тег не вошёл в топ и не сдвинул его — кэш остаётся
+        return
+    cache.delete(POPULAR_TAGS_KEY)
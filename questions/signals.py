@@ -0,0 +1,158 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from users.models import UserProfile
+from users.thumbnails import avatar_thumbnail_ready
+
+from .cards import author_cards_changed, question_answers_changed, question_card_changed
+from .counting import LISTING_ALL_QUESTIONS
+from .listing_cache import HOT_LISTING, NEW_LISTING, invalidate_listings, tag_listing
+from .models import Answer, ListingCounter, Question, Tag
+from .search import get_search_backend
+from .sidebar import popular_tags_changed
+from .tag_index import get_tag_index
+
+
+@receiver(post_save, sender=Question)
+def count_created_question(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ListingCounter.add(LISTING_ALL_QUESTIONS, 1)
+        # новый вопрос встаёт в голову «новых» и почти наверняка в верх «горячих»
+        _listings_changed([NEW_LISTING, HOT_LISTING])
+
+
+def _tags_changed(tag_ids):
+    tag_ids = list(tag_ids)
+    transaction.on_commit(lambda: popular_tags_changed(tag_ids))
+    # ранжирование автодополнения тоже по question_count — обновляем его между перезагрузками
+    transaction.on_commit(lambda: get_tag_index().refresh_tags(tag_ids))
+    _listings_changed([tag_listing(tag_id) for tag_id in tag_ids])
+
+
+def _listings_changed(listings):
+    # закэшированные страницы лент сдвинулись — сбрасываем их, не дожидаясь TTL
+    pages = Question.objects.NUMBERED_PAGE_LIMIT
+    transaction.on_commit(lambda: invalidate_listings(listings, pages))
+
+
+def _cards_changed(question_ids):
+    question_ids = list(question_ids)
+    transaction.on_commit(lambda: [question_card_changed(question_id) for question_id in question_ids])
+
+
+@receiver(pre_delete, sender=Question)
+def uncount_question_tags(sender, instance, **kwargs):
+    # строки M2M удаляются каскадом без m2m_changed, поэтому снимаем теги здесь
+    tag_ids = list(Tag.objects.filter(question=instance).values_list("id", flat=True))
+    Tag.objects.filter(pk__in=tag_ids).update(question_count=F("question_count") - 1)
+    _tags_changed(tag_ids)
+
+
+@receiver(post_delete, sender=Question)
+def uncount_deleted_question(sender, instance, **kwargs):
+    ListingCounter.add(LISTING_ALL_QUESTIONS, -1)
+    _listings_changed([NEW_LISTING, HOT_LISTING])
+    # сохранённый у клиента ETag страницы вопроса больше не должен совпасть
+    _cards_changed([instance.id])
+
+
+@receiver(m2m_changed, sender=Question.tags.through)
+def count_question_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear":
+        # после clear pk_set не передаётся, запоминаем что снимаем
+        if reverse:
+            instance._cleared_tag_links = list(instance.question_set.values_list("id", flat=True))
+        else:
+            instance._cleared_tag_links = list(instance.tags.values_list("id", flat=True))
+        return
+
+    if action == "post_clear":
+        cleared = getattr(instance, "_cleared_tag_links", None)
+        if reverse:
+            Tag.objects.filter(pk=instance.pk).update(question_count=F("question_count") - len(cleared or ()))
+            _tags_changed([instance.pk])
+            _cards_changed(cleared or ())
+        elif cleared:
+            Tag.objects.filter(pk__in=cleared).update(question_count=F("question_count") - 1)
+            _tags_changed(cleared)
+            _cards_changed([instance.pk])
+        return
+
+    if action not in ("post_add", "post_remove") or not pk_set:
+        return
+
+    delta = 1 if action == "post_add" else -1
+    if reverse:
+        Tag.objects.filter(pk=instance.pk).update(question_count=F("question_count") + delta * len(pk_set))
+        _tags_changed([instance.pk])
+        _cards_changed(pk_set)
+    else:
+        Tag.objects.filter(pk__in=pk_set).update(question_count=F("question_count") + delta)
+        _tags_changed(pk_set)
+        _cards_changed([instance.pk])
+
+
+def _reindex_on_commit(question_id):
+    transaction.on_commit(lambda: get_search_backend().index_question(question_id))
+
+
+@receiver(post_save, sender=Question)
+def reindex_saved_question(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    # add_answer и голоса сохраняют только счётчики — текст не менялся
+    if created or update_fields is None or {"topic", "text"} & set(update_fields):
+        _reindex_on_commit(instance.id)
+
+
+@receiver(post_save, sender=Answer)
+def reindex_answered_question(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        _reindex_on_commit(instance.question_id)
+
+
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+def refresh_question_answers(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    question_id = instance.question_id
+    transaction.on_commit(lambda: question_answers_changed(question_id))
+
+
+@receiver(post_delete, sender=Question)
+def unindex_deleted_question(sender, instance, **kwargs):
+    _reindex_on_commit(instance.id)
+
+
+@receiver(post_save, sender=Tag)
+def index_created_tag(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        title = instance.title
+        transaction.on_commit(lambda: get_tag_index().add(title))
+
+
+@receiver(post_save, sender=Question)
+def refresh_saved_question_card(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    # новый ответ (add_answer) или правка вопроса меняют его карточку
+    if created or raw:
+        return
+    if update_fields is None or {"topic", "text", "answer_count", "rating"} & set(update_fields):
+        _cards_changed([instance.id])
+
+
+@receiver(post_save, sender=UserProfile)
+def refresh_author_cards(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    if update_fields is None or {"avatar", "avatar_thumbnail", "display_name"} & set(update_fields):
+        user_id = instance.user_id
+        transaction.on_commit(lambda: author_cards_changed(user_id))
+
+
+@receiver(avatar_thumbnail_ready)
+def refresh_cards_with_thumbnail(sender, user_id, **kwargs):
+    # миниатюра пишется UPDATE-ом из фонового потока, post_save не приходит
+    author_cards_changed(user_id)
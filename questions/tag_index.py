@@ -0,0 +1,157 @@
+import heapq
+import logging
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class TagPrefixIndex:
+    """
+    Отсортированный список названий тегов в памяти процесса: префикс -> диапазон
+    через bisect, внутри диапазона — самые популярные (по Tag.question_count).
+    Для коротких префиксов с огромным диапазоном топ кэшируется.
+    """
+
+    # диапазон больше — считаем топ один раз и кладём в кэш префиксов
+    SCAN_LIMIT = 256
+
+    def __init__(self, reload_seconds=300):
+        self.reload_seconds = reload_seconds
+        self._lock = threading.Lock()
+        # (ключи, записи, кэш топов) — complete берёт их одной ссылкой
+        self._snapshot = ([], {}, {})
+        self._loaded_at = None
+        self._reloading = False
+        # add() во время фоновой перезагрузки: накатываем поверх прочитанного
+        self._changed = {}
+
+    def _read_tags(self):
+        Tag = apps.get_model("questions", "Tag")
+        entries = {}
+        for title, popularity in Tag.objects.values_list("title", "question_count").iterator(chunk_size=5000):
+            entries[title.lower()] = (title, popularity)
+        return entries
+
+    def _install(self, entries):
+        entries.update(self._changed)
+        self._changed = {}
+        self._snapshot = (sorted(entries), entries, {})
+        self._loaded_at = time.monotonic()
+
+    def _ensure_loaded(self):
+        if self._loaded_at is None:
+            # первая загрузка синхронная: отдавать пока нечего
+            with self._lock:
+                if self._loaded_at is None:
+                    self._install(self._read_tags())
+        elif time.monotonic() - self._loaded_at > self.reload_seconds:
+            self._start_reload()
+
+    def _start_reload(self):
+        with self._lock:
+            if self._reloading:
+                return
+            self._reloading = True
+            self._changed = {}
+        self._spawn(self._reload_in_background)
+
+    def _spawn(self, target):
+        threading.Thread(target=target, name="tag-index-reload", daemon=True).start()
+
+    def _reload(self):
+        # запросы тем временем отвечают по старому снимку
+        try:
+            entries = self._read_tags()
+            with self._lock:
+                self._install(entries)
+        except Exception:
+            logger.exception("Не удалось перечитать теги для автодополнения")
+            # следующая попытка — через reload_seconds, а не на каждом запросе
+            self._loaded_at = time.monotonic()
+        finally:
+            self._reloading = False
+
+    def _reload_in_background(self):
+        try:
+            self._reload()
+        finally:
+            # соединение потока перезагрузки больше не нужно
+            connection.close()
+
+    def _top(self, snapshot, lo, hi, limit):
+        keys, entries, _ = snapshot
+        best = heapq.nsmallest(limit, keys[lo:hi], key=lambda key: (-entries[key][1], key))
+        return [entries[key][0] for key in best]
+
+    def complete(self, prefix, limit=10):
+        prefix = (prefix or "").strip().lower()
+        if not prefix:
+            return []
+        self._ensure_loaded()
+
+        snapshot = self._snapshot
+        keys, _, top_cache = snapshot
+        lo = bisect_left(keys, prefix)
+        hi = bisect_left(keys, prefix + "\U0010ffff", lo)
+        if hi - lo <= self.SCAN_LIMIT:
+            return self._top(snapshot, lo, hi, limit)
+
+        cached = top_cache.get((prefix, limit))
+        if cached is None:
+            cached = self._top(snapshot, lo, hi, limit)
+            top_cache[(prefix, limit)] = cached
+        return cached
+
+    def add(self, title, popularity=None):
+        """
+        Новый тег или новое число вопросов у известного — без перечитывания всех
+        тегов. popularity=None: известному тегу число не меняем, новому — 0.
+        """
+        key = title.lower()
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            keys, entries, top_cache = self._snapshot
+            if popularity is None:
+                if key in entries:
+                    return
+                popularity = 0
+            if entries.get(key) == (title, popularity):
+                return
+            if key not in entries:
+                insort(keys, key)
+            entries[key] = (title, popularity)
+            if self._reloading:
+                self._changed[key] = (title, popularity)
+            # сбрасываем закэшированные топы для всех префиксов тега
+            self._snapshot = (keys, entries, {
+                cache_key: top for cache_key, top in top_cache.items()
+                if not key.startswith(cache_key[0])
+            })
+
+    def refresh_tags(self, tag_ids):
+        # у тегов поменялось число вопросов: перечитываем только их
+        if self._loaded_at is None or not tag_ids:
+            return
+        Tag = apps.get_model("questions", "Tag")
+        for title, popularity in Tag.objects.filter(pk__in=tag_ids).values_list("title", "question_count"):
+            self.add(title, popularity)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_tag_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = TagPrefixIndex(getattr(settings, "TAG_AUTOCOMPLETE_RELOAD_SECONDS", 300))
+    return _index
@@ -0,0 +1,21 @@
+from django import template
+
+from questions.reputation import get_best_members
+from questions.sidebar import get_popular_tags
+
+register = template.Library()
+
+
+# асинхронные вьюхи читают сайдбар заранее, параллельно с лентой, и кладут в контекст
+
+
+@register.inclusion_tag("questions/popular_tags.html", takes_context=True)
+def popular_tags(context):
+    tags = context.get("popular_tags")
+    return {"tags": get_popular_tags() if tags is None else tags}
+
+
+@register.inclusion_tag("questions/best_members.html", takes_context=True)
+def best_members(context):
+    members = context.get("best_members")
+    return {"members": get_best_members() if members is None else members}
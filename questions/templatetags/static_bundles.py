@@ -0,0 +1,17 @@
+from django import template
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+register = template.Library()
+
+
+@register.simple_tag
+def stylesheet_bundle(name):
+    # после collectstatic — один минифицированный файл с хэшем, иначе исходники по отдельности
+    if not settings.DEBUG and name in getattr(staticfiles_storage, "hashed_files", {}):
+        names = [name]
+    else:
+        names = settings.STATIC_BUNDLES[name]
+    return format_html_join("\n  ", '<link rel="stylesheet" href="{}">', ((static(n),) for n in names))
@@ -0,0 +1,28 @@
+from contextlib import contextmanager
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget(budget, label="block", using="default"):
+    with CaptureQueriesContext(connections[using]) as captured:
+        yield captured
+    if len(captured) > budget:
+        statements = "\n".join(
+            f"{i}. {query['sql']}" for i, query in enumerate(captured.captured_queries, start=1)
+        )
+        raise QueryBudgetExceeded(
+            f"{label}: {len(captured)} запросов при бюджете {budget}\n{statements}"
+        )
+
+
+class QueryBudgetMixin:
+    def assertQueryBudget(self, budget, url, data=None, method="get", **extra):
+        with query_budget(budget, label=url):
+            response = getattr(self.client, method)(url, data, **extra)
+        return response
@@ -1,3 +1,1172 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import importlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.models import F, Sum
+from django.test import (
+    AsyncClient,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+    skipUnlessDBFeature,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import UserProfile
+
+from . import live, search, tag_index, vote_buffer, votes
+from .benchmark import BenchmarkRunner, check_budgets, percentile, pick_fixtures
+from .cards import card_cache_stats
+from .checks import shared_cache_check
+from .concurrency import gather_reads
+from .counting import (
+    LISTING_ALL_QUESTIONS,
+    EstimatedCount,
+    ExactCount,
+    MaintainedCount,
+    tag_listing_key,
+)
+from .events import QuestionEventsApplication
+from .listing_cache import NEW_LISTING, ListingEntry, get_listing_page
+from .live import CacheLiveBroker, MemoryLiveBroker
+from .managers import QuestionManager
+from .models import (
+    Answer,
+    AnswerMark,
+    ListingCounter,
+    Question,
+    QuestionMark,
+    Reputation,
+    Tag,
+    compute_hot_score,
+)
+from .pagination import QuestionPageResult, decode_cursor, encode_cursor
+from .reputation import get_best_members
+from .seeding import Seeder
+from .sidebar import POPULAR_TAGS_KEY, get_popular_tags
+from .tag_index import TagPrefixIndex
+from .testing import QueryBudgetMixin
+from .votes import vote_answer, vote_question
+
+
+def make_questions(count, tags=(), prefix="q"):
+    users = []
+    for i in range(count):
+        user = User.objects.create(username=f"{prefix}_author_{i}")
+        UserProfile.objects.create(user=user)
+        users.append(user)
+    questions = []
+    for i, user in enumerate(users):
+        question = Question.objects.create(user=user, topic=f"{prefix} {i}", text="текст")
+        question.tags.set(tags)
+        questions.append(question)
+    return questions
+
+
+class ListingQueryBudgetTest(QueryBudgetMixin, TestCase):
+    # сессия + пользователь + профиль в шапке + count + страница + теги + оценки зрителя
+    LISTING_BUDGET = 7
+    # + поиск тега по title
+    TAG_LISTING_BUDGET = 8
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create(username="viewer")
+        UserProfile.objects.create(user=cls.viewer)
+        cls.tags = [Tag.objects.create(title=f"tag{i}") for i in range(3)]
+        make_questions(12, cls.tags)
+
+    def setUp(self):
+        cache.clear()
+        # боковая панель общая для всех страниц и живёт в кэше — в бюджет ленты не входит
+        get_popular_tags()
+        get_best_members()
+        self.client.force_login(self.viewer)
+
+    def test_listing_pages_fit_budget(self):
+        budgets = [
+            (reverse("home"), self.LISTING_BUDGET),
+            (reverse("questions:hot"), self.LISTING_BUDGET),
+            (reverse("questions:tag", args=["tag1"]), self.TAG_LISTING_BUDGET),
+        ]
+        for url, budget in budgets:
+            with self.subTest(url=url):
+                response = self.assertQueryBudget(budget, url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.context["questions"]), Question.objects.QUESTION_COUNT_PAGE)
+
+    def test_viewer_marks_are_shown_and_cached(self):
+        question = Question.objects.get_new_question().questions[0]
+        self.client.post(reverse("questions:question_mark", args=[question.id]), {"mark": "1"})
+
+        response = self.client.get(reverse("home"))
+        marks = {q.id: q.viewer_mark for q in response.context["questions"]}
+        self.assertEqual(marks[question.id], 1)
+        self.assertEqual(sum(marks.values()), 1)
+        # состояние кнопок уже в кэше — без запроса к оценкам
+        self.assertQueryBudget(self.LISTING_BUDGET - 1, reverse("home"))
+
+    def test_budget_does_not_grow_with_page_size(self):
+        Question.objects.all().delete()
+        make_questions(1, self.tags, prefix="single")
+        self.assertQueryBudget(self.LISTING_BUDGET, reverse("home"))
+
+
+@mock.patch.object(QuestionManager, "NUMBERED_PAGE_LIMIT", 2)
+class CursorPaginationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        questions = make_questions(35, prefix="cursor")
+        # по четыре вопроса с равным created_at и по три с равным hot_score: порядок решает id
+        start = timezone.now()
+        for i, question in enumerate(questions):
+            Question.objects.filter(pk=question.pk).update(
+                created_at=start - datetime.timedelta(seconds=i // 4), hot_score=float(i // 3),
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, load):
+        pages = [load(page_number=1), load(page_number=2)]
+        while pages[-1].next_cursor:
+            pages.append(load(cursor=decode_cursor(pages[-1].next_cursor)))
+        return pages
+
+    def test_next_and_previous_pages_with_ties(self):
+        listings = [
+            (Question.objects.get_new_question, QuestionManager.NEW_ORDERING),
+            (Question.objects.get_hot_question, QuestionManager.HOT_ORDERING),
+        ]
+        for load, ordering in listings:
+            with self.subTest(ordering=ordering):
+                expected = list(Question.objects.order_by(*ordering).values_list("id", flat=True))
+                pages = self.walk(load)
+                ids = [[question.id for question in page.questions] for page in pages]
+                self.assertEqual([question_id for page in ids for question_id in page], expected)
+                self.assertEqual([len(page) for page in ids], [10, 10, 10, 5])
+                self.assertIsNone(pages[-1].next_cursor)
+
+                # назад от последней страницы курсорами — те же страницы
+                previous = load(cursor=decode_cursor(pages[-1].previous_cursor))
+                self.assertEqual([question.id for question in previous.questions], ids[2])
+                previous = load(cursor=decode_cursor(previous.previous_cursor))
+                self.assertEqual([question.id for question in previous.questions], ids[1])
+
+    def test_past_numbered_limit_hands_over_to_cursor(self):
+        result = Question.objects.get_new_question(page_number=99)
+        self.assertEqual(result.total_pages, 2)
+        self.assertEqual(result.questions, Question.objects.get_new_question(page_number=2).questions)
+        self.assertIsNotNone(result.next_cursor)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        first = [question.id for question in Question.objects.get_new_question().questions]
+        tampered = [
+            decode_cursor("не курсор"),
+            decode_cursor(encode_cursor(["не дата", 1])),
+            decode_cursor(encode_cursor([1])),
+        ]
+        self.assertIsNone(tampered[0])
+        for cursor in tampered[1:]:
+            with self.subTest(cursor=cursor):
+                result = Question.objects.get_new_question(cursor=cursor)
+                self.assertEqual([question.id for question in result.questions], first)
+
+    def test_view_tolerates_bad_page_and_cursor(self):
+        self.client.force_login(User.objects.first())
+        for params in ({"page": "abc"}, {"page": "99"}, {"cursor": "мусор"}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(reverse("home"), params).status_code, 200)
+
+
+@mock.patch.object(QuestionManager, "NUMBERED_PAGE_LIMIT", 2)
+class CountStrategyTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tag = Tag.objects.create(title="counted")
+        make_questions(25, [cls.tag], prefix="count")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_exact_count(self):
+        self.assertEqual(ExactCount().count(Question.objects.all()), (25, False))
+
+    def test_threshold_follows_numbered_pages(self):
+        # 2 страницы по 10: точный счёт дальше 20 строк не нужен
+        self.assertEqual(EstimatedCount().threshold, 20)
+        questions = Question.objects.all()
+        self.assertEqual(EstimatedCount(threshold=30).count(questions), (25, False))
+        # вне Postgres оценки нет — берём нижнюю границу, но помечаем как примерную
+        self.assertEqual(EstimatedCount().count(questions, LISTING_ALL_QUESTIONS), (21, True))
+
+    def test_maintained_counters(self):
+        ListingCounter.objects.update_or_create(name=LISTING_ALL_QUESTIONS, defaults={"value": 500})
+        Tag.objects.filter(pk=self.tag.pk).update(question_count=300)
+        strategy = MaintainedCount()
+        self.assertEqual(strategy.count(Question.objects.all(), LISTING_ALL_QUESTIONS), (500, True))
+        tagged = Question.objects.filter(tags__id=self.tag.id)
+        self.assertEqual(strategy.count(tagged, tag_listing_key(self.tag.id)), (300, True))
+        # счётчика нет — как EstimatedCount
+        self.assertEqual(strategy.count(tagged, "tag:0"), (21, True))
+
+    def test_estimated_pages_rendering(self):
+        self.client.force_login(User.objects.first())
+        estimated = self.client.get(reverse("home"))
+        self.assertTrue(estimated.context["page_obj"].paginator.estimated)
+        self.assertContains(estimated, "много страниц")
+
+        with override_settings(QUESTION_COUNT_STRATEGY="questions.counting.ExactCount"):
+            cache.clear()
+            exact = self.client.get(reverse("home"))
+        self.assertFalse(exact.context["page_obj"].paginator.estimated)
+        self.assertNotContains(exact, "много страниц")
+
+
+class CardCacheTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tag = Tag.objects.create(title="cards")
+        cls.question = make_questions(1, [cls.tag], prefix="card")[0]
+        cls.voter = User.objects.create(username="card_voter")
+        cls.other = User.objects.create(username="card_other")
+
+    def setUp(self):
+        cache.clear()
+
+    def card(self, user):
+        self.client.force_login(user)
+        return str(self.client.get(reverse("home")).context["questions"][0].card_html)
+
+    def test_cards_are_shared_between_viewers(self):
+        self.card(self.voter)
+        self.card(self.other)
+        self.assertEqual(card_cache_stats()["misses"], 1)
+        self.assertEqual(card_cache_stats()["hits"], 1)
+
+    def test_vote_bumps_version_and_marks_are_per_viewer(self):
+        self.card(self.voter)
+        with self.captureOnCommitCallbacks(execute=True):
+            vote_question(self.voter, self.question.id, 1)
+
+        voter_card = self.card(self.voter)
+        other_card = self.card(self.other)
+        self.assertIn('value="1"', voter_card)
+        self.assertIn('value="1"', other_card)
+        self.assertIn("question-mark-btn active", voter_card)
+        self.assertNotIn("active", other_card)
+        self.assertNotIn("<!--viewer", other_card)
+
+    def test_answers_tags_and_avatar_bump_version(self):
+        self.card(self.other)
+        changes = [
+            lambda: self.question.add_answer(),
+            lambda: self.question.tags.add(Tag.objects.create(title="fresh")),
+            lambda: UserProfile.objects.get(user=self.question.user).save(),
+        ]
+        for misses, change in enumerate(changes, start=2):
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            html = self.card(self.other)
+            self.assertEqual(card_cache_stats()["misses"], misses)
+        self.assertIn("Ответы(1)", html)
+        self.assertIn("fresh", html)
+
+
+    def test_process_local_cache_is_reported(self):
+        with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}):
+            self.assertEqual([warning.id for warning in shared_cache_check(None)], ["questions.W001"])
+            stderr = StringIO()
+            call_command("card_cache_stats", stdout=StringIO(), stderr=stderr)
+            self.assertIn("в памяти процесса", stderr.getvalue())
+        shared = {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": "redis://127.0.0.1:6379/1"}
+        with override_settings(CACHES={"default": shared}):
+            self.assertEqual(shared_cache_check(None), [])
+
+
+class ListingCacheTest(QueryBudgetMixin, TestCase):
+    # сессия + пользователь + профиль в шапке: сама лента целиком из кэша
+    WARM_BUDGET = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create(username="listing_viewer")
+        UserProfile.objects.create(user=cls.viewer)
+        cls.tag = Tag.objects.create(title="listing")
+        make_questions(12, [cls.tag], prefix="listing")
+
+    def setUp(self):
+        cache.clear()
+        get_popular_tags()
+        get_best_members()
+        self.client.force_login(self.viewer)
+
+    def test_warm_listings_skip_the_database(self):
+        for url in (reverse("home"), reverse("questions:hot"), reverse("questions:tag", args=[self.tag.title])):
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                budget = self.WARM_BUDGET + (1 if "tag" in url else 0)
+                second = self.assertQueryBudget(budget, url)
+                self.assertEqual(
+                    [q.id for q in first.context["questions"]],
+                    [q.id for q in second.context["questions"]],
+                )
+
+    def test_new_question_invalidates_head(self):
+        self.client.get(reverse("home"))
+        with self.captureOnCommitCallbacks(execute=True):
+            question = make_questions(1, [self.tag], prefix="fresh")[0]
+        for url in (reverse("home"), reverse("questions:tag", args=[self.tag.title])):
+            response = self.client.get(url)
+            self.assertEqual(response.context["questions"][0].id, question.id)
+
+    def test_single_flight(self):
+        builds = []
+
+        def build():
+            builds.append(1)
+            return QuestionPageResult([], 1)
+
+        cache.add(f"listing:lock:{NEW_LISTING}:1", 1)
+        stale = ListingEntry([], 3, None, False, expires_at=0, build_seconds=1)
+        cache.set(f"listing:{NEW_LISTING}:1", stale)
+        # пересчёт идёт в другом запросе — отдаём устаревшую запись
+        self.assertEqual(get_listing_page(NEW_LISTING, 1, build, list).total_pages, 3)
+        self.assertEqual(builds, [])
+
+        cache.delete(f"listing:lock:{NEW_LISTING}:1")
+        get_listing_page(NEW_LISTING, 1, build, list)
+        self.assertEqual(builds, [1])
+
+
+class SeedingTest(TestCase):
+
+    def test_seeder_streams_consistent_data(self):
+        tables = []
+        Seeder(3, chunk_size=7, seed=1, report=lambda table, *args: tables.append(table)).run()
+
+        self.assertEqual(Question.objects.count(), 30)
+        self.assertEqual(Answer.objects.count(), 300)
+        self.assertEqual(UserProfile.objects.count(), 3)
+        self.assertFalse(QuestionMark.objects.filter(user_id=F("question__user_id")).exists())
+        self.assertFalse(AnswerMark.objects.filter(user_id=F("answer__user_id")).exists())
+        self.assertEqual(
+            sum(Tag.objects.values_list("question_count", flat=True)),
+            Question.tags.through.objects.count(),
+        )
+        self.assertIn("answer_marks", tables)
+
+    def test_recount_fixes_drift(self):
+        Seeder(2, chunk_size=50, seed=2).run()
+        out = StringIO()
+        call_command("recount", dry_run=True, stdout=out)
+        self.assertIn("Вопросы: id=", out.getvalue())
+
+        call_command("recount", only_changed=True, chunk_size=7, stdout=StringIO())
+        for question in Question.objects.all():
+            self.assertEqual(question.answer_count, question.question_answers.count())
+            self.assertEqual(question.rating, question.question_marks.aggregate(s=Sum("mark"))["s"] or 0)
+            self.assertAlmostEqual(
+                question.hot_score,
+                compute_hot_score(question.rating, question.answer_count, question.created_at),
+            )
+        out = StringIO()
+        call_command("recount", dry_run=True, stdout=out)
+        self.assertNotIn("id=", out.getvalue())
+
+    def test_recount_locks_chunk_before_aggregating(self):
+        Seeder(1, chunk_size=50, seed=4).run()
+        recount_command = importlib.import_module("questions.management.commands.recount")
+        lock_rows = recount_command._lock_rows
+        steps = []
+
+        def lock_in_transaction(recount, chunk):
+            steps.append(("lock", connection.in_atomic_block))
+            lock_rows(recount, chunk)
+
+        def record_updates(execute, sql, params, many, context):
+            # только пересчёт: hot_score после него обновляет _refresh_questions
+            if sql.startswith("UPDATE") and " FROM (" in sql:
+                steps.append(("update", connection.in_atomic_block))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record_updates), \
+                mock.patch.object(recount_command, "_lock_rows", side_effect=lock_in_transaction):
+            call_command("recount", chunk_size=10, stdout=StringIO())
+        # каждая пачка: сначала блокировка её строк, потом её UPDATE ... FROM, в одной транзакции
+        self.assertTrue(steps)
+        self.assertEqual([step for step, _ in steps], ["lock", "update"] * (len(steps) // 2))
+        self.assertTrue(all(in_atomic for _, in_atomic in steps))
+
+
+class BenchmarkTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Seeder(2, chunk_size=50, seed=3).run()
+        call_command("recount", stdout=StringIO())
+
+    def setUp(self):
+        cache.clear()
+
+    def test_runner_records_latency_and_queries(self):
+        fixtures = pick_fixtures()
+        self.client.force_login(fixtures.user)
+        results = BenchmarkRunner(self.client, iterations=3, warmup=1).run(fixtures)
+
+        self.assertEqual(set(results), {"home", "hot", "tag", "question_detail", "question_vote", "answer_vote"})
+        for name, result in results.items():
+            with self.subTest(name=name):
+                self.assertEqual(result["statuses"], [200])
+                self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+                self.assertGreater(result["queries"], 0)
+
+        violations = check_budgets(results, {"home": {"queries": 0}, "hot": {"p95_ms": 0}, "missing": {}})
+        self.assertEqual(len(violations), 2)
+
+    def test_percentile_is_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+
+
+class AnswerPageTest(QueryBudgetMixin, TestCase):
+    # сессия + пользователь + профиль в шапке + вопрос с автором + теги + страница ответов
+    # + оценки зрителя вопросу и ответам
+    DETAIL_BUDGET = 8
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create(username="answers_viewer")
+        UserProfile.objects.create(user=cls.viewer)
+        cls.question = make_questions(1, prefix="answers")[0]
+        authors = [User.objects.create(username=f"answerer_{i}") for i in range(25)]
+        UserProfile.objects.bulk_create([UserProfile(user=author) for author in authors])
+        cls.answers = Answer.objects.bulk_create([
+            Answer(question=cls.question, user=author, text=f"ответ {i}", rating=i % 5)
+            for i, author in enumerate(authors)
+        ])
+        Answer.objects.filter(pk=cls.answers[0].pk).update(is_correct=True)
+        Question.objects.filter(pk=cls.question.pk).update(answer_count=len(authors))
+
+    def setUp(self):
+        cache.clear()
+        get_popular_tags()
+        get_best_members()
+        self.client.force_login(self.viewer)
+
+    def test_accepted_first_then_rating(self):
+        url = reverse("questions:question_detail", args=[self.question.id])
+        response = self.assertQueryBudget(self.DETAIL_BUDGET, url)
+        answers = response.context["answers"]
+        self.assertEqual(len(answers), Answer.objects.ANSWER_COUNT_PAGE)
+        self.assertEqual(answers[0].id, self.answers[0].id)
+        ratings = [answer.rating for answer in answers[1:]]
+        self.assertEqual(ratings, sorted(ratings, reverse=True))
+
+        second = self.assertQueryBudget(self.DETAIL_BUDGET, url, {"page": 2})
+        self.assertEqual(len(second.context["answers"]), 5)
+        self.assertEqual(second.context["page_obj"].paginator.num_pages, 2)
+
+    def test_invalid_answer_reuses_loader(self):
+        response = self.client.post(reverse("questions:answer_create", args=[self.question.id]), {"text": ""})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["answers"]), Answer.objects.ANSWER_COUNT_PAGE)
+
+
+class AsyncReadsTest(TransactionTestCase):
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        self.question = make_questions(1, prefix="async")[0]
+        self.viewer = User.objects.create(username="async_viewer")
+        UserProfile.objects.create(user=self.viewer)
+
+    @mock.patch("questions.concurrency.connection_pool_configured", return_value=True)
+    def test_reads_run_concurrently(self, pool_configured):
+        # оба чтения ждут друг друга у барьера: пройдут, только если идут одновременно
+        barrier = threading.Barrier(2, timeout=5)
+        results = async_to_sync(gather_reads)(
+            lambda: (barrier.wait(), Question.objects.count())[1],
+            lambda: (barrier.wait(), Tag.objects.count())[1],
+        )
+        self.assertEqual(results, [1, 0])
+
+    def test_serial_without_connection_pool(self):
+        # без пула соединений — ни потоков, ни новых соединений: всё в потоке запроса
+        threads = []
+        results = async_to_sync(gather_reads)(
+            lambda: (threads.append(threading.current_thread()), Question.objects.count())[1],
+            lambda: (threads.append(threading.current_thread()), Tag.objects.count())[1],
+        )
+        self.assertEqual(results, [1, 0])
+        self.assertEqual(threads, [threading.current_thread()] * 2)
+
+    @mock.patch("questions.concurrency.connection_pool_configured", return_value=True)
+    def test_pool_reads_are_instrumented_and_closed(self, pool_configured):
+        seen, pool_connections = [], []
+
+        def count(execute, sql, params, many, context):
+            seen.append(threading.current_thread())
+            return execute(sql, params, many, context)
+
+        def read():
+            pool_connections.append(connections["default"])
+            return Question.objects.count()
+
+        # in-memory SQLite тестов close() не закрывает — проверяем сам вызов
+        closed = []
+        with connection.execute_wrapper(count), \
+                mock.patch.object(connections, "close_all", side_effect=lambda: closed.append(connections["default"])):
+            self.assertEqual(async_to_sync(gather_reads)(read, read), [1, 1])
+        # запросы потоков пула видны обёртке соединения запроса
+        self.assertEqual(len(seen), 2)
+        self.assertNotIn(threading.current_thread(), seen)
+        # соединение каждого потока пула вернулось в пул после чтения, обёртки сняты
+        self.assertCountEqual(closed, pool_connections)
+        self.assertTrue(all(not pool_connection.execute_wrappers for pool_connection in pool_connections))
+
+    def test_serial_inside_transaction(self):
+        with transaction.atomic():
+            make_questions(2, prefix="uncommitted")
+            self.assertEqual(async_to_sync(gather_reads)(Question.objects.count), [3])
+
+    async def test_async_pages(self):
+        client = AsyncClient()
+        await client.aforce_login(self.viewer)
+        response = await client.get(reverse("home"))
+        self.assertEqual([q.id for q in response.context["questions"]], [self.question.id])
+
+        response = await client.get(reverse("questions:question_detail", args=[self.question.id]))
+        self.assertEqual(response.context["question"].id, self.question.id)
+        self.assertEqual(response.context["question"].viewer_mark, 0)
+
+        response = await client.get(reverse("questions:question_detail", args=[self.question.id + 100]))
+        self.assertEqual(response.status_code, 404)
+
+
+class ConditionalGetTest(TestCase):
+    # на 304 остаются сессия и пользователь из middleware
+    NOT_MODIFIED_BUDGET = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create(username="etag_viewer")
+        UserProfile.objects.create(user=cls.viewer)
+        cls.tag = Tag.objects.create(title="etag")
+        cls.questions = make_questions(3, [cls.tag], prefix="etag")
+        cls.answer = Answer.objects.create(user=cls.viewer, question=cls.questions[0], text="ответ")
+
+    def setUp(self):
+        cache.clear()
+        get_popular_tags()
+        get_best_members()
+        self.client.force_login(self.viewer)
+
+    def assertNotModified(self, url, etag):
+        with self.assertNumQueries(self.NOT_MODIFIED_BUDGET):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_listing_not_modified_until_vote(self):
+        url = reverse("home")
+        etag = self.client.get(url)["ETag"]
+        self.assertNotModified(url, etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            vote_question(self.viewer, self.questions[1].id, 1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertNotModified(url, response["ETag"])
+
+    def test_detail_not_modified_until_answers_change(self):
+        url = reverse("questions:question_detail", args=[self.questions[0].id])
+        etag = self.client.get(url)["ETag"]
+        self.assertNotModified(url, etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            vote_answer(User.objects.get(username="etag_author_1"), self.answer.id, 1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Answer.objects.create(user=self.viewer, question=self.questions[0], text="ещё ответ")
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detail_not_modified_until_authors_change(self):
+        question = self.questions[0]
+        answerer = User.objects.get(username="etag_author_2")
+        Answer.objects.create(user=answerer, question=question, text="чужой ответ")
+        url = reverse("questions:question_detail", args=[question.id])
+        etag = self.client.get(url)["ETag"]
+        self.assertNotModified(url, etag)
+
+        # аватар отвечавшего, потом автора вопроса — страница уже другая
+        for author in (answerer, question.user):
+            with self.captureOnCommitCallbacks(execute=True):
+                author.profile.display_name = "новое имя"
+                author.profile.save(update_fields=["display_name"])
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            etag = response["ETag"]
+            self.assertNotModified(url, etag)
+
+    def test_no_validator_without_cached_state(self):
+        self.assertFalse(self.client.get(reverse("questions:tag", args=["etag"])).has_header("ETag"))
+        cache.delete(POPULAR_TAGS_KEY)
+        self.assertFalse(self.client.get(reverse("home")).has_header("ETag"))
+
+
+class LiveUpdatesTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create(username="live_viewer")
+        cls.question = make_questions(1, prefix="live")[0]
+        cls.answer = Answer.objects.create(user=cls.question.user, question=cls.question, text="ответ")
+
+    def setUp(self):
+        broker_patch = mock.patch.object(live, "_broker", MemoryLiveBroker())
+        self.broker = broker_patch.start()
+        self.addCleanup(broker_patch.stop)
+
+    def open_stream(self, path, cookie=""):
+        """Запускает поток событий; возвращает отправленные сообщения и функцию обрыва."""
+        async def run(until):
+            sent = []
+            disconnect = asyncio.Event()
+            requested = False
+
+            async def receive():
+                nonlocal requested
+                if not requested:
+                    requested = True
+                    return {"type": "http.request", "body": b"", "more_body": False}
+                await disconnect.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                sent.append(message)
+
+            async def django_app(scope, receive, send):
+                raise AssertionError("запрос ушёл в Django")
+
+            scope = {"type": "http", "method": "GET", "path": path, "headers": [(b"cookie", cookie.encode())]}
+            task = asyncio.ensure_future(QuestionEventsApplication(django_app)(scope, receive, send))
+            await until(sent)
+            disconnect.set()
+            await asyncio.wait_for(task, 1)
+            return sent
+
+        return run
+
+    def session_cookie(self):
+        self.client.force_login(self.viewer)
+        return f"{settings.SESSION_COOKIE_NAME}={self.client.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+    def test_stream_pushes_votes_answers_and_accept(self):
+        question_url = reverse("questions:question_events", args=[self.question.id])
+
+        def act():
+            with self.captureOnCommitCallbacks(execute=True):
+                vote_answer(self.viewer, self.answer.id, 1)
+                self.client.post(reverse("questions:answer_create", args=[self.question.id]), {"text": "новый"})
+                self.client.force_login(self.question.user)
+                self.client.post(
+                    reverse("questions:answer_correct", args=[self.question.id]), {"answer_id": self.answer.id},
+                )
+
+        async def until(sent):
+            while len(sent) < 2:
+                await asyncio.sleep(0.01)
+            await sync_to_async(act)()
+            while len(sent) < 5:
+                await asyncio.sleep(0.01)
+
+        sent = async_to_sync(self.open_stream(question_url, self.session_cookie()))(until)
+        self.assertEqual(sent[0]["status"], 200)
+        bodies = [message["body"].decode() for message in sent[2:]]
+        self.assertTrue(bodies[0].startswith("event: rating\n"))
+        self.assertIn(f'"id": {self.answer.id}, "rating": 1', bodies[0])
+        self.assertTrue(bodies[1].startswith("event: answer\n"))
+        self.assertIn('"answer_count": 1', bodies[1])
+        self.assertIn(f'"answer_id": {self.answer.id}', bodies[2])
+        self.assertEqual(self.broker.channels(), [])
+
+    def test_stream_requires_login_and_question(self):
+        async def until(sent):
+            while not sent:
+                await asyncio.sleep(0.01)
+
+        stream = self.open_stream(reverse("questions:question_events", args=[self.question.id]))
+        self.assertEqual(async_to_sync(stream)(until)[0]["status"], 403)
+        stream = self.open_stream(reverse("questions:question_events", args=[0]), self.session_cookie())
+        self.assertEqual(async_to_sync(stream)(until)[0]["status"], 404)
+
+    def test_wsgi_fallback_does_not_stream(self):
+        self.client.force_login(self.viewer)
+        response = self.client.get(reverse("questions:question_events", args=[self.question.id]))
+        self.assertEqual(response.status_code, 204)
+
+    def test_cache_broker_delivers_across_workers(self):
+        # два воркера — два брокера над одним кэшем
+        publisher, listener = CacheLiveBroker(interval=3600), CacheLiveBroker(interval=3600)
+        self.addCleanup(listener.shutdown)
+
+        async def run():
+            subscription = listener.subscribe(self.question.id)
+            listener.poll()
+            publisher.publish(self.question.id, {"type": "rating", "rating": 3})
+            self.assertEqual(listener.poll(), 1)
+            return await asyncio.wait_for(subscription.get(), 1)
+
+        cache.clear()
+        self.assertEqual(async_to_sync(run)(), {"type": "rating", "rating": 3})
+
+
+class HotScoreTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.old, cls.fresh, cls.popular = make_questions(3, prefix="hot")
+        start = timezone.now() - datetime.timedelta(days=1)
+        for offset, question in enumerate([cls.old, cls.popular, cls.fresh]):
+            Question.objects.filter(pk=question.pk).update(created_at=start + datetime.timedelta(hours=offset))
+        Question.objects.filter(pk=cls.popular.pk).update(rating=1000)
+        call_command("rebuild_hot_scores", stdout=StringIO())
+
+    def setUp(self):
+        cache.clear()
+
+    def assertScoresMatch(self):
+        for question in Question.objects.all():
+            expected = compute_hot_score(question.rating, question.answer_count, question.created_at)
+            self.assertAlmostEqual(question.hot_score, expected, places=5)
+
+    def test_hot_ordering(self):
+        # голоса поднимают старый вопрос над свежим; при равных голосах свежий выше старого
+        ids = [question.id for question in Question.objects.get_hot_question().questions]
+        self.assertEqual(ids, [self.popular.id, self.fresh.id, self.old.id])
+
+    def test_add_answer_ignores_stale_instance(self):
+        first, second = Question.objects.get(pk=self.old.pk), Question.objects.get(pk=self.old.pk)
+        vote_question(User.objects.create(username="hot_voter"), self.old.id, 1)
+        first.add_answer()
+        second.add_answer()
+        self.assertEqual(second.answer_count, 2)
+        question = Question.objects.get(pk=self.old.pk)
+        self.assertEqual((question.rating, question.answer_count), (1, 2))
+        self.assertScoresMatch()
+
+    def test_rebuild_command_and_migration_backfill(self):
+        Question.objects.update(hot_score=0)
+        with CaptureQueriesContext(connection) as captured:
+            call_command("rebuild_hot_scores", chunk_size=2, stdout=StringIO())
+        self.assertScoresMatch()
+        # пачка читается уже в своей транзакции (под FOR UPDATE там, где он есть)
+        statements = [query["sql"] for query in captured.captured_queries]
+        reads = [i for i, sql in enumerate(statements) if sql.startswith("SELECT") and "created_at" in sql]
+        self.assertEqual(len(reads), 2)
+        self.assertTrue(all(statements[i - 1].startswith("SAVEPOINT") for i in reads))
+
+        Question.objects.update(hot_score=0)
+        migration = importlib.import_module("questions.migrations.0009_backfill_hot_scores")
+        migration.fill_hot_scores(apps, None)
+        self.assertScoresMatch()
+
+
+class VoteServiceTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.voter = User.objects.create(username="voter")
+        cls.question = make_questions(1)[0]
+        cls.answer = Answer.objects.create(user=cls.question.user, question=cls.question, text="ответ")
+
+    def test_like_switch_and_unlike(self):
+        self.assertEqual(vote_question(self.voter, self.question.id, 1), (1, 1))
+        self.assertEqual(vote_question(self.voter, self.question.id, -1), (-1, -1))
+        self.assertEqual(vote_question(self.voter, self.question.id, -1), (0, 0))
+        self.assertFalse(QuestionMark.objects.exists())
+
+    def test_hot_score_follows_rating(self):
+        vote_question(self.voter, self.question.id, 1)
+        question = Question.objects.get(pk=self.question.pk)
+        expected = compute_hot_score(question.rating, question.answer_count, question.created_at)
+        self.assertAlmostEqual(question.hot_score, expected, places=5)
+
+    def test_answer_vote(self):
+        self.assertEqual(vote_answer(self.voter, self.answer.id, -1), (-1, -1))
+        self.assertEqual(AnswerMark.objects.get().mark, -1)
+
+    def test_endpoint(self):
+        self.client.force_login(self.voter)
+        url = reverse("questions:question_mark", args=[self.question.id])
+        response = self.client.post(url, {"mark": "like"})
+        self.assertEqual(response.json(), {"rating": 1, "mark": 1})
+        response = self.client.post(url, {"mark": "2"})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse("questions:question_mark", args=[0]), {"mark": "1"})
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(VOTE_RATING_BUFFER="memory", VOTE_RATING_BUFFER_INTERVAL=3600)
+class VoteBufferTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.voters = [User.objects.create(username=f"buffered_{i}") for i in range(3)]
+        cls.question = make_questions(1)[0]
+
+    def tearDown(self):
+        vote_buffer._buffer = None
+
+    def test_deltas_are_merged_then_flushed(self):
+        for voter in self.voters:
+            with self.captureOnCommitCallbacks(execute=True):
+                result = vote_question(voter, self.question.id, 1)
+        self.assertEqual(result.rating, 3)
+
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.rating, 0)
+        self.assertEqual(vote_buffer.merge_pending_ratings([self.question])[0].rating, 3)
+
+        vote_buffer.get_rating_buffer().flush()
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.rating, 3)
+        self.assertEqual(vote_buffer.find_rating_drift(Question, QuestionMark, "question"), [])
+
+    def test_cache_buffer_claims_each_delta_once(self):
+        # два воркера пометили один ключ; второй пытается разобрать его, пока первый между get и decr
+        first, second = vote_buffer.CacheRatingBuffer(3600), vote_buffer.CacheRatingBuffer(3600)
+        key = vote_buffer.RatingBuffer._key(Question, self.question.id)
+        first._add(key, 3)
+        second._add(key, 2)
+        get = first.cache.get
+        taken_by_second = []
+
+        def get_interleaved(cache_key, *args, **kwargs):
+            value = get(cache_key, *args, **kwargs)
+            if not taken_by_second:
+                taken_by_second.append(second._take())
+            return value
+
+        with mock.patch.object(first.cache, "get", side_effect=get_interleaved):
+            taken_by_first = first._take()
+        self.assertEqual(taken_by_first, {key: 5})
+        self.assertEqual(taken_by_second, [{}])
+        # ключ второго остался грязным, но брать уже нечего
+        self.assertEqual(second._take(), {})
+        self.assertEqual(first.pending(Question, [self.question.id]), {})
+
+    def test_drift_is_summed_per_chunk(self):
+        questions = [self.question, *make_questions(4, prefix="drift")]
+        for voter in self.voters:
+            for question in questions:
+                QuestionMark.objects.create(user=voter, question=question, mark=1)
+        Question.objects.filter(pk__in=[questions[1].pk, questions[3].pk]).update(rating=1)
+        drift = vote_buffer.find_rating_drift(Question, QuestionMark, "question", chunk_size=2)
+        expected = [(questions[i].pk, 1 if i in (1, 3) else 0, 3) for i in range(5)]
+        self.assertEqual(drift, expected)
+        limited = vote_buffer.find_rating_drift(Question, QuestionMark, "question", limit=2, chunk_size=2)
+        self.assertEqual(limited, expected[:2])
+
+
+class VoteRaceTest(TestCase):
+    """
+    Гонки голосования без настоящих параллельных соединений: чужой запрос
+    выполняется внутри нашего в тот момент, где он мог бы вклиниться.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.voter = User.objects.create(username="racer")
+        cls.question = make_questions(1, prefix="race")[0]
+
+    def assertConsistent(self, rating):
+        question = Question.objects.get(pk=self.question.pk)
+        total = QuestionMark.objects.filter(question=question).aggregate(s=Sum("mark"))["s"] or 0
+        self.assertEqual((question.rating, total), (rating, rating))
+        reputation = Reputation.objects.filter(user=question.user).values_list("question_rating", flat=True).first()
+        self.assertEqual(reputation or 0, rating)
+        expected = compute_hot_score(question.rating, question.answer_count, question.created_at)
+        self.assertAlmostEqual(question.hot_score, expected, places=5)
+
+    def test_double_submit_loses_insert_race(self):
+        insert_mark = votes._insert_mark
+        calls = []
+
+        def first_submit_wins(*args):
+            # второй клик того же пользователя успел вставить оценку раньше нас
+            if not calls:
+                calls.append(None)
+                calls[0] = vote_question(self.voter, self.question.id, 1)
+            return insert_mark(*args)
+
+        with mock.patch.object(votes, "_insert_mark", side_effect=first_submit_wins):
+            result = vote_question(self.voter, self.question.id, 1)
+        # два одинаковых клика — оценка поставлена и снята, рейтинг прежний
+        self.assertEqual((calls[0], result), ((1, 1), (0, 0)))
+        self.assertConsistent(0)
+
+    def test_mark_deleted_between_insert_and_lock(self):
+        insert_mark = votes._insert_mark
+        attempts = []
+
+        def row_vanished_once(*args):
+            # вставка упёрлась в чужую строку, но её сняли до SELECT ... FOR UPDATE
+            attempts.append(args)
+            if len(attempts) == 1:
+                return False
+            return insert_mark(*args)
+
+        with mock.patch.object(votes, "_insert_mark", side_effect=row_vanished_once):
+            self.assertEqual(vote_question(self.voter, self.question.id, -1), (-1, -1))
+        self.assertEqual(len(attempts), 2)
+        self.assertConsistent(-1)
+
+    def test_repeated_and_flipped_marks(self):
+        clicks = [(1, (1, 1)), (1, (0, 0)), (-1, (-1, -1)), (1, (1, 1)), (-1, (-1, -1)), (-1, (0, 0))]
+        for mark, expected in clicks:
+            with self.subTest(mark=mark, expected=expected):
+                self.assertEqual(vote_question(self.voter, self.question.id, mark), expected)
+                self.assertConsistent(expected[0])
+
+
+@skipUnlessDBFeature("has_select_for_update")
+class VoteConcurrencyTest(TransactionTestCase):
+    VOTERS = 20
+    CLICKS_PER_VOTER = 5
+
+    def test_parallel_votes_keep_rating_consistent(self):
+        question = make_questions(1)[0]
+        voters = [User.objects.create(username=f"hammer_{i}") for i in range(self.VOTERS)]
+
+        def hammer(voter):
+            try:
+                for click in range(self.CLICKS_PER_VOTER):
+                    vote_question(voter, question.id, 1 if (voter.id + click) % 3 else -1)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.VOTERS) as pool:
+            list(pool.map(hammer, voters + voters))
+
+        question.refresh_from_db()
+        total = QuestionMark.objects.filter(question=question).aggregate(s=Sum("mark"))["s"] or 0
+        self.assertEqual(question.rating, total)
+
+
+class SearchViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create(username="searcher")
+        author = User.objects.create(username="search_author")
+        cls.orm = Question.objects.create(user=author, topic="Django ORM и индексы", text="как ускорить запрос")
+        cls.other = Question.objects.create(user=author, topic="Вёрстка", text="flex и grid")
+        Answer.objects.create(user=author, question=cls.other, text="индексы тут не помогут")
+
+    def setUp(self):
+        search._inverted_index.__init__()
+        self.client.force_login(self.viewer)
+
+    def test_topic_match_ranks_above_answer_match(self):
+        response = self.client.get(reverse("questions:search"), {"q": "индексы"})
+        self.assertEqual([q.id for q in response.context["questions"]], [self.orm.id, self.other.id])
+
+    def test_all_words_must_match(self):
+        response = self.client.get(reverse("questions:search"), {"q": "индексы grid"})
+        self.assertEqual([q.id for q in response.context["questions"]], [self.other.id])
+
+    def test_empty_query(self):
+        response = self.client.get(reverse("questions:search"), {"q": "  "})
+        self.assertEqual(list(response.context["questions"]), [])
+
+
+class TagAutocompleteTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for title, count in [("python", 5), ("pytest", 9), ("Pyramid", 1), ("perl", 7), ("go", 3)]:
+            Tag.objects.create(title=title, question_count=count)
+
+    def test_prefix_ranked_by_popularity(self):
+        index = TagPrefixIndex()
+        self.assertEqual(index.complete("py"), ["pytest", "python", "Pyramid"])
+        self.assertEqual(index.complete("P", limit=2), ["pytest", "perl"])
+        self.assertEqual(index.complete("rust"), [])
+
+    def test_new_tags_are_added_without_reload(self):
+        index = TagPrefixIndex()
+        index.complete("py")
+        index.add("pydantic")
+        with self.assertNumQueries(0):
+            self.assertIn("pydantic", index.complete("pyd"))
+
+    def test_stale_index_reloads_in_background(self):
+        index = TagPrefixIndex(reload_seconds=0)
+        self.assertEqual(index.complete("ru"), [])
+        Tag.objects.bulk_create([Tag(title="rust", question_count=4)])
+
+        with mock.patch.object(index, "_spawn") as spawn, self.assertNumQueries(0):
+            # снимок устарел: отвечаем по старому, перечитывание — одно и не в запросе
+            self.assertEqual(index.complete("ru"), [])
+            self.assertEqual(index.complete("ru"), [])
+        spawn.assert_called_once_with(index._reload_in_background)
+
+        index._reload()
+        index.reload_seconds = 300
+        self.assertEqual(index.complete("ru"), ["rust"])
+
+    def test_popularity_changes_reach_ranking(self):
+        with mock.patch.object(tag_index, "_index", TagPrefixIndex()):
+            index = tag_index.get_tag_index()
+            self.assertEqual(index.complete("p", limit=1), ["pytest"])
+            perl = Tag.objects.get(title="perl")
+            with self.captureOnCommitCallbacks(execute=True):
+                for question in make_questions(3, prefix="perl"):
+                    question.tags.add(perl)
+            with self.assertNumQueries(0):
+                self.assertEqual(index.complete("p", limit=1), ["perl"])
+
+    def test_endpoint(self):
+        self.client.force_login(User.objects.create(username="asker"))
+        response = self.client.get(reverse("questions:tag_autocomplete"), {"q": "pe"})
+        self.assertEqual(response.json(), {"tags": ["perl"]})
+
+
+class QuestionCreateTagsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.asker = User.objects.create(username="tag_asker")
+        UserProfile.objects.create(user=cls.asker)
+        cls.django = Tag.objects.create(title="Django")
+
+    def setUp(self):
+        self.client.force_login(self.asker)
+
+    def ask(self, tags):
+        return self.client.post(reverse("questions:ask"), {"topic": "тема", "text": "текст", "tags": tags})
+
+    def test_tags_are_resolved_in_bulk(self):
+        titles = " ".join(f"new{i}" for i in range(15))
+        index = TagPrefixIndex()
+        index.complete("new")
+        with mock.patch.object(tag_index, "_index", index), self.captureOnCommitCallbacks(execute=True):
+            self.ask(f"django, python;{titles} PYTHON")
+        question = Question.objects.get()
+
+        self.assertEqual(
+            sorted(question.tags.values_list("title", flat=True)),
+            sorted(["Django", "python", *(f"new{i}" for i in range(15))]),
+        )
+        self.assertEqual(Tag.objects.filter_titles(["python"]).get().question_count, 1)
+        self.assertIn("new14", index.complete("new1"))
+
+    def test_query_count_does_not_grow_with_tags(self):
+        with CaptureQueriesContext(connection) as few:
+            self.ask("a1 a2")
+        with CaptureQueriesContext(connection) as many:
+            self.ask(" ".join(f"b{i}" for i in range(20)))
+        self.assertEqual(len(few), len(many))
+
+    def test_case_insensitive_uniqueness(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Tag.objects.create(title="DJANGO")
+
+
+class PopularTagsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags = [Tag.objects.create(title=f"popular{i}") for i in range(4)]
+        make_questions(3, cls.tags[:2], prefix="popular")
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(POPULAR_TAGS_COUNT=2)
+    def test_top_is_recomputed_only_when_ranking_changes(self):
+        self.assertEqual([title for _, title, _ in get_popular_tags()], ["popular0", "popular1"])
+
+        user = User.objects.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            question = Question.objects.create(user=user, topic="t", text="t")
+            question.tags.set([self.tags[3]])
+        # 1 вопрос у popular3 против 3 у popular1 — топ прежний, кэш жив
+        self.assertIsNotNone(cache.get(POPULAR_TAGS_KEY))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            question.tags.add(self.tags[1])
+        self.assertIsNone(cache.get(POPULAR_TAGS_KEY))
+        self.assertEqual([count for _, _, count in get_popular_tags()], [4, 3])
+
+    def test_sidebar_renders_from_cache(self):
+        self.client.force_login(User.objects.first())
+        get_popular_tags()
+        response = self.client.get(reverse("home"))
+        self.assertContains(response, "popular0")
+        self.assertNotContains(response, "RubyOnRails")
+
+
+@override_settings(ACCEPTED_ANSWER_BONUS=15)
+class ReputationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.question = make_questions(1, prefix="rep")[0]
+        cls.asker = cls.question.user
+        cls.helper = User.objects.create(username="helper")
+        cls.answer = Answer.objects.create(user=cls.helper, question=cls.question, text="ответ")
+
+    def score(self, user):
+        return Reputation.objects.filter(user=user).values_list("score", flat=True).first() or 0
+
+    def test_votes_and_accepts_move_reputation(self):
+        vote_question(self.helper, self.question.id, 1)
+        vote_answer(self.asker, self.answer.id, 1)
+        self.assertEqual(self.score(self.asker), 1)
+        self.assertEqual(self.score(self.helper), 1)
+
+        self.client.force_login(self.asker)
+        url = reverse("questions:answer_correct", args=[self.question.id])
+        self.client.post(url, {"answer_id": self.answer.id})
+        self.assertEqual(self.score(self.helper), 16)
+        self.client.post(url, {"answer_id": self.answer.id})
+        self.assertEqual(self.score(self.helper), 1)
+
+    def test_rebuild_matches_incremental(self):
+        vote_question(self.helper, self.question.id, -1)
+        vote_answer(self.asker, self.answer.id, 1)
+        Answer.objects.filter(pk=self.answer.pk).update(is_correct=True)
+        Reputation.objects.all().delete()
+
+        call_command("rebuild_reputation", chunk_size=1, stdout=StringIO())
+        self.assertEqual(self.score(self.asker), -1)
+        self.assertEqual(self.score(self.helper), 16)
+
+        cache.clear()
+        self.assertEqual(get_best_members()[0][1], "helper")
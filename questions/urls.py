@@ -1,4 +1,5 @@
 from django.urls import path
+
 from . import views
 
 app_name = "questions"
@@ -15,9 +16,14 @@ urlpatterns = [
 
     path("hot/", views.HotView.as_view(), name="hot"),
     path("tag/<str:tag>/", views.TagView.as_view(), name="tag"),
+    path("search/", views.SearchView.as_view(), name="search"),
+    path("tags/autocomplete/", views.TagAutocompleteView.as_view(), name="tag_autocomplete"),
 
     path("<int:pk>/question_mark/", views.QuestionMarkAjaxView.as_view(), name="question_mark"),
     path("<int:pk>/answer_mark/", views.AnswerMarkAjaxView.as_view(), name="answer_mark"),
 
     path("<int:pk>/answer_mark_correct/", views.AnswerCorrectAjaxView.as_view(), name="answer_correct"),
+
+    # server-sent events: рейтинги, новые ответы, правильный ответ
+    path("<int:pk>/events/", views.QuestionEventsView.as_view(), name="question_events"),
 ]
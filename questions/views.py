@@ -1,89 +1,253 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
+from django.http import Http404, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
 from django.views import View
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
-from django.shortcuts import get_object_or_404
-from django.contrib.auth.mixins import LoginRequiredMixin
-from django.shortcuts import redirect, render
-from django.http import JsonResponse, HttpResponseBadRequest
-from django.views.generic import TemplateView
-from django.http import Http404
-from django.urls import reverse_lazy
-from django.views.generic import CreateView
-from django.contrib import messages
-from django.utils import timezone
-from django.urls import reverse
-
-from .pagination import paginate
-from .models import Question, Answer, Tag, QuestionMark, AnswerMark
-from .forms import QuestionForm, AnswerForm
-
-
-class HomeView(TemplateView):
+from django.views.generic import CreateView, TemplateView
+
+from .cards import (
+    author_versions,
+    detail_version,
+    question_answers_changed,
+    remember_detail_authors,
+    render_cards,
+)
+from .concurrency import gather_reads
+from .etags import (
+    add_validator,
+    cached_listing_etag,
+    listing_etag,
+    not_modified,
+    page_state,
+    question_etag,
+)
+from .forms import AnswerForm, QuestionForm
+from .listing_cache import HOT_LISTING, NEW_LISTING
+from .live import publish_question_event
+from .models import Answer, Question, Tag
+from .pagination import QuestionPageResult, decode_cursor, paginate
+from .reputation import add_reputation, get_best_members
+from .sidebar import get_popular_tags
+from .tag_index import get_tag_index
+from .vote_buffer import merge_pending_ratings
+from .vote_state import ANSWER_STATE, QUESTION_STATE, attach_marks, load_marks
+from .votes import parse_mark, vote_answer, vote_question
+
+
+class QuestionListView(TemplateView):
     template_name = "questions/index.html"
-
-    def get_context_data(self, **kwargs):
-        ctx = super().get_context_data(**kwargs)
-        page_number = int(self.request.GET.get("page", 1))
-        questions, total_pages = Question.objects.get_new_question(page_number)
-        page_obj = paginate(questions, page_number, total_pages)
-
+    page_title = ""
+    # только чтения — ReplicaRoutingMiddleware отправит их на реплику
+    replica_reads = True
+    # лента в кэше, по записи которой ETag сверяется до запросов; None — без ETag
+    listing = None
+
+    def get_questions(self, page_number, cursor):
+        raise NotImplementedError
+
+    def check_not_modified(self, request, page_number, cursor):
+        if self.listing is None or cursor is not None:
+            return None, None
+        state = page_state(request)
+        return state, not_modified(request, cached_listing_etag(state, self.listing, page_number))
+
+    async def get(self, request, *args, **kwargs):
+        # ?page=abc и номера дальше NUMBERED_PAGE_LIMIT разбирает менеджер, а не 500
+        page_number = Question.objects.clean_page_number(request.GET.get("page"))
+        cursor = decode_cursor(request.GET.get("cursor"))
+        state, response = await sync_to_async(self.check_not_modified)(request, page_number, cursor)
+        if response is not None:
+            return response
+
+        # лента (вместе со счётчиком страниц) и сайдбар друг от друга не зависят
+        result, popular, members = await gather_reads(
+            lambda: self.get_questions(page_number, cursor), get_popular_tags, get_best_members,
+        )
+        page_obj = paginate(
+            result.questions,
+            page_number if cursor is None else None,
+            result.total_pages,
+            result.next_cursor,
+            result.previous_cursor,
+            result.count_estimated,
+        )
+        # оценки зрителя нужны по id страницы, карточки — по оценкам; request.user
+        # уже прочитан LoginRequiredMiddleware, auser() загрузил бы его второй раз
+        await sync_to_async(self.decorate_questions)(request.user, page_obj.object_list)
+
+        ctx = self.get_context_data(**kwargs)
         ctx.update({
             "page_obj": page_obj,
-            "questions": questions,
-            "page_title": "Новые вопросы",
+            "questions": page_obj.object_list,
+            "page_title": self.get_page_title(),
+            "popular_tags": popular,
+            "best_members": members,
         })
-        return ctx
+        response = self.render_to_response(ctx)
+        if self.listing is not None and cursor is None:
+            # по тем версиям карточек, что реально попали в страницу
+            versions = [(question.id, question.card_version) for question in page_obj.object_list]
+            add_validator(response, listing_etag(
+                state, self.listing, page_number, versions, result.total_pages, result.next_cursor,
+            ))
+        return response
 
+    def decorate_questions(self, user, questions):
+        attach_marks(user, QUESTION_STATE, questions)
+        render_cards(questions, user)
 
-class HotView(TemplateView):
-    template_name = "questions/index.html"
+    def get_page_title(self):
+        return self.page_title
+
+
+class HomeView(QuestionListView):
+    page_title = "Новые вопросы"
+    listing = NEW_LISTING
+
+    def get_questions(self, page_number, cursor):
+        return Question.objects.get_new_question(page_number, cursor)
+
+
+class HotView(QuestionListView):
+    page_title = "Горячие вопросы"
+    listing = HOT_LISTING
+
+    def get_questions(self, page_number, cursor):
+        return Question.objects.get_hot_question(page_number, cursor)
+
+
+class TagView(QuestionListView):
+    # без ETag: ключ ленты — id тега, а его по названию из URL не узнать без запроса
+
+    def get_questions(self, page_number, cursor):
+        return Question.objects.get_tag_question(self.kwargs.get("tag"), page_number, cursor)
+
+    def get_page_title(self):
+        return f"Вопросы по тегу: {self.kwargs.get('tag')}"
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        page_number = int(self.request.GET.get("page", 1))
-        questions, total_pages = Question.objects.get_hot_question(page_number)
-        page_obj = paginate(questions, page_number, total_pages)
-
-        ctx.update({
-            "page_obj": page_obj,
-            "questions": questions,
-            "page_title": "Горячие вопросы",
-        })
+        ctx["current_tag"] = kwargs.get("tag")
         return ctx
 
 
-class TagView(TemplateView):
-    template_name = "questions/index.html"
+class SearchView(QuestionListView):
+
+    def get_search_query(self):
+        return self.request.GET.get("q", "").strip()
+
+    def get_questions(self, page_number, cursor):
+        query = self.get_search_query()
+        if not query:
+            return QuestionPageResult([], 1)
+        return Question.objects.search_question(query, page_number)
+
+    def get_page_title(self):
+        return f"Поиск: {self.get_search_query()}"
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        tag = kwargs.get("tag")
-        page_number = int(self.request.GET.get("page", 1))
-        questions, total_pages = Question.objects.get_tag_question(tag, page_number)
-        page_obj = paginate(questions, page_number, total_pages)
-
-        ctx.update({
-            "page_obj": page_obj,
-            "questions": page_obj.object_list,
-            "current_tag": tag,
-            "page_title": f"Вопросы по тегу: {tag}",
-        })
+        ctx["search_query"] = self.get_search_query()
         return ctx
 
 
+def question_detail_context(request, pk, page_number=1):
+    # вопрос с автором и тегами + одна страница ответов: число запросов не зависит от числа ответов
+    question = get_object_or_404(Question.objects.hydrate(Question.objects.all()), pk=pk)
+    merge_pending_ratings([question])
+    result = Answer.objects.get_question_answers(question, page_number)
+    attach_marks(request.user, QUESTION_STATE, [question])
+    attach_marks(request.user, ANSWER_STATE, result.answers)
+    return {
+        "question": question,
+        "answers": result.answers,
+        "page_obj": paginate(result.answers, result.page_number, result.total_pages),
+    }
+
+
 class QuestionDetailView(TemplateView):
     template_name = "questions/question_detail.html"
+    replica_reads = True
 
-    def get_context_data(self, **kwargs):
-        ctx = super().get_context_data(**kwargs)
-        question = get_object_or_404(Question, pk=kwargs.get("pk"))
-        answers = question.question_answers.all()
-        
+    async def get(self, request, *args, **kwargs):
+        pk = kwargs.get("pk")
+        try:
+            page_number = max(1, int(request.GET.get("page", 1)))
+        except (TypeError, ValueError):
+            page_number = 1
+        user = request.user
+
+        # версии вопроса, ответов и авторов лежат в кэше: совпал ETag — ни запросов, ни шаблона
+        state, version, etag, response = await sync_to_async(self.check_not_modified)(request, pk, page_number)
+        if response is not None:
+            return response
+        requested_page = page_number
+
+        # страница ответов и оценка вопроса не ждут сам вопрос: всё читаем разом —
+        # вопрос и ответы через async ORM, оценку и сайдбар (сначала кэш) — gather_reads
+        question, answers, (question_marks, popular, members) = await asyncio.gather(
+            Question.objects.hydrate(Question.objects.filter(pk=pk)).afirst(),
+            Answer.objects.aget_answer_page(pk, page_number),
+            gather_reads(lambda: load_marks(user, QUESTION_STATE, [pk]), get_popular_tags, get_best_members),
+        )
+        if question is None:
+            raise Http404
+
+        total_pages = Answer.objects.page_count(question.answer_count)
+        answers, page_number = await sync_to_async(self.decorate_answers)(
+            user, question, answers, page_number, total_pages,
+        )
+        question.viewer_mark = question_marks.get(question.id, 0)
+        if etag is None and state is not None:
+            # авторов страницы ещё не знали: запоминаем, валидатор — по версиям до чтений
+            etag = await sync_to_async(self.remember_authors)(state, requested_page, version, question, answers)
+
+        ctx = self.get_context_data(**kwargs)
         ctx.update({
-            "question": question, 
+            "question": question,
             "answers": answers,
+            "page_obj": paginate(answers, page_number, total_pages),
             "answer_form": AnswerForm(),
+            "popular_tags": popular,
+            "best_members": members,
         })
-        return ctx
+        # ETag до чтений: если вопрос поменялся, пока читали, следующая сверка не совпадёт
+        return add_validator(self.render_to_response(ctx), etag)
+
+    def check_not_modified(self, request, pk, page_number):
+        state = page_state(request)
+        version = detail_version(pk, page_number)
+        etag = question_etag(state, pk, page_number, version)
+        return state, version, etag, not_modified(request, etag)
+
+    def remember_authors(self, state, page_number, version, question, answers):
+        question_version, answers_version, _ = version
+        user_ids = sorted({question.user_id, *(answer.user_id for answer in answers)})
+        remember_detail_authors(question.id, page_number, answers_version, user_ids)
+        return question_etag(
+            state, question.id, page_number, (question_version, answers_version, author_versions(user_ids)),
+        )
+
+    def decorate_answers(self, user, question, answers, page_number, total_pages):
+        if page_number > total_pages:
+            # страницы уже нет (ответы удалили) — отдаём последнюю
+            page_number = total_pages
+            answers = Answer.objects.get_answer_page(question.id, page_number)
+        merge_pending_ratings([question])
+        merge_pending_ratings(answers)
+        attach_marks(user, ANSWER_STATE, answers)
+        return answers, page_number
+
+
+class TagAutocompleteView(View):
+    LIMIT = 10
+
+    def get(self, request):
+        # ответ целиком из памяти процесса, база не трогается
+        tags = get_tag_index().complete(request.GET.get("q", ""), self.LIMIT)
+        return JsonResponse({"tags": tags})
 
 
 class QuestionCreateView(CreateView):
@@ -94,15 +258,13 @@ class QuestionCreateView(CreateView):
     def form_valid(self, form):
         self.object = form.save(commit=False)
         self.object.user = self.request.user
-        self.object.save()
 
         tags = form.cleaned_data.get("tags", [])
-        if tags:
-            tag_ids = []
-            for title in tags:
-                t, _ = Tag.objects.get_or_create(title=title)
-                tag_ids.append(t.id)
-            self.object.tags.set(tag_ids)
+        with transaction.atomic():
+            self.object.save()
+            if tags:
+                # все теги за фиксированное число запросов, а не get_or_create на каждый
+                self.object.tags.add(*Tag.objects.resolve_titles(tags))
 
         return redirect("questions:question_detail", pk=self.object.pk)
 
@@ -126,14 +288,12 @@ class AnswerCreateView(View):
             answer.question = question
             answer.save()
             answer.question.add_answer()
+            publish_question_event(question.id, "answer", id=answer.id, answer_count=question.answer_count)
             return redirect("questions:question_detail", pk=question.id)
 
-        answers = Answer.objects.filter(question=question).order_by("created_at")
-        return render(request, "questions/question_detail.html", {
-            "question": question,
-            "answers": answers,
-            "answer_form": form,
-        })
+        ctx = question_detail_context(request, pk)
+        ctx["answer_form"] = form
+        return render(request, "questions/question_detail.html", ctx)
     
 
 class QuestionMarkAjaxView(View):
@@ -141,48 +301,17 @@ class QuestionMarkAjaxView(View):
         if not request.user.is_authenticated:
             return JsonResponse({"error": "auth_required"}, status=403)
 
-        question = get_object_or_404(Question, pk=pk)
-
-        mark = request.POST.get("mark")
-
-        if mark == "like":
-            mark = 1
-        elif mark == "dislike":
-            mark = -1
-
-        try:
-            mark = int(mark)
-        except (TypeError, ValueError):
+        mark = parse_mark(request.POST.get("mark"))
+        if mark is None:
             return JsonResponse({"error": "bad_mark"}, status=400)
 
-        if mark not in (1, -1):
-            return JsonResponse({"error": "bad_mark"}, status=400)
+        # оценка и рейтинг меняются одной транзакцией, без чтения вопроса
+        try:
+            result = vote_question(request.user, pk, mark)
+        except (Question.DoesNotExist, IntegrityError):
+            raise Http404
 
-        existing = QuestionMark.objects.filter(user=request.user, question=question).first()
-
-        # rating может быть None в БД, на всякий случай
-        question.rating = question.rating or 0
-
-        if existing:
-            # Если нажал ту же оценку — снимаем
-            if existing.mark == mark:
-                existing.delete()
-                question.rating -= mark
-                question.save(update_fields=["rating"])
-                return JsonResponse({"rating": question.rating, "mark": 0})
-
-            # Если была противоположная — переключаем
-            question.rating += (mark - existing.mark)
-            existing.mark = mark
-            existing.save(update_fields=["mark"])
-            question.save(update_fields=["rating"])
-            return JsonResponse({"rating": question.rating, "mark": mark})
-
-        # Если оценки не было — создаём
-        QuestionMark.objects.create(user=request.user, question=question, mark=mark)
-        question.rating += mark
-        question.save(update_fields=["rating"])
-        return JsonResponse({"rating": question.rating, "mark": mark})
+        return JsonResponse({"rating": result.rating, "mark": result.mark})
     
 
 class AnswerMarkAjaxView(View):
@@ -190,46 +319,16 @@ class AnswerMarkAjaxView(View):
         if not request.user.is_authenticated:
             return JsonResponse({"error": "auth_required"}, status=403)
 
-        answer = get_object_or_404(Answer, pk=pk)
-
-        mark = request.POST.get("mark")
-
-        if mark == "like":
-            mark = 1
-        elif mark == "dislike":
-            mark = -1
-
-        try:
-            mark = int(mark)
-        except (TypeError, ValueError):
-            return JsonResponse({"error": "bad_mark"}, status=400)
-
-        if mark not in (1, -1):
+        mark = parse_mark(request.POST.get("mark"))
+        if mark is None:
             return JsonResponse({"error": "bad_mark"}, status=400)
 
-        existing = AnswerMark.objects.filter(user=request.user, answer=answer).first()
-
-        answer.rating = answer.rating or 0
-
-        # Если уже было — снимаем или переключаем
-        if existing:
-            if existing.mark == mark:
-                existing.delete()
-                answer.rating -= mark
-                answer.save(update_fields=["rating"])
-                return JsonResponse({"rating": answer.rating, "mark": 0, "answer_id": answer.id})
-
-            answer.rating += (mark - existing.mark)
-            existing.mark = mark
-            existing.save(update_fields=["mark"])
-            answer.save(update_fields=["rating"])
-            return JsonResponse({"rating": answer.rating, "mark": mark, "answer_id": answer.id})
+        try:
+            result = vote_answer(request.user, pk, mark)
+        except (Answer.DoesNotExist, IntegrityError):
+            raise Http404
 
-        # Если не было — создаём
-        AnswerMark.objects.create(user=request.user, answer=answer, mark=mark)
-        answer.rating += mark
-        answer.save(update_fields=["rating"])
-        return JsonResponse({"rating": answer.rating, "mark": mark, "answer_id": answer.id})
+        return JsonResponse({"rating": result.rating, "mark": result.mark, "answer_id": pk})
 
 
 class AnswerCorrectAjaxView(View):
@@ -250,13 +349,33 @@ class AnswerCorrectAjaxView(View):
 
         answer = get_object_or_404(Answer, pk=answer_id, question_id=question.id)
 
-        # если уже правильный — снимаем
-        if answer.is_correct:
-            Answer.objects.filter(question_id=question.id, is_correct=True).update(is_correct=False)
-            return JsonResponse({"ok": True, "answer_id": 0})
+        with transaction.atomic():
+            # порядок и отметка ответов поменяются — страница вопроса не совпадёт по ETag
+            transaction.on_commit(lambda: question_answers_changed(question.id))
+
+            # снимаем прошлый правильный ответ вместе с бонусом его автору
+            previous = list(
+                Answer.objects.filter(question_id=question.id, is_correct=True).values_list("id", "user_id")
+            )
+            Answer.objects.filter(pk__in=[previous_id for previous_id, _ in previous]).update(is_correct=False)
+            for _, user_id in previous:
+                add_reputation(user_id, accepted_answers=-1)
+
+            # если уже был правильный — только сняли
+            if answer.is_correct:
+                publish_question_event(question.id, "correct", answer_id=0)
+                return JsonResponse({"ok": True, "answer_id": 0})
+
+            Answer.objects.filter(pk=answer.id).update(is_correct=True)
+            add_reputation(answer.user_id, accepted_answers=1)
+            publish_question_event(question.id, "correct", answer_id=answer.id)
+
+        return JsonResponse({"ok": True, "answer_id": answer.id})
 
-        # иначе: снимаем прошлый и ставим новый
-        Answer.objects.filter(question_id=question.id, is_correct=True).update(is_correct=False)
-        Answer.objects.filter(pk=answer.id).update(is_correct=True)
 
-        return JsonResponse({"ok": True, "answer_id": answer.id})
\ No newline at end of file
+class QuestionEventsView(View):
+    # Поток событий отдаёт QuestionEventsApplication в StackOverflow.asgi. Сюда запрос
+    # доходит только под WSGI — там стрим держал бы поток воркера, поэтому 204:
+    # браузер не переподключается, страница работает без живых обновлений
+    def get(self, request, pk):
+        return HttpResponse(status=204)
@@ -0,0 +1,254 @@
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import Max, Min, Sum
+
+from .cards import question_card_changed
+
+logger = logging.getLogger(__name__)
+
+
+class RatingBuffer:
+    """
+    Копит дельты rating и раз в interval секунд одним пакетом пишет их в базу.
+    Строки оценок пишутся синхронно, буферизуется только UPDATE горячей строки вопроса.
+    """
+
+    def __init__(self, interval=2.0):
+        self.interval = interval
+        self._flusher = None
+        self._flusher_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def _add(self, key, delta):
+        raise NotImplementedError
+
+    def _pending(self, keys):
+        raise NotImplementedError
+
+    def _take(self):
+        raise NotImplementedError
+
+    @staticmethod
+    def _key(model, pk):
+        return model._meta.label_lower, int(pk)
+
+    def add(self, model, pk, delta):
+        if delta:
+            self._add(self._key(model, pk), delta)
+            self._ensure_flusher()
+
+    def pending(self, model, pks):
+        keys = [self._key(model, pk) for pk in pks]
+        return {key[1]: delta for key, delta in self._pending(keys).items() if delta}
+
+    def merge(self, objects):
+        if not objects:
+            return objects
+        pending = self.pending(type(objects[0]), [obj.pk for obj in objects])
+        for obj in objects:
+            if obj.pk in pending:
+                obj.rating = (obj.rating or 0) + pending[obj.pk]
+        return objects
+
+    def flush(self):
+        from .votes import rating_updates_for
+
+        taken = self._take()
+        if not taken:
+            return 0
+        try:
+            with transaction.atomic():
+                # одинаковый порядок строк во всех воркерах — без взаимных блокировок
+                for (label, pk), delta in sorted(taken.items()):
+                    if not delta:
+                        continue
+                    model = apps.get_model(label)
+                    model.objects.filter(pk=pk).update(**rating_updates_for(model, delta))
+        except Exception:
+            for key, delta in taken.items():
+                self._add(key, delta)
+            raise
+        # в кэше объектов ленты лежит rating из базы без дельт — он устарел
+        for label, pk in taken:
+            if label == "questions.question":
+                question_card_changed(pk)
+        return len(taken)
+
+    def _ensure_flusher(self):
+        if self._flusher is not None or self._stopped.is_set():
+            return
+        with self._flusher_lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, name="vote-buffer-flusher", daemon=True)
+                self._flusher.start()
+
+    def _run(self):
+        try:
+            while not self._stopped.wait(self.interval):
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception("Не удалось сбросить буфер рейтингов")
+        finally:
+            connection.close()
+
+    def shutdown(self):
+        self._stopped.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout=self.interval + 1)
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Не удалось сбросить буфер рейтингов при остановке")
+
+
+class MemoryRatingBuffer(RatingBuffer):
+    """Буфер в памяти процесса: чужие воркеры не видят его дельты до сброса."""
+
+    def __init__(self, interval=2.0):
+        super().__init__(interval)
+        self._lock = threading.Lock()
+        self._deltas = defaultdict(int)
+
+    def _add(self, key, delta):
+        with self._lock:
+            self._deltas[key] += delta
+
+    def _pending(self, keys):
+        with self._lock:
+            return {key: self._deltas[key] for key in keys if key in self._deltas}
+
+    def _take(self):
+        with self._lock:
+            taken, self._deltas = dict(self._deltas), defaultdict(int)
+        return taken
+
+
+class CacheRatingBuffer(RatingBuffer):
+    """
+    Дельты лежат в общем кэше (incr/decr атомарны), поэтому их видят все воркеры.
+    Каждый процесс сбрасывает ключи, которые трогал сам.
+    """
+
+    # сколько живёт замок на разбор ключа, если воркер упал между get и decr
+    CLAIM_TIMEOUT = 10
+
+    def __init__(self, interval=2.0, cache_alias="default"):
+        super().__init__(interval)
+        self.cache = caches[cache_alias]
+        self._lock = threading.Lock()
+        self._dirty = set()
+
+    @staticmethod
+    def _cache_key(key):
+        return f"votebuf:{key[0]}:{key[1]}"
+
+    def _add(self, key, delta):
+        cache_key = self._cache_key(key)
+        self.cache.add(cache_key, 0, timeout=None)
+        self.cache.incr(cache_key, delta)
+        with self._lock:
+            self._dirty.add(key)
+
+    def _pending(self, keys):
+        values = self.cache.get_many([self._cache_key(key) for key in keys])
+        return {key: values[self._cache_key(key)] for key in keys if values.get(self._cache_key(key))}
+
+    def _take(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        taken = {}
+        busy = set()
+        for key in dirty:
+            cache_key = self._cache_key(key)
+            # get + decr не атомарны: без замка два воркера с одним грязным ключом
+            # взяли бы одну дельту оба и записали её в базу дважды
+            claim_key = f"{cache_key}:claim"
+            if not self.cache.add(claim_key, 1, timeout=self.CLAIM_TIMEOUT):
+                busy.add(key)
+                continue
+            try:
+                delta = self.cache.get(cache_key)
+                if not delta:
+                    continue
+                # вычитаем ровно взятое: дельты, пришедшие после get, остаются в кэше
+                self.cache.decr(cache_key, delta)
+                taken[key] = delta
+            finally:
+                self.cache.delete(claim_key)
+        if busy:
+            # ключ разбирает другой воркер — наши дельты в кэше, проверим в следующий раз
+            with self._lock:
+                self._dirty |= busy
+        return taken
+
+
+BUFFER_CLASSES = {
+    "memory": MemoryRatingBuffer,
+    "cache": CacheRatingBuffer,
+}
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_rating_buffer():
+    global _buffer
+    mode = getattr(settings, "VOTE_RATING_BUFFER", None)
+    if not mode:
+        return None
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                interval = getattr(settings, "VOTE_RATING_BUFFER_INTERVAL", 2.0)
+                _buffer = BUFFER_CLASSES[mode](interval)
+                atexit.register(_buffer.shutdown)
+    return _buffer
+
+
+def merge_pending_ratings(objects):
+    buffer = get_rating_buffer()
+    if buffer is None:
+        return objects
+    return buffer.merge(objects)
+
+
+def find_rating_drift(model, mark_model, target_field, limit=100, chunk_size=2000):
+    # rating вместе с несброшенными дельтами против SUM(mark) по таблице оценок.
+    # Суммы считаем по диапазонам id, как recount: в памяти только одна пачка
+    bounds = model.objects.aggregate(lo=Min("id"), hi=Max("id"))
+    if bounds["lo"] is None:
+        return []
+    target = f"{target_field}_id"
+    drift = []
+    for start in range(bounds["lo"], bounds["hi"] + 1, chunk_size):
+        end = start + chunk_size
+        objects = list(model.objects.filter(id__gte=start, id__lt=end).only("id", "rating").order_by("id"))
+        if not objects:
+            continue
+        sums = dict(
+            mark_model.objects.filter(**{f"{target}__gte": start, f"{target}__lt": end})
+            .values(target)
+            .annotate(total=Sum("mark"))
+            .values_list(target, "total")
+        )
+        drift.extend(_chunk_drift(objects, sums))
+        if len(drift) >= limit:
+            break
+    return drift[:limit]
+
+
+def _chunk_drift(objects, sums):
+    merge_pending_ratings(objects)
+    return [
+        (obj.pk, obj.rating or 0, sums.get(obj.pk, 0))
+        for obj in objects
+        if (obj.rating or 0) != sums.get(obj.pk, 0)
+    ]
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import AnswerMark, QuestionMark
+
+QUESTION_STATE = "q"
+ANSWER_STATE = "a"
+
+MARK_MODELS = {
+    QUESTION_STATE: (QuestionMark, "question"),
+    ANSWER_STATE: (AnswerMark, "answer"),
+}
+
+
+def _state_key(kind, user_id, object_id):
+    return f"votestate:{kind}:{user_id}:{object_id}"
+
+
+def _state_timeout():
+    return getattr(settings, "VOTE_STATE_CACHE_TIMEOUT", 600)
+
+
+def load_marks(user, kind, object_ids):
+    # {id: mark} для всех видимых объектов: кэш, а промахи — одним запросом
+    if not user.is_authenticated or not object_ids:
+        return {}
+
+    keys = {_state_key(kind, user.id, object_id): object_id for object_id in object_ids}
+    marks = {keys[key]: mark for key, mark in cache.get_many(keys).items()}
+
+    missing = [object_id for object_id in object_ids if object_id not in marks]
+    if missing:
+        mark_model, target_field = MARK_MODELS[kind]
+        found = dict(
+            mark_model.objects
+            .filter(user_id=user.id, **{f"{target_field}_id__in": missing})
+            .values_list(f"{target_field}_id", "mark")
+        )
+        fresh = {object_id: found.get(object_id, 0) for object_id in missing}
+        cache.set_many(
+            {_state_key(kind, user.id, object_id): mark for object_id, mark in fresh.items()},
+            _state_timeout(),
+        )
+        marks.update(fresh)
+    return marks
+
+
+def attach_marks(user, kind, objects):
+    marks = load_marks(user, kind, [obj.id for obj in objects])
+    for obj in objects:
+        obj.viewer_mark = marks.get(obj.id, 0)
+    return objects
+
+
+def remember_mark(kind, user_id, object_id, mark):
+    cache.set(_state_key(kind, user_id, object_id), mark, _state_timeout())
@@ -0,0 +1,145 @@
+from typing import NamedTuple
+
+from django.db import connections, router, transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.db.models.sql import UpdateQuery
+
+from .cards import question_answers_changed, question_card_changed
+from .live import publish_question_event
+from .models import Answer, AnswerMark, Question, QuestionMark, hot_score_updates
+from .reputation import add_reputation
+from .vote_buffer import get_rating_buffer
+from .vote_state import ANSWER_STATE, QUESTION_STATE, remember_mark
+
+
+class VoteResult(NamedTuple):
+    rating: int
+    mark: int
+
+
+def parse_mark(value):
+    if value == "like":
+        return 1
+    if value == "dislike":
+        return -1
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    if value not in (1, -1):
+        return None
+    return value
+
+
+def _question_rating_updates(delta):
+    return hot_score_updates(rating_delta=delta)
+
+
+def _answer_rating_updates(delta):
+    return {"rating": Coalesce(F("rating"), 0) + delta}
+
+
+def rating_updates_for(model, delta):
+    if model is Question:
+        return _question_rating_updates(delta)
+    return _answer_rating_updates(delta)
+
+
+def _update_returning(model, pk, values, columns, using):
+    # ORM не умеет UPDATE ... RETURNING, поэтому собираем UPDATE штатным
+    # компилятором и дописываем RETURNING (есть и в Postgres, и в SQLite >= 3.35)
+    connection = connections[using]
+    query = UpdateQuery(model)
+    query.add_update_values(values)
+    query.add_filter("pk", pk)
+    sql, params = query.get_compiler(using).as_sql()
+    with connection.cursor() as cursor:
+        returning = ", ".join(connection.ops.quote_name(column) for column in columns)
+        cursor.execute(f"{sql} RETURNING {returning}", params)
+        return cursor.fetchone()
+
+
+def _insert_mark(mark_model, target_field, user_id, target_id, mark, using):
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    opts = mark_model._meta
+    user_column = qn(opts.get_field("user").column)
+    target_column = qn(opts.get_field(target_field).column)
+    sql = (
+        f"INSERT INTO {qn(opts.db_table)} ({user_column}, {target_column}, {qn('mark')}) "
+        f"VALUES (%s, %s, %s) "
+        f"ON CONFLICT ({user_column}, {target_column}) DO NOTHING "
+        f"RETURNING {qn(opts.pk.column)}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user_id, target_id, mark])
+        return cursor.fetchone() is not None
+
+
+def _apply_mark(
+    mark_model, target_model, target_field, rating_updates, state_kind, user, target_id, mark, question_column,
+):
+    columns = ("rating", "user_id", question_column)
+    using = router.db_for_write(mark_model)
+    with transaction.atomic(using=using):
+        while True:
+            if _insert_mark(mark_model, target_field, user.id, target_id, mark, using):
+                delta, new_mark = mark, mark
+                break
+
+            # оценка уже есть: блокируем её строку, чтобы параллельные клики
+            # этого же пользователя шли по очереди
+            marks = mark_model.objects.using(using).filter(user_id=user.id, **{f"{target_field}_id": target_id})
+            old_mark = marks.select_for_update().values_list("mark", flat=True).first()
+            if old_mark is None:
+                # строку успели удалить параллельным запросом — пробуем вставить снова
+                continue
+
+            if old_mark == mark:
+                # повторное нажатие той же оценки снимает её
+                marks.delete()
+                delta, new_mark = -mark, 0
+            else:
+                marks.update(mark=mark)
+                delta, new_mark = mark - old_mark, mark
+            break
+
+        transaction.on_commit(lambda: remember_mark(state_kind, user.id, target_id, new_mark), using=using)
+
+        buffer = get_rating_buffer()
+        if buffer is None:
+            row = _update_returning(target_model, target_id, rating_updates(delta), columns, using)
+            if row is None:
+                raise target_model.DoesNotExist
+            rating, author_id, question_id = row
+        else:
+            # write-behind: горячую строку не трогаем, дельта уйдёт в базу пакетом
+            rating, author_id, question_id = (
+                target_model.objects.using(using).values_list(*columns).get(pk=target_id)
+            )
+            rating = (rating or 0) + buffer.pending(target_model, [target_id]).get(int(target_id), 0) + delta
+            transaction.on_commit(lambda: buffer.add(target_model, target_id, delta), using=using)
+
+        add_reputation(author_id, **{f"{target_field}_rating": delta})
+    # вопрос, на странице которого видна оценка: его ETag надо сбросить
+    return VoteResult(rating, new_mark), question_id
+
+
+def vote_question(user, question_id, mark):
+    result, _ = _apply_mark(
+        QuestionMark, Question, "question", _question_rating_updates, QUESTION_STATE, user, question_id, mark, "id",
+    )
+    # рейтинг в карточке поменялся — следующий показ перерисует её
+    transaction.on_commit(lambda: question_card_changed(question_id))
+    publish_question_event(question_id, "rating", target="question", id=int(question_id), rating=result.rating)
+    return result
+
+
+def vote_answer(user, answer_id, mark):
+    result, question_id = _apply_mark(
+        AnswerMark, Answer, "answer", _answer_rating_updates, ANSWER_STATE, user, answer_id, mark, "question_id",
+    )
+    transaction.on_commit(lambda: question_answers_changed(question_id))
+    publish_question_event(question_id, "rating", target="answer", id=int(answer_id), rating=result.rating)
+    return result
@@ -1,10 +1,12 @@
 # users/forms.py
 from django import forms
-from django.contrib.auth.forms import AuthenticationForm
-from django.contrib.auth.forms import UserCreationForm
+from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
 from django.contrib.auth.models import User
+from django.db import transaction
 
 from .models import UserProfile
+from .thumbnails import schedule_avatar_thumbnail
+
 
 class LoginForm(AuthenticationForm):
     username = forms.CharField(widget=forms.TextInput(
@@ -56,6 +58,11 @@ class ProfileUpdateForm(forms.ModelForm):
         avatar = self.cleaned_data.get("avatar")
         if avatar:
             self.instance.avatar = avatar
+            self.instance.avatar_thumbnail = None
         if commit:
             self.instance.save()
-        return self.instance
\ No newline at end of file
+            if avatar:
+                # оригинал уже сохранён; миниатюру строим в фоне после коммита
+                profile_id = self.instance.pk
+                transaction.on_commit(lambda: schedule_avatar_thumbnail(profile_id))
+        return self.instance
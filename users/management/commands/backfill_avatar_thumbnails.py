@@ -0,0 +1,60 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.db.models import Max, Min
+
+from users.models import UserProfile
+from users.thumbnails import build_avatar_thumbnail
+
+
+def _build(profile_id):
+    try:
+        return build_avatar_thumbnail(profile_id), None
+    except Exception as error:
+        return False, f"профиль {profile_id}: {error}"
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = (
+        "Строим миниатюры уже загруженных аватаров пачками по диапазонам id. "
+        "Картинки ужимаются параллельно в --workers потоках: Pillow отпускает GIL"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--force', action='store_true', help="Перестроить и уже готовые миниатюры")
+        parser.add_argument('--sleep', type=float, default=0)
+
+    def handle(self, *args, **kwargs):
+        chunk_size = kwargs["chunk_size"]
+        profiles = UserProfile.objects.exclude(avatar="").exclude(avatar__isnull=True)
+        bounds = profiles.aggregate(lo=Min("id"), hi=Max("id"))
+        if bounds["lo"] is None:
+            self.stdout.write("Аватаров нет")
+            return
+
+        built = failed = 0
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=kwargs["workers"]) as pool:
+            for start in range(bounds["lo"], bounds["hi"] + 1, chunk_size):
+                chunk = profiles.filter(id__gte=start, id__lt=start + chunk_size).only("id", "avatar", "avatar_thumbnail")
+                ids = [
+                    profile.id for profile in chunk
+                    if kwargs["force"] or profile.avatar_thumbnail.name != profile.expected_thumbnail_name()
+                ]
+                for ok, error in pool.map(_build, ids):
+                    if ok:
+                        built += 1
+                    elif error:
+                        failed += 1
+                        self.stderr.write(error)
+                if kwargs["sleep"]:
+                    time.sleep(kwargs["sleep"])
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"Миниатюр построено: {built}, с ошибкой: {failed}, за {elapsed:.1f} c"))
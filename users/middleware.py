@@ -1,7 +1,22 @@
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
 from django.shortcuts import redirect
 from django.urls import resolve
 
+from StackOverflow.routers import RoutingState, replica_alias, routing_state
+
+slow_log = logging.getLogger("sql.slow")
+
 EXEMPT_URL_NAMES = {
     "users:login",
     "users:logout",
@@ -14,29 +29,227 @@ EXEMPT_PATH_PREFIXES = (
     "/signup/",
 )
 
+
+def is_exempt(path):
+    if path.startswith(EXEMPT_PATH_PREFIXES):
+        return True
+
+    try:
+        match = resolve(path)
+        full_name = (
+            f"{match.app_name}:{match.url_name}"
+            if match.app_name else match.url_name
+        )
+    except Exception:
+        full_name = None
+
+    return full_name in EXEMPT_URL_NAMES
+
+
 class LoginRequiredMiddleware:
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        path = request.path
+        if self.async_mode:
+            return self.__acall__(request)
 
-        if request.user.is_authenticated:
+        if request.user.is_authenticated or is_exempt(request.path):
             return self.get_response(request)
 
-        if path.startswith(EXEMPT_PATH_PREFIXES):
-            return self.get_response(request)
+        return redirect(settings.LOGIN_URL)
 
-        try:
-            match = resolve(path)
-            full_name = (
-                f"{match.app_name}:{match.url_name}"
-                if match.app_name else match.url_name
-            )
-        except Exception:
-            full_name = None
-
-        if full_name in EXEMPT_URL_NAMES:
-            return self.get_response(request)
+    async def __acall__(self, request):
+        user = await request.auser()
+        # дальше (вьюхи, шаблоны) request.user — уже загруженный, без второго запроса
+        request.user = user
+
+        if user.is_authenticated or is_exempt(request.path):
+            return await self.get_response(request)
 
         return redirect(settings.LOGIN_URL)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Отправляет чтения вьюх с replica_reads = True на реплику. После запроса с
+    записью ставит куку: пока она жива, этот пользователь читает с основной базы
+    и видит своё, даже если реплика ещё отстаёт.
+    """
+
+    SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.cookie_name = getattr(settings, "DATABASE_REPLICA_PIN_COOKIE", "db_primary")
+        self.sticky_seconds = getattr(settings, "DATABASE_REPLICA_STICKY_SECONDS", 5)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # синхронный process_view Django под ASGI обернул бы в sync_to_async
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = RoutingState()
+        token = routing_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            routing_state.reset(token)
+        return self.pin(request, state, response)
+
+    async def __acall__(self, request):
+        # состояние в ContextVar: sync_to_async запросов к базе копирует контекст
+        state = RoutingState()
+        token = routing_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            routing_state.reset(token)
+        return self.pin(request, state, response)
+
+    def pin(self, request, state, response):
+        if state.wrote or request.method not in self.SAFE_METHODS:
+            response.set_cookie(self.cookie_name, "1", max_age=self.sticky_seconds, httponly=True, samesite="Lax")
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self.route(request, view_func)
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        self.route(request, view_func)
+
+    def route(self, request, view_func):
+        # сессия и пользователь к этому моменту уже прочитаны — с основной базы
+        view_class = getattr(view_func, "view_class", None)
+        state = routing_state.get()
+        if (
+            state is not None
+            and replica_alias() is not None
+            and request.method in self.SAFE_METHODS
+            and getattr(view_class, "replica_reads", False)
+            and self.cookie_name not in request.COOKIES
+        ):
+            state.replica = True
+
+
+# IN (%s, %s, ...) разной длины — один и тот же запрос
+IN_LIST_RE = re.compile(r"IN \((?:%s, )*%s\)")
+
+
+class QueryStats:
+    """execute_wrapper: число запросов, время в базе, повторы и медленные запросы."""
+
+    def __init__(self, slow_query_ms):
+        self.slow_query_ms = slow_query_ms
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+        self.slow = []
+        # параллельные чтения gather_reads считаются из потоков пула
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self.count += 1
+                self.duration += elapsed
+                self.statements[IN_LIST_RE.sub("IN (...)", sql)] += 1
+                if elapsed >= self.slow_query_ms:
+                    self.slow.append({"sql": sql, "ms": round(elapsed, 2)})
+
+    def duplicates(self, threshold):
+        return [(sql, count) for sql, count in self.statements.most_common() if count >= threshold]
+
+
+class SQLInstrumentationMiddleware:
+    """
+    Включается SQL_INSTRUMENTATION = True. Пишет Server-Timing с числом запросов и
+    временем в базе, а медленные запросы, медленные страницы и повторы одного
+    и того же запроса (N+1) — в лог sql.slow с именем URL.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "SQL_INSTRUMENTATION", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.slow_request_ms = getattr(settings, "SQL_SLOW_REQUEST_MS", 500)
+        self.slow_query_ms = getattr(settings, "SQL_SLOW_QUERY_MS", 100)
+        self.duplicate_threshold = getattr(settings, "SQL_DUPLICATE_THRESHOLD", 3)
+
+    @staticmethod
+    def instrument(stack, stats):
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(stats))
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats = QueryStats(self.slow_query_ms)
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            self.instrument(stack, stats)
+            response = self.get_response(request)
+        return self.report(request, response, started, stats)
+
+    async def __acall__(self, request):
+        # соединения — в потоке, где async ORM и sync_to_async запроса выполняют
+        # запросы (thread_sensitive); обёртки ставим и снимаем там же
+        stats = QueryStats(self.slow_query_ms)
+        started = time.perf_counter()
+        stack = ExitStack()
+        await sync_to_async(self.instrument)(stack, stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.report(request, response, started, stats)
+
+    def report(self, request, response, started, stats):
+        elapsed = (time.perf_counter() - started) * 1000
+
+        duplicates = stats.duplicates(self.duplicate_threshold)
+        response["Server-Timing"] = ", ".join([
+            f'db;dur={stats.duration:.1f};desc="{stats.count} queries, {len(duplicates)} repeated"',
+            f"total;dur={elapsed:.1f}",
+        ])
+
+        if elapsed >= self.slow_request_ms or stats.slow or duplicates:
+            self.log(request, response, elapsed, stats, duplicates)
+        return response
+
+    def log(self, request, response, elapsed, stats, duplicates):
+        match = getattr(request, "resolver_match", None)
+        slow_log.warning(json.dumps({
+            "url_name": match.view_name if match else None,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round(elapsed, 2),
+            "queries": stats.count,
+            "sql_ms": round(stats.duration, 2),
+            "slow_request": elapsed >= self.slow_request_ms,
+            "slow_queries": stats.slow,
+            "duplicates": [{"sql": sql, "count": count} for sql, count in duplicates],
+        }, ensure_ascii=False))
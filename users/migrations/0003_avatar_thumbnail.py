@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_remove_userprofile_is_admin'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='avatar_thumbnail',
+            field=models.ImageField(blank=True, editable=False, max_length=255, null=True, upload_to='', verbose_name='Миниатюра аватара'),
+        ),
+    ]
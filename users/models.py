@@ -1,3 +1,6 @@
+import posixpath
+
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.db import models
 
@@ -20,6 +23,14 @@ class UserProfile(models.Model):
         null=True,
         verbose_name="Аватар",
     )
+    # уменьшенная копия рядом с оригиналом, её строит users.thumbnails в фоне
+    avatar_thumbnail = models.ImageField(
+        max_length=255,
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name="Миниатюра аватара",
+    )
 
 
     class Meta:
@@ -31,8 +42,27 @@ class UserProfile(models.Model):
         return f"Профиль {self.user.username}, {self.user.email}"
 
 
+    def expected_thumbnail_name(self):
+        # avatars/2026/10/me.jpg -> avatars/2026/10/me.200.webp
+        size = getattr(settings, "AVATAR_THUMBNAIL_SIZE", 200)
+        extension = getattr(settings, "AVATAR_THUMBNAIL_FORMAT", "WEBP").lower()
+        root, _ = posixpath.splitext(self.avatar.name)
+        return f"{root}.{size}.{extension}"
+
+
     @property
     def avatar_url(self) -> str | None:
+        # миниатюра, только если она построена именно из текущего аватара
+        if self.avatar and self.avatar_thumbnail and self.avatar_thumbnail.name == self.expected_thumbnail_name():
+            try:
+                return self.avatar_thumbnail.url
+            except Exception:
+                pass
+        return self.avatar_full_url
+
+
+    @property
+    def avatar_full_url(self) -> str | None:
         from django.templatetags.static import static
         if self.avatar:
             try:
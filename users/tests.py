@@ -1,3 +1,229 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connections
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from questions.cards import card_cache_stats, render_cards
+from questions.models import Question
+
+from .models import UserProfile
+
+
+@override_settings(SQL_INSTRUMENTATION=True, SQL_SLOW_REQUEST_MS=10_000, SQL_SLOW_QUERY_MS=10_000)
+class SQLInstrumentationMiddlewareTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="instrumented")
+        UserProfile.objects.create(user=cls.user)
+        cls.question = Question.objects.create(user=cls.user, topic="тема", text="текст")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse("questions:question_detail", args=[self.question.id]))
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[\d.]+;desc="\d+ queries, 0 repeated", total;dur=')
+
+    async def test_async_stack_is_not_adapted(self):
+        # под ASGI Django пишет "Asynchronous handler adapted for ..." (при DEBUG) про каждую
+        # middleware, которую пришлось обернуть в async_to_sync/sync_to_async
+        await self.async_client.aforce_login(self.user)
+        url = reverse("questions:question_detail", args=[self.question.id])
+        with override_settings(DEBUG=True), mock.patch("django.core.handlers.base.logger") as logger:
+            response = await self.async_client.get(url)
+        adapted = [call.args for call in logger.debug.call_args_list if "adapted" in call.args[0]]
+        self.assertEqual(adapted, [])
+        self.assertEqual(response.status_code, 200)
+        # запросы async ORM идут мимо потока middleware, но счётчик их видит
+        self.assertRegex(response["Server-Timing"], r'desc="[1-9]\d* queries')
+
+    @override_settings(SQL_DUPLICATE_THRESHOLD=1)
+    def test_repeated_statements_are_logged_with_url_name(self):
+        with self.assertLogs("sql.slow", "WARNING") as logs:
+            self.client.get(reverse("questions:question_detail", args=[self.question.id]))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["url_name"], "questions:question_detail")
+        self.assertEqual(record["status"], 200)
+        self.assertTrue(record["duplicates"])
+
+    @override_settings(SQL_INSTRUMENTATION=False)
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse("questions:question_detail", args=[self.question.id]))
+        self.assertNotIn("Server-Timing", response)
+
+
+# чтения в потоке запроса — иначе их не увидит CaptureQueriesContext
+@override_settings(ASYNC_CONCURRENT_READS=False, DATABASE_REPLICA="replica")
+class ReplicaRoutingTest(TransactionTestCase):
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        self.user = User.objects.create(username="reader")
+        UserProfile.objects.create(user=self.user)
+        self.question = Question.objects.create(user=self.user, topic="тема", text="текст")
+        self.client.force_login(self.user)
+
+    def request(self, method, url, data=None):
+        with (
+            CaptureQueriesContext(connections["default"]) as primary,
+            CaptureQueriesContext(connections["replica"]) as replica,
+        ):
+            response = getattr(self.client, method)(url, data)
+        return response, len(primary), len(replica)
+
+    def test_read_only_views_read_from_replica(self):
+        for url in (reverse("home"), reverse("questions:question_detail", args=[self.question.id])):
+            response, _, replica = self.request("get", url)
+            self.assertEqual(response.status_code, 200)
+            # сессия и пользователь — с основной, страница — с реплики
+            self.assertGreater(replica, 0)
+            self.assertNotIn("db_primary", response.cookies)
+
+    def test_writer_reads_own_writes_from_primary(self):
+        url = reverse("questions:question_mark", args=[self.question.id])
+        response, _, replica = self.request("post", url, {"mark": "1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(replica, 0)
+        self.assertIn("db_primary", response.cookies)
+
+        response, _, replica = self.request("get", reverse("home"))
+        self.assertEqual(replica, 0)
+        self.assertEqual(response.context["questions"][0].rating, 1)
+
+        self.client.cookies.pop("db_primary")
+        response, _, replica = self.request("get", reverse("home"))
+        self.assertGreater(replica, 0)
+
+    def test_routing_under_asgi(self):
+        # async_to_sync из потока теста: запросы ORM идут в этом же потоке и видны
+        # CaptureQueriesContext, а middleware работают в асинхронном режиме
+        async def get():
+            client = AsyncClient()
+            await client.aforce_login(self.user)
+            return await client.get(reverse("home"))
+
+        with CaptureQueriesContext(connections["replica"]) as replica:
+            response = async_to_sync(get)()
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(len(replica), 0)
+
+        async def post():
+            client = AsyncClient()
+            await client.aforce_login(self.user)
+            return await client.post(reverse("questions:question_mark", args=[self.question.id]), {"mark": "1"})
+
+        self.assertIn("db_primary", async_to_sync(post)().cookies)
+
+    def test_cache_is_filled_from_primary_while_replica_lags(self):
+        cache.clear()
+        table = Question._meta.db_table
+        # отставшая реплика: её SELECT по вопросам читают снимок до голоса
+        with connections["default"].cursor() as cursor:
+            cursor.execute(f'CREATE TABLE "stale_{table}" AS SELECT * FROM "{table}"')
+        self.addCleanup(lambda: connections["default"].cursor().execute(f'DROP TABLE "stale_{table}"'))
+
+        def lagging(execute, sql, params, many, context):
+            return execute(sql.replace(f'"{table}"', f'"stale_{table}"'), params, many, context)
+
+        with connections["replica"].execute_wrapper(lagging):
+            self.client.post(reverse("questions:question_mark", args=[self.question.id]), {"mark": "1"})
+            # версия карточки уже сдвинута; кэш заполняет посетитель без куки
+            self.client.cookies.pop("db_primary")
+            for _ in range(2):
+                response, _, replica = self.request("get", reverse("home"))
+                self.assertGreater(replica, 0)
+                self.assertEqual(response.context["questions"][0].rating, 1)
+                self.assertContains(response, 'class="rating-input" type="number" value="1"')
+
+    def test_cards_read_from_replica_are_not_cached(self):
+        cache.clear()
+        question = Question.objects.using("replica").get(pk=self.question.id)
+        render_cards([question], self.user)
+        self.assertTrue(question.card_html)
+        self.assertEqual(card_cache_stats()["misses"], 1)
+        render_cards([Question.objects.using("replica").get(pk=self.question.id)], self.user)
+        self.assertEqual(card_cache_stats()["misses"], 2)
+
+
+def make_image(size=(1200, 800), image_format="PNG"):
+    output = BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(output, image_format)
+    return output.getvalue()
+
+
+class MediaRootMixin:
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root, AVATAR_THUMBNAIL_BACKGROUND=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class AvatarThumbnailTest(MediaRootMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create(username="avatar_owner", email="owner@example.com")
+        self.profile = UserProfile.objects.create(user=self.user)
+        self.client.force_login(self.user)
+
+    def upload(self, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse("users:profile_edit"), {
+                "email": "owner@example.com",
+                "avatar": SimpleUploadedFile("me.png", content, content_type="image/png"),
+            })
+
+    def test_upload_builds_thumbnail(self):
+        original = make_image()
+        self.upload(original)
+        self.profile.refresh_from_db()
+
+        self.assertEqual(self.profile.avatar_thumbnail.name, self.profile.expected_thumbnail_name())
+        self.assertEqual(self.profile.avatar_url, self.profile.avatar_thumbnail.url)
+        self.assertEqual(self.profile.avatar_full_url, self.profile.avatar.url)
+        with Image.open(self.profile.avatar_thumbnail.path) as thumbnail:
+            self.assertEqual((thumbnail.format, thumbnail.size), ("WEBP", (200, 200)))
+        self.assertLess(self.profile.avatar_thumbnail.size, len(original))
+
+    def test_stale_thumbnail_is_not_served(self):
+        self.upload(make_image())
+        self.profile.refresh_from_db()
+        # новый аватар загружен, а его миниатюра ещё не готова
+        self.profile.avatar.name = "avatars/other.png"
+        self.assertEqual(self.profile.avatar_url, self.profile.avatar_full_url)
+
+
+class AvatarThumbnailBackfillTest(MediaRootMixin, TransactionTestCase):
+
+    def test_backfill_builds_missing_thumbnails(self):
+        for i in range(3):
+            profile = UserProfile.objects.create(user=User.objects.create(username=f"backfill_{i}"))
+            profile.avatar.save(f"a{i}.jpg", SimpleUploadedFile(f"a{i}.jpg", make_image(image_format="JPEG")))
+        UserProfile.objects.create(user=User.objects.create(username="no_avatar"))
+
+        out = StringIO()
+        call_command("backfill_avatar_thumbnails", workers=2, chunk_size=2, stdout=out)
+        self.assertIn("построено: 3", out.getvalue())
+        for profile in UserProfile.objects.exclude(avatar=""):
+            self.assertEqual(profile.avatar_url, profile.avatar_thumbnail.url)
+
+        out = StringIO()
+        call_command("backfill_avatar_thumbnails", stdout=out)
+        self.assertIn("построено: 0", out.getvalue())
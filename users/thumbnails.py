@@ -0,0 +1,102 @@
+import atexit
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from django.dispatch import Signal
+from PIL import Image, ImageOps
+
+from .models import UserProfile
+
+logger = logging.getLogger(__name__)
+
+# миниатюра записана в профиль: кэш карточек автора надо сбросить
+avatar_thumbnail_ready = Signal()
+
+
+def render_thumbnail(source, size, image_format="WEBP", quality=80):
+    """Квадрат size x size из файла-картинки: поворот по EXIF, обрезка по центру."""
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+        image = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        output = BytesIO()
+        image.save(output, image_format, quality=quality, method=4)
+    return output.getvalue()
+
+
+def build_avatar_thumbnail(profile_id):
+    """
+    Строит миниатюру текущего аватара профиля. Если пока строили, пользователь
+    загрузил другой аватар, миниатюра в профиль не попадает. True — записана.
+    """
+    profile = UserProfile.objects.filter(pk=profile_id).only("id", "user_id", "avatar", "avatar_thumbnail").first()
+    if profile is None or not profile.avatar:
+        return False
+
+    source_name = profile.avatar.name
+    name = profile.expected_thumbnail_name()
+    storage = profile.avatar.storage
+    with profile.avatar.open("rb") as source:
+        data = render_thumbnail(
+            source,
+            getattr(settings, "AVATAR_THUMBNAIL_SIZE", 200),
+            getattr(settings, "AVATAR_THUMBNAIL_FORMAT", "WEBP"),
+            getattr(settings, "AVATAR_THUMBNAIL_QUALITY", 80),
+        )
+    # имя фиксированное: avatar_url сверяет его с именем аватара
+    if storage.exists(name):
+        storage.delete(name)
+    name = storage.save(name, ContentFile(data))
+
+    updated = UserProfile.objects.filter(pk=profile.pk, avatar=source_name).update(avatar_thumbnail=name)
+    if not updated:
+        storage.delete(name)
+        return False
+    avatar_thumbnail_ready.send(sender=UserProfile, profile_id=profile.pk, user_id=profile.user_id)
+    return True
+
+
+def _build_logged(profile_id):
+    try:
+        build_avatar_thumbnail(profile_id)
+    except Exception:
+        # битая картинка или недоступное хранилище: остаётся оригинал, backfill повторит
+        logger.exception("Не удалось построить миниатюру аватара профиля %s", profile_id)
+
+
+def _build_in_background(profile_id):
+    try:
+        _build_logged(profile_id)
+    finally:
+        # поток пула живёт дольше запроса — соединение закрываем, как в конце запроса
+        close_old_connections()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "AVATAR_THUMBNAIL_WORKERS", 2),
+                    thread_name_prefix="avatar-thumbnails",
+                )
+                atexit.register(_executor.shutdown)
+    return _executor
+
+
+def schedule_avatar_thumbnail(profile_id):
+    # зовётся из on_commit: поток пула читает профиль своим соединением
+    if not getattr(settings, "AVATAR_THUMBNAIL_BACKGROUND", True):
+        _build_logged(profile_id)
+        return None
+    return _get_executor().submit(_build_in_background, profile_id)